@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CheckpointConfig(AppConfig):
     name = 'checkpoint'
+
+    def ready(self):
+        # Registers the model signal handlers that keep cached status snapshots fresh
+        from . import signals  # noqa: F401
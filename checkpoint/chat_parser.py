@@ -0,0 +1,284 @@
+import re
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from .utils import WEEKDAY_MAP, extract_weekday_request, next_weekday, normalize_name
+
+# Deterministic first pass for the schedule chat. parse_chat_query returns the same dict the
+# matching LLM extractor in utils would, or None when the message has something it can't
+# account for; the view then falls back to the LLM
+
+
+# What the caller can ask about: names of the branches they supervise and the people in them
+class ChatRoster(NamedTuple):
+    branch_names: list
+    people: list  # (first_name, last_name, username)
+
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH = r"(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*"
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_DAY_MONTH = re.compile(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH}\b")
+_MONTH_DAY = re.compile(rf"\b{_MONTH}\s+(\d{{1,2}})(?:st|nd|rd|th)?\b")
+_ORDINAL_DAY = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\b")
+_RELATIVE_DAY = re.compile(r"\b(today|tonight|tomorrow|yesterday)\b")
+_RELATIVE_OFFSETS = {"today": 0, "tonight": 0, "tomorrow": 1, "yesterday": -1}
+_TIME_RANGE = re.compile(
+    r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*(?:-|–|—|to|till|until)\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\b"
+)
+_TIME_OF_DAY = re.compile(r"\b(morning|afternoon|evening|night)\b")
+_WEEKDAY = re.compile(rf"\b(?:(this|next)\s+)?({'|'.join(WEEKDAY_MAP)})\b")
+
+# Words that can follow "at"/"in" without naming a branch
+_NOT_A_BRANCH = {
+    "a", "an", "the", "this", "next", "that", "my", "our", "on", "at", "in", "for", "work", "total",
+    "all", "same", "time", "shift", "shifts", "week", "weekend", "morning", "afternoon", "evening",
+    "night", "today", "tonight", "tomorrow", "yesterday", "january", "february", "march", "april",
+    "june", "july", "august", "september", "october", "november", "december", *WEEKDAY_MAP, *MONTHS,
+}
+# Words after "does/has/for" that aren't a person, for the optional name in hours questions
+_NOT_A_PERSON = {
+    "the", "this", "next", "each", "every", "everyone", "everybody", "anyone", "anybody", "all",
+    "staff", "people", "someone", "we", "i", "you", "they", "it", "most", "least", "week", "today",
+    "tomorrow", "me", "us", "them", "shifts", "hours", "no", "any", "a", "an", "more", "fewer",
+    "been", "got", "worked", "working", "off",
+}
+# First names that are also everyday words only count when written with a capital
+_AMBIGUOUS_NAMES = {"will", "may", "june", "april", "august", "mark", "bill", "grace", "hope", "joy", "rose", "jack", "max", "pat", "rob", "sue", "dawn", "eve", "art"}
+_MAX_NAME_WORDS = 6
+
+
+def _resolve_weekday(today, weekday_idx, qualifier):
+    # Same rules the chat view applies: plain and "next" mean the next occurrence after today,
+    # "this" means this week's unless it has already passed
+    if qualifier == "this":
+        candidate = today + timedelta(days=weekday_idx - today.weekday())
+        return candidate if candidate >= today else next_weekday(today, weekday_idx)
+    return next_weekday(today, weekday_idx)
+
+
+def _upcoming(today, month, day):
+    # Closest date on or after today with this month/day (month=None means any month)
+    for offset in range(13 if month is None else 2):
+        if month is None:
+            year, m = divmod(today.month - 1 + offset, 12)
+            year, m = today.year + year, m + 1
+        else:
+            year, m = today.year + offset, month
+        try:
+            candidate = date(year, m, day)
+        except ValueError:
+            continue
+        if candidate >= today:
+            return candidate
+    return None
+
+
+def _parse_date(text, today):
+    match = _ISO_DATE.search(text)
+    if match:
+        try:
+            return date(*map(int, match.groups()))
+        except ValueError:
+            return None
+    match = _DAY_MONTH.search(text)
+    if match:
+        return _upcoming(today, MONTHS[match.group(2)], int(match.group(1)))
+    match = _MONTH_DAY.search(text)
+    if match:
+        return _upcoming(today, MONTHS[match.group(1)], int(match.group(2)))
+    match = _RELATIVE_DAY.search(text)
+    if match:
+        return today + timedelta(days=_RELATIVE_OFFSETS[match.group(1)])
+    weekday_idx, qualifier = extract_weekday_request(text)
+    if weekday_idx is not None:
+        return _resolve_weekday(today, weekday_idx, qualifier)
+    match = _ORDINAL_DAY.search(text)
+    if match:
+        return _upcoming(today, None, int(match.group(1)))
+    return None
+
+
+def _iso_date(match):
+    try:
+        return date(*map(int, match.groups()))
+    except ValueError:
+        return None
+
+
+def _several_days(text, today):
+    # True when the message names more than one day ("friday 9 to 5 and saturday 10 to 6").
+    # Each pattern's matches are blanked before the next runs, so "20th Oct" isn't also the ordinal "20th"
+    days = set()
+    for pattern, resolve in (
+        (_ISO_DATE, _iso_date),
+        (_DAY_MONTH, lambda m: _upcoming(today, MONTHS[m.group(2)], int(m.group(1)))),
+        (_MONTH_DAY, lambda m: _upcoming(today, MONTHS[m.group(1)], int(m.group(2)))),
+        (_RELATIVE_DAY, lambda m: today + timedelta(days=_RELATIVE_OFFSETS[m.group(1)])),
+        (_WEEKDAY, lambda m: _resolve_weekday(today, WEEKDAY_MAP[m.group(2)], m.group(1))),
+        (_ORDINAL_DAY, lambda m: _upcoming(today, None, int(m.group(1)))),
+    ):
+        days.update(resolve(match) for match in pattern.finditer(text))
+        text = pattern.sub(" ", text)
+    return len(days) > 1
+
+
+def _is_24h(hour_text):
+    # "0", "09" and anything past 12 can only be read on the 24-hour clock
+    return (len(hour_text) == 2 and hour_text.startswith("0")) or int(hour_text) == 0 or int(hour_text) > 12
+
+
+def _parse_time_range(text):
+    # "9-17", "9:00–17:30", "9am to 5pm", "1-5pm", "9-5" -> ("HH:MM", "HH:MM"). (None, None) when
+    # there is no range, more than one, a bare range that reads either way ("5-11" is morning or
+    # evening) or one ending at or before its start ("11pm-7am"); the LLM gets those instead
+    matches = list(_TIME_RANGE.finditer(_ISO_DATE.sub(" ", text)))
+    if len(matches) != 1:
+        return None, None
+    sh_text, sm, s_suffix, eh_text, em, e_suffix = matches[0].groups()
+    sh, sm, eh, em = int(sh_text), int(sm or 0), int(eh_text), int(em or 0)
+
+    def to_24h(hour, suffix):
+        if suffix == "pm" and hour < 12:
+            return hour + 12
+        if suffix == "am" and hour == 12:
+            return 0
+        return hour
+
+    sh, eh = to_24h(sh, s_suffix), to_24h(eh, e_suffix)
+    if not s_suffix and e_suffix == "pm" and sh + 12 < eh:
+        sh += 12
+    if not e_suffix and not _is_24h(eh_text) and (s_suffix or not _is_24h(sh_text)):
+        # A bare 12-hour end: whichever of its two readings comes after the start, if only one does
+        readings = [hour for hour in (eh, eh + 12) if (sh, sm) < (hour, em) and hour <= 23]
+        if eh == 12:
+            readings = [12] if (sh, sm) < (12, em) else []
+        if len(readings) != 1:
+            return None, None
+        eh = readings[0]
+    if sh > 23 or eh > 23 or sm > 59 or em > 59 or (eh, em) <= (sh, sm):
+        return None, None
+    return f"{sh:02d}:{sm:02d}", f"{eh:02d}:{em:02d}"
+
+
+def _find_phrase(tokens, phrase):
+    words = phrase.split()
+    for i in range(len(tokens) - len(words) + 1):
+        if tokens[i:i + len(words)] == words:
+            return i, i + len(words)
+    return None
+
+
+def _match_branch(tokens, branch_names):
+    # Longest branch name appearing in the message; None if two different ones tie
+    best, best_span, tied = None, None, False
+    for name in branch_names:
+        norm = normalize_name(name)
+        span = norm and _find_phrase(tokens, norm)
+        if not span:
+            continue
+        length = span[1] - span[0]
+        if best is None or length > best_span[1] - best_span[0]:
+            best, best_span, tied = name, span, False
+        elif length == best_span[1] - best_span[0] and normalize_name(best) != norm:
+            tied = True
+    return best, best_span, tied
+
+
+def _match_person(tokens, message, people):
+    # Returns (name as it should be searched, span, ambiguous). Full names beat single names
+    ngrams = {}
+    for n in range(1, min(_MAX_NAME_WORDS, len(tokens)) + 1):
+        for i in range(len(tokens) - n + 1):
+            ngrams.setdefault(" ".join(tokens[i:i + n]), (i, i + n))
+
+    found = {}
+    for first, last, username in people:
+        full = f"{first} {last}".strip()
+        for label in (full, first, last, username):
+            norm = normalize_name(label or "")
+            if not norm or norm not in ngrams:
+                continue
+            if norm in _AMBIGUOUS_NAMES and not re.search(rf"\b{re.escape(label.capitalize())}\b", message):
+                continue
+            found.setdefault(norm, (label, ngrams[norm]))
+            break
+
+    if not found:
+        return None, None, False
+    # Drop matches contained in a longer one ("bob" inside "bob jones")
+    keys = [k for k in found if not any(k != other and f" {k} " in f" {other} " for other in found)]
+    if len(keys) > 1:
+        return None, None, True
+    label, span = found[keys[0]]
+    return label, span, False
+
+
+def _unexplained_place(tokens):
+    # "at X"/"in X" left over once known branches, names and dates are removed: probably a
+    # branch spelled differently, which the LLM extractor handles better
+    for i, token in enumerate(tokens[:-1]):
+        if token in ("at", "in"):
+            following = tokens[i + 1]
+            if following not in _NOT_A_BRANCH and not following[:1].isdigit():
+                return True
+    return False
+
+
+def parse_chat_query(kind, message, today, roster):
+    text = (message or "").lower()
+    tokens = normalize_name(message or "").split()
+    if not tokens:
+        return None
+
+    branch_name, branch_span, tied = _match_branch(tokens, roster.branch_names)
+    if tied:
+        return None
+    if branch_span:
+        tokens = tokens[:branch_span[0]] + tokens[branch_span[1]:]
+
+    person_name, person_span, ambiguous = _match_person(tokens, message, roster.people)
+    if ambiguous:
+        return None
+    remaining = tokens[:person_span[0]] + tokens[person_span[1]:] if person_span else tokens
+    if _unexplained_place(remaining):
+        return None
+
+    target_date = _parse_date(text, today)
+    iso_date = target_date.isoformat() if target_date else None
+    week = "next" if re.search(r"\bnext\s+week\b", text) else "this"
+
+    if kind == "branch":
+        return {"date": iso_date, "branch_name": branch_name}
+    if kind == "schedule":
+        if not iso_date:
+            return None
+        return {"date": iso_date, "branch_name": branch_name}
+    if kind == "coverage":
+        if not iso_date:
+            return None
+        time_of_day = _TIME_OF_DAY.search(text)
+        return {"date": iso_date, "branch_name": branch_name, "time_of_day": time_of_day and time_of_day.group(1)}
+    if kind == "hours":
+        if not person_name:
+            # A name we don't know ("hours does Jo have") is the LLM's call, not a roster-wide answer
+            for match in re.finditer(r"\b(?:does|did|has|for)\s+([a-z]+)", " ".join(remaining)):
+                if match.group(1) not in _NOT_A_PERSON:
+                    return None
+        return {"person_name": person_name, "week": week, "branch_name": branch_name}
+    if kind == "person_schedule":
+        if not person_name:
+            return None
+        return {"person_name": person_name, "week": week, "branch_name": branch_name}
+    if kind == "shift_creation":
+        start_time, end_time = _parse_time_range(text)
+        if not (person_name and iso_date and start_time) or _several_days(text, today):
+            return None
+        return {
+            "person_name": person_name, "branch_name": branch_name, "date": iso_date,
+            "start_time": start_time, "end_time": end_time,
+        }
+    return None
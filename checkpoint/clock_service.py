@@ -0,0 +1,160 @@
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import BusinessMembership, TimeClock, WorkShift
+from .utils import bump_business_version, invalidate_staff_status
+from .weekly_hours import refresh_for_clocks
+
+CLOCKED_IN = "clocked_in"
+CLOCKED_OUT = "clocked_out"
+
+
+# Raised when a clock change isn't allowed; views turn `code` into their own wording
+class ClockError(Exception):
+    ALREADY_CLOCKED_IN = "already_clocked_in"
+    NOT_CLOCKED_IN = "not_clocked_in"
+    NO_ACTIVE_SHIFT = "no_active_shift"
+    SHIFT_ALREADY_USED = "shift_already_used"
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+# Every clock change below must run inside transaction.atomic() on a membership returned by
+# this lock, so concurrent scanners for the same person queue up instead of racing. The partial
+# unique index on open TimeClocks is the backstop if a caller ever forgets
+def lock_membership(**lookup):
+    return (
+        BusinessMembership.objects.select_for_update(of=("self",))
+        .select_related("user", "business")
+        .get(**lookup)
+    )
+
+
+def _open_clock(membership):
+    return TimeClock.objects.filter(
+        business_id=membership.business_id,
+        user_id=membership.user_id,
+        clock_out__isnull=True,
+    ).first()
+
+
+def _start_clock(membership, now):
+    # The active shift and whether it already has a clock-in come back in one query
+    shift = (
+        WorkShift.objects.filter(
+            business_id=membership.business_id,
+            user_id=membership.user_id,
+            start__lte=now,
+            end__gte=now,
+        )
+        .annotate(already_clocked=Exists(TimeClock.objects.filter(shift=OuterRef("pk"))))
+        .order_by("start")
+        .first()
+    )
+    if shift is None:
+        raise ClockError(ClockError.NO_ACTIVE_SHIFT)
+    if shift.already_clocked:
+        raise ClockError(ClockError.SHIFT_ALREADY_USED)
+
+    return TimeClock.objects.create(
+        business_id=membership.business_id,
+        user_id=membership.user_id,
+        shift=shift,
+        clock_in=now,
+    )
+
+
+def _stop_clock(open_clock, now):
+    open_clock.clock_out = now
+    open_clock.save(update_fields=["clock_out", "updated_at"])
+    return open_clock
+
+
+def clock_in(membership, now):
+    if _open_clock(membership):
+        raise ClockError(ClockError.ALREADY_CLOCKED_IN)
+    return _start_clock(membership, now)
+
+
+def clock_out(membership, now):
+    open_clock = _open_clock(membership)
+    if open_clock is None:
+        raise ClockError(ClockError.NOT_CLOCKED_IN)
+    return _stop_clock(open_clock, now)
+
+
+def toggle_clock(membership, now):
+    # Scanner semantics: close the open entry if there is one, otherwise clock in to the active shift
+    open_clock = _open_clock(membership)
+    if open_clock:
+        return CLOCKED_OUT, _stop_clock(open_clock, now)
+    return CLOCKED_IN, _start_clock(membership, now)
+
+
+def toggle_clocks_bulk(scans):
+    # Batch version of toggle_clock for kiosk rushes. `scans` is a list of (membership, when)
+    # for distinct, already-locked memberships; returns an (action, error_code) pair per scan.
+    # Open clocks and candidate shifts for everyone come back in two queries, and the changes
+    # are written with one bulk_update and one bulk_create
+    if not scans:
+        return []
+
+    business_ids = {m.business_id for m, _ in scans}
+    user_ids = {m.user_id for m, _ in scans}
+    open_clocks = {
+        (c.business_id, c.user_id): c
+        for c in TimeClock.objects.filter(business_id__in=business_ids, user_id__in=user_ids, clock_out__isnull=True)
+    }
+    shifts = defaultdict(list)
+    candidate_shifts = (
+        WorkShift.objects.filter(
+            business_id__in=business_ids,
+            user_id__in=user_ids,
+            start__lte=max(when for _, when in scans),
+            end__gte=min(when for _, when in scans),
+        )
+        .annotate(already_clocked=Exists(TimeClock.objects.filter(shift=OuterRef("pk"))))
+        .order_by("start")
+    )
+    for shift in candidate_shifts:
+        shifts[(shift.business_id, shift.user_id)].append(shift)
+
+    now = timezone.now()
+    to_close, to_create, results = [], [], []
+    for membership, when in scans:
+        key = (membership.business_id, membership.user_id)
+        open_clock = open_clocks.get(key)
+        if open_clock:
+            # A queued offline scan can't end an entry before it started
+            open_clock.clock_out = max(when, open_clock.clock_in)
+            open_clock.updated_at = now
+            to_close.append(open_clock)
+            results.append((CLOCKED_OUT, None))
+            continue
+
+        shift = next((s for s in shifts[key] if s.start <= when <= s.end), None)
+        if shift is None:
+            results.append((None, ClockError.NO_ACTIVE_SHIFT))
+        elif shift.already_clocked:
+            results.append((None, ClockError.SHIFT_ALREADY_USED))
+        else:
+            to_create.append(TimeClock(
+                business_id=membership.business_id, user_id=membership.user_id, shift=shift, clock_in=when,
+            ))
+            results.append((CLOCKED_IN, None))
+
+    if to_close:
+        TimeClock.objects.bulk_update(to_close, ["clock_out", "updated_at"])
+    if to_create:
+        TimeClock.objects.bulk_create(to_create)
+    if to_close or to_create:
+        # Bulk writes skip the model signals, so invalidate what they would have
+        changed = {c.business_id for c in to_close} | {c.business_id for c in to_create}
+        invalidate_staff_status(*changed)
+        bump_business_version(*changed)
+        refresh_for_clocks(to_close)
+    return results
@@ -0,0 +1,67 @@
+import heapq
+from itertools import groupby
+from typing import NamedTuple
+
+# Sort-and-sweep overlap detection for shifts. Intervals are half-open, [start, end), so a shift
+# ending at 17:00 doesn't overlap one starting at 17:00. After one sort, overlap_groups is a single
+# pass and overlapping_pairs costs O(n log n + pairs) instead of comparing every pair
+
+
+# The columns the sweep needs, read with values_list so a whole-branch scan builds no model instances
+class ShiftSpan(NamedTuple):
+    id: int
+    business_id: int
+    user_id: int
+    start: object
+    end: object
+
+
+def _span(item):
+    return item.start, item.end
+
+
+def overlap_groups(items, span=_span):
+    # Clusters of two or more items whose intervals chain together (A overlaps B, B overlaps C),
+    # in start order. A new cluster begins whenever an item starts at or after the latest end so far
+    groups, current, reach = [], [], None
+    for item in sorted(items, key=span):
+        start, end = span(item)
+        if current and start < reach:
+            current.append(item)
+            reach = max(reach, end)
+            continue
+        if len(current) > 1:
+            groups.append(current)
+        current, reach = [item], end
+    if len(current) > 1:
+        groups.append(current)
+    return groups
+
+
+def overlapping_pairs(items, span=_span):
+    # Every (earlier, later) pair that actually overlaps. A heap holds the intervals still open at
+    # each start; the ones that ended by then are popped, whatever remains overlaps the new item
+    pairs, active = [], []
+    for seq, item in enumerate(sorted(items, key=span)):
+        start, end = span(item)
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        pairs.extend((other, item) for _, _, other in active)
+        heapq.heappush(active, (end, seq, item))
+    return pairs
+
+
+def shift_overlap_groups(shifts, start=None, end=None):
+    # {business_id: overlap groups of ShiftSpan} for a WorkShift queryset, optionally limited to the
+    # shifts touching [start, end): one day, a multi-day range, or the whole branch with no bounds.
+    # The database returns rows already sorted, so the sort inside overlap_groups is a linear pass
+    if start is not None:
+        shifts = shifts.filter(end__gt=start)
+    if end is not None:
+        shifts = shifts.filter(start__lt=end)
+    rows = shifts.order_by("business_id", "start", "end").values_list("id", "business_id", "user_id", "start", "end")
+    return {
+        business_id: groups
+        for business_id, spans in groupby((ShiftSpan(*row) for row in rows.iterator(chunk_size=2000)), key=lambda s: s.business_id)
+        if (groups := overlap_groups(spans))
+    }
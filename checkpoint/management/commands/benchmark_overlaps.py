@@ -0,0 +1,62 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+
+from ...intervals import ShiftSpan, overlap_groups, overlapping_pairs
+
+
+# The chat intent's old detection: compare every pair of the day's shifts
+def _nested_pairs(spans):
+    pairs = []
+    for i in range(len(spans)):
+        for j in range(i + 1, len(spans)):
+            a, b = spans[i], spans[j]
+            if a.start < b.end and b.start < a.end:
+                pairs.append((a, b))
+    return pairs
+
+
+class Command(BaseCommand):
+    help = "Compares the nested pair loop with the sort-and-sweep overlap engine over synthetic shifts held in memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shifts', type=int, default=10_000)
+        parser.add_argument('--days', type=int, default=365, help="Spread the shifts over this many days.")
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        origin = datetime(2026, 1, 5, tzinfo=timezone.utc)
+        spans = []
+        for i in range(options['shifts']):
+            start = origin + timedelta(minutes=15 * rng.randrange(options['days'] * 96))
+            spans.append(ShiftSpan(i, 1, rng.randrange(200), start, start + timedelta(hours=rng.choice((4, 6, 8)))))
+        spans.sort(key=lambda s: (s.start, s.end))
+
+        self.stdout.write(f"{len(spans)} shifts over {options['days']} day(s), best of {options['repeat']}:")
+        results = {}
+        for label, fn in (
+            ('nested pair loop', _nested_pairs),
+            ('sweep: overlapping_pairs', overlapping_pairs),
+            ('sweep: overlap_groups', overlap_groups),
+        ):
+            best = min(self._time(fn, spans, results, label) for _ in range(options['repeat']))
+            self.stdout.write(f"  {label:<28} {best * 1000:10.1f} ms")
+
+        def normalized(pairs):
+            return {tuple(sorted((a.id, b.id))) for a, b in pairs}
+        if normalized(results['sweep: overlapping_pairs']) != normalized(results['nested pair loop']):
+            self.stderr.write("  sweep pairs differ from the nested loop")
+        self.stdout.write(
+            f"  {len(results['nested pair loop'])} overlapping pairs in "
+            f"{len(results['sweep: overlap_groups'])} overlap groups"
+        )
+
+    @staticmethod
+    def _time(fn, spans, results, label):
+        started = time.perf_counter()
+        results[label] = fn(spans)
+        return time.perf_counter() - started
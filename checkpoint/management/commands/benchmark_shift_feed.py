@@ -0,0 +1,93 @@
+import json
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from ... import utils
+from ...models import Business, WorkShift
+
+
+class _Rollback(Exception):
+    pass
+
+
+# The pre-values_list serializer: one model instance (plus joined user) per shift, stdlib encoder
+def _legacy_feed(queryset):
+    data = []
+    for shift in queryset.select_related('user'):
+        user = shift.user
+        full_name = f"{user.first_name} {user.last_name}".strip()
+        data.append({
+            "id": shift.id,
+            "title": full_name or user.username,
+            "start": shift.start.isoformat(),
+            "end": shift.end.isoformat(),
+            "notes": shift.notes or "",
+        })
+    return JsonResponse(data, safe=False).content
+
+
+class Command(BaseCommand):
+    help = "Times the shift calendar feed serializers against a throwaway branch (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shifts', type=int, default=20000)
+        parser.add_argument('--staff', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, options):
+        User = get_user_model()
+        business = Business.objects.create(name='benchmark')
+        users = User.objects.bulk_create([
+            User(username=f'bench_{business.id}_{i}', first_name='Staff', last_name=str(i))
+            for i in range(options['staff'])
+        ])
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        WorkShift.objects.bulk_create([
+            WorkShift(
+                business=business,
+                user=users[i % len(users)],
+                start=start + timedelta(hours=i),
+                end=start + timedelta(hours=i + 8),
+                notes='bench' if i % 3 else '',
+            )
+            for i in range(options['shifts'])
+        ], batch_size=2000)
+        queryset = WorkShift.objects.filter(business=business).order_by('start')
+
+        candidates = [('legacy (instances + JsonResponse)', lambda: _legacy_feed(queryset))]
+        if utils.orjson is not None:
+            candidates.append(('values_list + orjson', lambda: utils.shift_feed_json(queryset)))
+
+        def stdlib_feed():
+            with patch.object(utils, 'orjson', None):
+                return utils.shift_feed_json(queryset)
+        candidates.append(('values_list + json', stdlib_feed))
+
+        reference = json.loads(candidates[0][1]())
+        self.stdout.write(f"{options['shifts']} shifts, best of {options['repeat']}:")
+        for label, fn in candidates:
+            if json.loads(fn()) != reference:
+                self.stderr.write(f"  {label}: output differs from legacy serializer")
+            best = min(self._time(fn) for _ in range(options['repeat']))
+            self.stdout.write(f"  {label:<36} {best * 1000:8.1f} ms")
+
+    @staticmethod
+    def _time(fn):
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from ...utils import extraction_cache_stats, reset_extraction_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Shows how often the chat's LLM extraction calls were answered from the cache and roughly how much model time that saved."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        stats = extraction_cache_stats()
+        self.stdout.write(f"{'extractor':<32} {'hits':>8} {'misses':>8} {'hit rate':>9} {'avg LLM ms':>11} {'saved s':>9}")
+        for name, row in stats.items():
+            self.stdout.write(
+                f"{name:<32} {row['hits']:>8} {row['misses']:>8} {row['hit_rate']:>9.1%} "
+                f"{row['avg_llm_ms']:>11} {row['saved_ms'] / 1000:>9.1f}"
+            )
+        total_hits = sum(row['hits'] for row in stats.values())
+        total_saved = sum(row['saved_ms'] for row in stats.values())
+        self.stdout.write(f"total: {total_hits} LLM call(s) avoided, ~{total_saved / 1000:.1f}s of model latency saved")
+        if options['reset']:
+            reset_extraction_cache_stats()
+            self.stdout.write("counters reset")
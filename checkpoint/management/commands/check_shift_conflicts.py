@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...models import WorkShift
+from ...shift_conflicts import existing_conflicts
+
+
+class Command(BaseCommand):
+    help = "Lists people booked into overlapping shifts, which block the no-overlap constraint's migration until fixed."
+
+    def handle(self, *args, **options):
+        clashes = existing_conflicts(WorkShift.objects.all())
+        for earlier, later in clashes:
+            self.stdout.write(
+                f"user {earlier.user_id}: shift {earlier.id} (branch {earlier.business_id}, "
+                f"{timezone.localtime(earlier.start):%Y-%m-%d %H:%M}) overlaps shift {later.id} "
+                f"(branch {later.business_id}, {timezone.localtime(later.start):%Y-%m-%d %H:%M})"
+            )
+        self.stdout.write(f"{len(clashes)} overlapping pair(s)")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...report_cache import prune_report_cache
+from ...report_jobs import claim_next_job, run_report_job
+
+# How often an idle worker sweeps superseded PDFs out of the report cache
+PRUNE_EVERY = 3600
+
+
+class Command(BaseCommand):
+    help = "Renders queued PDF reports. Runs as a long-lived worker next to gunicorn."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit instead of polling.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--cache-days', type=float, default=7.0, help="Delete cached report PDFs unused for this many days.")
+
+    def handle(self, *args, **options):
+        last_prune = None
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if last_prune is None or time.monotonic() - last_prune >= PRUNE_EVERY:
+                    prune_report_cache(options['cache_days'] * 86400)
+                    last_prune = time.monotonic()
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            job = run_report_job(job)
+            self.stdout.write(f"{job.token}: {job.status}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ...weekly_hours import rebuild_weekly_hours
+
+
+class Command(BaseCommand):
+    help = "Recomputes the weekly hours rollup from every shift and closed clock entry. Run after fixing rows with raw SQL or queryset.update(), which skip the signals that keep it current."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows fetched and inserted per round trip.")
+
+    def handle(self, *args, **options):
+        rows = rebuild_weekly_hours(batch_size=options['batch_size'])
+        self.stdout.write(f"rebuilt {rows} weekly hours row(s)")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...scan_tokens import rotate_spent_pins
+
+
+class Command(BaseCommand):
+    help = "Replaces PINs that have been used since they were issued. Runs as a long-lived worker so scans never write them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Rotate everything due and exit instead of polling.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when nothing is due.")
+
+    def handle(self, *args, **options):
+        while True:
+            rotated = rotate_spent_pins()
+            if rotated:
+                self.stdout.write(f"rotated {rotated} PIN(s)")
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
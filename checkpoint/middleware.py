@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect
-from .models import BusinessMembership
+from .utils import must_change_password
 
 # Intercepts every request for staff with must_change_password=True and
 # redirects them to the password change page until they comply.
@@ -22,11 +22,9 @@ class ForcePasswordChangeMiddleware:
             if request.path.startswith(allowed_prefixes):
                 return self.get_response(request)
 
-            if BusinessMembership.objects.filter(
-                user=request.user,
-                must_change_password=True
-                ).exclude(role=BusinessMembership.OWNER).exists():
-                    return redirect('password_change')
+            # Answered from the session after the first request, so steady-state requests add no query
+            if must_change_password(request):
+                return redirect('password_change')
 
         return self.get_response(request)
     
\ No newline at end of file
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0011_timeclock_workshift_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workshift',
+            index=models.Index(fields=['business', 'start'], name='checkpoint__busines_38ff3f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workshift',
+            index=models.Index(fields=['business', 'user', 'start'], name='checkpoint__busines_e62811_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:55
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def close_duplicate_open_clocks(apps, schema_editor):
+    # Races before this constraint could leave several open entries for one person; keep the
+    # newest open and close the older ones with zero duration rather than inventing hours
+    TimeClock = apps.get_model('checkpoint', 'TimeClock')
+    duplicates = (
+        TimeClock.objects.filter(clock_out__isnull=True)
+        .values('business_id', 'user_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+    )
+    for dup in duplicates:
+        stale = TimeClock.objects.filter(
+            business_id=dup['business_id'], user_id=dup['user_id'], clock_out__isnull=True,
+        ).order_by('-clock_in', '-id')[1:]
+        for clock in stale:
+            clock.clock_out = clock.clock_in
+            clock.save(update_fields=['clock_out', 'updated_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0012_workshift_window_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_clocks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='timeclock',
+            constraint=models.UniqueConstraint(condition=models.Q(('clock_out__isnull', True)), fields=('business', 'user'), name='one_open_timeclock_per_member'),
+        ),
+    ]
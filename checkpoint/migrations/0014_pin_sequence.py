@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:58
+
+from django.db import migrations
+
+# Copy of pin_allocator.PIN_SEQUENCE as it was when this migration was written
+PIN_SEQUENCE = 'checkpoint_pin_seq'
+
+
+def create_pin_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {PIN_SEQUENCE}')
+
+
+def drop_pin_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP SEQUENCE IF EXISTS {PIN_SEQUENCE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0013_timeclock_one_open_per_member'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_pin_sequence, drop_pin_sequence),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:04
+
+import uuid
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def rekey_qr_secrets(apps, schema_editor):
+    # qr_token used to be printed inside every QR code; now that it signs tokens it has to be
+    # a value no client has ever seen
+    BusinessMembership = apps.get_model('checkpoint', 'BusinessMembership')
+    for membership in BusinessMembership.objects.only('pk').iterator():
+        membership.qr_token = uuid.uuid4()
+        membership.save(update_fields=['qr_token'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0014_pin_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessmembership',
+            name='pin_rotated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(rekey_qr_secrets, migrations.RunPython.noop),
+    ]
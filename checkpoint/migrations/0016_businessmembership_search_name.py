@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-18 00:41
+
+import re
+import unicodedata
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# Copy of staff_search.search_name_for as it was when this migration was written, so later
+# changes there can't alter what it does
+def _normalize(text):
+    text = unicodedata.normalize('NFD', text or '')
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    text = re.sub(r"[^\w\s]", "", text, flags=re.UNICODE)
+    return ' '.join(text.lower().split())
+
+
+def search_name_for(user):
+    return f"{_normalize(f'{user.first_name} {user.last_name}')}|{_normalize(user.username)}"
+
+
+def fill_search_names(apps, schema_editor):
+    BusinessMembership = apps.get_model('checkpoint', 'BusinessMembership')
+    batch = []
+    for membership in BusinessMembership.objects.select_related('user').iterator(chunk_size=2000):
+        membership.search_name = search_name_for(membership.user)
+        batch.append(membership)
+        if len(batch) >= 2000:
+            BusinessMembership.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    BusinessMembership.objects.bulk_update(batch, ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0015_businessmembership_pin_rotated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessmembership',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=320),
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='businessmembership',
+            index=GinIndex(fields=['search_name'], name='checkpoint_member_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
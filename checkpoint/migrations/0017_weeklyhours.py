@@ -0,0 +1,92 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:12
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Copy of weekly_hours.rollup and its week helpers as they were when this migration was written:
+# {(business_id, user_id, local Monday): [scheduled_seconds, shift_count, worked_seconds]}, with
+# shifts and clocks crossing midnight on Sunday split between the two weeks
+def _week_of(dt):
+    day = timezone.localtime(dt).date()
+    return day - timedelta(days=day.weekday())
+
+
+def _split_by_week(start, end):
+    tz = timezone.get_current_timezone()
+    week = _week_of(start)
+    if end <= start:
+        return [(week, 0)]
+    parts = []
+    while True:
+        week_start_dt = timezone.make_aware(datetime.combine(week, time.min), tz)
+        week_end_dt = timezone.make_aware(datetime.combine(week + timedelta(days=7), time.min), tz)
+        if week_start_dt >= end:
+            return parts
+        overlap = min(end, week_end_dt) - max(start, week_start_dt)
+        parts.append((week, int(overlap.total_seconds())))
+        week += timedelta(days=7)
+
+
+def rollup(shifts, clocks):
+    totals = defaultdict(lambda: [0, 0, 0])
+    for business_id, user_id, start, end in shifts:
+        for week, seconds in _split_by_week(start, end):
+            row = totals[business_id, user_id, week]
+            row[0] += seconds
+            row[1] += 1
+    for business_id, user_id, clock_in, clock_out in clocks:
+        for week, seconds in _split_by_week(clock_in, clock_out):
+            totals[business_id, user_id, week][2] += seconds
+    return totals
+
+
+def fill_weekly_hours(apps, schema_editor):
+    WorkShift = apps.get_model('checkpoint', 'WorkShift')
+    TimeClock = apps.get_model('checkpoint', 'TimeClock')
+    WeeklyHours = apps.get_model('checkpoint', 'WeeklyHours')
+    totals = rollup(
+        WorkShift.objects.values_list('business_id', 'user_id', 'start', 'end').iterator(chunk_size=2000),
+        TimeClock.objects.filter(clock_out__isnull=False)
+        .values_list('business_id', 'user_id', 'clock_in', 'clock_out').iterator(chunk_size=2000),
+    )
+    WeeklyHours.objects.bulk_create([
+        WeeklyHours(
+            business_id=business_id, user_id=user_id, week_start=week,
+            scheduled_seconds=scheduled, shift_count=count, worked_seconds=worked,
+        )
+        for (business_id, user_id, week), (scheduled, count, worked) in totals.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0016_businessmembership_search_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('scheduled_seconds', models.PositiveIntegerField(default=0)),
+                ('shift_count', models.PositiveIntegerField(default=0)),
+                ('worked_seconds', models.PositiveIntegerField(default=0)),
+                ('business', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_hours', to='checkpoint.business')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_hours', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business', 'week_start'], name='checkpoint__busines_2033b5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('business', 'user', 'week_start'), name='unique_weekly_hours')],
+            },
+        ),
+        migrations.RunPython(fill_weekly_hours, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.2 on 2026-10-18 01:34
+
+import checkpoint.models
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+def refuse_overlapping_shifts(apps, schema_editor):
+    # The constraint can't be added over rows that already break it. Rather than pick which of two
+    # bookings to drop, stop here and list them; `manage.py check_shift_conflicts` prints the same
+    # list, so they can be fixed and the migration run again
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    WorkShift = apps.get_model('checkpoint', 'WorkShift')
+    rows = WorkShift.objects.order_by('user_id', 'start', 'end').values_list('id', 'user_id', 'start', 'end')
+    clashes, user_id, open_shifts = [], None, []
+    for shift_id, shift_user_id, start, end in rows.iterator(chunk_size=2000):
+        if shift_user_id != user_id:
+            user_id, open_shifts = shift_user_id, []
+        # Shifts whose end is still after this start overlap it; same half-open rule as the constraint
+        open_shifts = [(other_id, other_end) for other_id, other_end in open_shifts if other_end > start]
+        if start < end:
+            clashes.extend((user_id, other_id, shift_id) for other_id, _ in open_shifts)
+            open_shifts.append((shift_id, end))
+    if clashes:
+        listed = '\n'.join(f'  user {uid}: shift {a} overlaps shift {b}' for uid, a, b in clashes)
+        raise RuntimeError(
+            f'{len(clashes)} pair(s) of overlapping shifts block checkpoint_workshift_no_overlap; '
+            f'move or delete one of each pair and migrate again:\n{listed}'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0017_weeklyhours'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workshift',
+            index=models.Index(fields=['user', 'start'], name='checkpoint__user_id_01b6c0_idx'),
+        ),
+        BtreeGistExtension(),
+        migrations.RunPython(refuse_overlapping_shifts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='workshift',
+            constraint=checkpoint.models.PostgresExclusionConstraint(expressions=[('user', '='), (checkpoint.models.TsTzRange('start', django.db.models.functions.comparison.Greatest('start', 'end')), '&&')], name='checkpoint_workshift_no_overlap', violation_error_message='This person is already booked into an overlapping shift.'),
+        ),
+    ]
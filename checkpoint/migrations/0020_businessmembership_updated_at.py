@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0019_business_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='businessmembership',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
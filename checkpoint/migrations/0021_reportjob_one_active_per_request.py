@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:40
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    # Racing requests before this constraint could queue the same report twice; keep the oldest
+    # active job of each request (the one a worker is most likely rendering) and fail the rest
+    ReportJob = apps.get_model('checkpoint', 'ReportJob')
+    active = ReportJob.objects.filter(status__in=['pending', 'running'])
+    duplicates = (
+        active.values('requested_by_id', 'kind', 'business_id', 'from_date', 'to_date')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+    )
+    for dup in duplicates:
+        dup.pop('n')
+        stale = active.filter(**dup).order_by('created_at', 'id')[1:]
+        ReportJob.objects.filter(pk__in=[job.pk for job in stale]).update(
+            status='failed', error='Duplicate of another queued request.',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkpoint', '0020_businessmembership_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reportjob',
+            constraint=models.UniqueConstraint(models.F('requested_by'), models.F('kind'), django.db.models.functions.comparison.Coalesce('business', 0), models.F('from_date'), models.F('to_date'), condition=models.Q(('status__in', ['pending', 'running'])), name='one_active_report_job_per_request'),
+        ),
+    ]
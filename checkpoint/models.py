@@ -1,23 +1,40 @@
-from django.db import models
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GinIndex
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
 from django.utils import timezone
-import random
-import string
 import uuid
 
-# Collision-resistant enough for display; uniqueness is enforced at the DB level
+# Field default for pin_code; the allocator hands out codes that can't collide, so
+# rotations never trip the unique constraint
 def generate_pin():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+    from .pin_allocator import allocate_pin
+    return allocate_pin()
 
 
 # A branch/location — the top-level entity everything else hangs off
 class Business(models.Model):
     name = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Change counter behind the JSON feeds' ETags, bumped after every committed shift, clock,
+    # membership or name change (see bump_business_version). Kept in the table rather than the
+    # cache so every process agrees on it and an eviction can't resurrect an old value
+    version = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # version only moves through bump_business_version's UPDATE; saving an instance loaded
+        # before a bump must not write the old value back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'version'
+            ]
+        super().save(*args, **kwargs)
+
 
 # Links a user to a branch with a specific role; a user can belong to multiple branches
 class BusinessMembership(models.Model):
@@ -41,21 +58,42 @@ class BusinessMembership(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     business = models.ForeignKey(Business, on_delete=models.CASCADE)
     role = models.CharField(max_length=20, choices=role_choices, default=EMPLOYEE)
-    # qr_token is used to generate a scannable QR code for clock-in/out
+    # qr_token is the per-membership secret that signs the short-lived QR tokens (see scan_tokens);
+    # it never leaves the server
     qr_token = models.UUIDField(default=uuid.uuid4, unique=True, db_index=True, editable=False)
     pin_code = models.CharField(max_length=6, unique=True, db_index=True, default=generate_pin)
+    # A PIN is single-use: once the clock changes after this, the rotation job issues a new one
+    pin_rotated_at = models.DateTimeField(default=timezone.now)
     # Set to True when the account is created by an owner; cleared after first login password change
     must_change_password = models.BooleanField(default=False)
+    # Normalized "<first last>|<username>" for staff search (see staff_search); set on save and
+    # refreshed from the User post_save signal when the name changes
+    search_name = models.CharField(max_length=320, blank=True, default='', editable=False)
+    # Moves on every full save (role changes) and is touched by the User and StaffProfile signals,
+    # so the report cache fingerprint sees name and position edits too. PIN rotation saves with
+    # update_fields and leaves it alone
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # One membership record per (user, branch) pair
         constraints = [
             models.UniqueConstraint(fields=['user', 'business'], name='unique_membership')
         ]
+        # Staff search filters search_name with LIKE '%...%', which a btree can't serve
+        indexes = [
+            GinIndex(fields=['search_name'], opclasses=['gin_trgm_ops'], name='checkpoint_member_search_trgm'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.business.name} ({self.role})"
 
+    def save(self, *args, **kwargs):
+        # Partial saves (PIN rotation, role changes) leave the name alone and skip loading the user
+        if kwargs.get('update_fields') is None:
+            from .staff_search import search_name_for
+            self.search_name = search_name_for(self.user)
+        super().save(*args, **kwargs)
+
     def has_min_role(self, role):
         # Returns True if this membership's role is at least as privileged as the given role
         return self.role_ranks.get(self.role, -1) >= self.role_ranks.get(role, 999)
@@ -92,6 +130,36 @@ class StaffProfile(models.Model):
         return f"Profile for {self.membership.user.username} @ {self.membership.business.name}"
 
 
+# tstzrange(lower, upper): half-open, so back-to-back shifts don't overlap
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+# An ExclusionConstraint on PostgreSQL and nothing elsewhere, where save_shift's overlap query is
+# the only guard (see shift_conflicts). It is only checked by the database on save: model and form
+# validation skip it, so an overlapping booking reaches save_shift and is reported in its words
+# rather than as an anonymous form error
+class PostgresExclusionConstraint(ExclusionConstraint):
+    def constraint_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return None
+        return super().constraint_sql(model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return None
+        return super().create_sql(model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return None
+        return super().remove_sql(model, schema_editor)
+
+    def validate(self, model, instance, exclude=None, using=DEFAULT_DB_ALIAS):
+        return
+
+
 # A scheduled shift for a user at a branch
 class WorkShift(models.Model):
     business = models.ForeignKey('Business', on_delete=models.CASCADE, related_name='shifts')
@@ -110,6 +178,30 @@ class WorkShift(models.Model):
         )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save; report caching fingerprints on it
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Calendar feeds filter by a visible date window, per branch or per branch + staff member
+        indexes = [
+            models.Index(fields=['business', 'start']),
+            models.Index(fields=['business', 'user', 'start']),
+            # Double-booking checks look across every branch for one person's overlapping shifts
+            models.Index(fields=['user', 'start']),
+        ]
+        # Nobody is booked into two overlapping shifts, at one branch or across branches, even when
+        # two bookings race. GREATEST turns a shift saved with its end before its start into an
+        # empty range instead of an error. Needs btree_gist for the = on user_id
+        constraints = [
+            PostgresExclusionConstraint(
+                name='checkpoint_workshift_no_overlap',
+                expressions=[
+                    ('user', RangeOperators.EQUAL),
+                    (TsTzRange('start', Greatest('start', 'end')), RangeOperators.OVERLAPS),
+                ],
+                violation_error_message="This person is already booked into an overlapping shift.",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.business.name} ({self.start} to {self.end})"
@@ -133,11 +225,21 @@ class TimeClock(models.Model):
     clock_out = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save (include it in update_fields); report caching fingerprints on it
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['business', 'user', 'clock_in']),
         ]
+        # At most one open entry per person per branch, even if two scanners race
+        constraints = [
+            models.UniqueConstraint(
+                fields=['business', 'user'],
+                condition=models.Q(clock_out__isnull=True),
+                name='one_open_timeclock_per_member',
+            ),
+        ]
 
     def __str__(self):
         status = "IN" if not self.clock_out else "OUT"
@@ -146,4 +248,91 @@ class TimeClock(models.Model):
     @property
     def is_open(self):
         # True while the employee is still clocked in (no clock-out recorded yet)
-        return self.clock_out is None
\ No newline at end of file
+        return self.clock_out is None
+
+
+# Per branch, person and week (Monday, local time) totals maintained from the WorkShift/TimeClock
+# signals by weekly_hours.refresh_weekly_hours; a row only exists while the week has something in it
+class WeeklyHours(models.Model):
+    business = models.ForeignKey('Business', on_delete=models.CASCADE, related_name='weekly_hours')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='weekly_hours')
+    week_start = models.DateField()
+
+    scheduled_seconds = models.PositiveIntegerField(default=0)
+    shift_count = models.PositiveIntegerField(default=0)
+    worked_seconds = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['business', 'user', 'week_start'], name='unique_weekly_hours'),
+        ]
+        # Chat answers read a whole branch's week
+        indexes = [
+            models.Index(fields=['business', 'week_start']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.business.name} (week of {self.week_start})"
+
+
+# A queued PDF report; the web request only creates the row and a separate
+# worker process (manage.py process_report_jobs) renders it into MEDIA_ROOT
+class ReportJob(models.Model):
+    OWNER = 'owner'
+    SUPERVISOR = 'supervisor'
+
+    kind_choices = [
+        (OWNER, 'Owner report'),
+        (SUPERVISOR, 'Supervisor report'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    status_choices = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    ACTIVE_STATUSES = [PENDING, RUNNING]
+
+    # Public id used in the status URL so other users' jobs can't be enumerated
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='report_jobs')
+    kind = models.CharField(max_length=20, choices=kind_choices)
+    # Only set for supervisor reports; owner reports cover every owned branch
+    business = models.ForeignKey('Business', on_delete=models.CASCADE, null=True, blank=True, related_name='report_jobs')
+    from_date = models.DateField()
+    to_date = models.DateField()
+
+    status = models.CharField(max_length=20, choices=status_choices, default=PENDING)
+    # Path relative to MEDIA_ROOT once the PDF has been written (a shared report cache file)
+    file_path = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['requested_by', 'kind', 'from_date', 'to_date']),
+        ]
+        # One queued or rendering job per identical request, so concurrent clicks can't both insert
+        # (see enqueue_report_job). Owner jobs have no branch and NULLs never collide in a unique
+        # index, hence the COALESCE. The statuses are ACTIVE_STATUSES, which Meta can't see
+        constraints = [
+            models.UniqueConstraint(
+                'requested_by', 'kind', Coalesce('business', 0), 'from_date', 'to_date',
+                condition=models.Q(status__in=['pending', 'running']),
+                name='one_active_report_job_per_request',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.from_date}–{self.to_date} ({self.status})"
@@ -0,0 +1,50 @@
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+from pypdf import PdfWriter
+from weasyprint import HTML as WeasyHTML, CSS as WeasyCSS
+
+# One pool per process, created on first use and reused so workers keep their fonts warm
+_executor = None
+_executor_size = 0
+
+
+def _render_html(html_str, css_path):
+    # Runs inside pool workers, which only get the finished HTML and never touch Django
+    return WeasyHTML(string=html_str).write_pdf(stylesheets=[WeasyCSS(filename=css_path)])
+
+
+def _get_executor(processes):
+    global _executor, _executor_size
+    if _executor is None or _executor_size != processes:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        # spawn rather than fork: gunicorn workers hold DB connections and threads
+        _executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        _executor_size = processes
+    return _executor
+
+
+def render_html_pdfs(html_strings, css_path, processes):
+    # Renders each HTML document to its own PDF in parallel; results keep the input order
+    global _executor
+    executor = _get_executor(processes)
+    try:
+        return list(executor.map(_render_html, html_strings, repeat(css_path)))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool next time
+        _executor = None
+        raise
+
+
+def merge_pdfs(pdfs):
+    # Concatenates the pages of several PDFs (bytes) into one document
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(io.BytesIO(pdf))
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
@@ -0,0 +1,93 @@
+import hashlib
+import itertools
+import random
+import string
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+PIN_ALPHABET = string.ascii_uppercase + string.digits
+PIN_LENGTH = 6
+PIN_SPACE = len(PIN_ALPHABET) ** PIN_LENGTH
+PIN_SEQUENCE = "checkpoint_pin_seq"
+
+# 36^6 (about 2.18e9) is just over 2^31, so it needs 32 bits: the permutation runs over 2^32
+# and cycle-walks back into range. About half of that space is valid, so on average that costs
+# two passes
+_HALF_BITS = 16
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+# Non-PostgreSQL backends (local SQLite runs) have no sequences; a per-process counter
+# from a random offset is enough there since the held-code check still applies
+_local_counter = itertools.count(random.randrange(PIN_SPACE))
+_sequence_ready = False
+
+
+@lru_cache(maxsize=1)
+def _round_keys():
+    seed = hashlib.sha256(f"checkpoint.pin_allocator:{settings.SECRET_KEY}".encode()).digest()
+    return [seed[i * 8:(i + 1) * 8] for i in range(_ROUNDS)]
+
+
+def _feistel(value):
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for key in _round_keys():
+        mixed = int.from_bytes(hashlib.blake2b(right.to_bytes(2, "big"), key=key, digest_size=2).digest(), "big")
+        left, right = right, left ^ mixed
+    return (left << _HALF_BITS) | right
+
+
+# Keyed bijection on [0, PIN_SPACE): distinct inputs always give distinct codes, and without
+# SECRET_KEY consecutive outputs don't reveal the next one
+def permute(n):
+    value = _feistel(n % PIN_SPACE)
+    while value >= PIN_SPACE:
+        value = _feistel(value)
+    return value
+
+
+def encode_pin(value):
+    chars = []
+    for _ in range(PIN_LENGTH):
+        value, digit = divmod(value, len(PIN_ALPHABET))
+        chars.append(PIN_ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def _next_values(count):
+    # nextval() is non-transactional and lock-free, so concurrent rotations inside
+    # long scan transactions never wait on each other or receive the same value
+    global _sequence_ready
+    if connection.vendor != "postgresql":
+        return [next(_local_counter) for _ in range(count)]
+    with connection.cursor() as cursor:
+        if not _sequence_ready:
+            # Migration 0014 creates it; this covers code defaults evaluated by earlier migrations
+            cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {PIN_SEQUENCE}")
+            _sequence_ready = True
+        cursor.execute(f"SELECT nextval('{PIN_SEQUENCE}') FROM generate_series(1, %s)", [count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def allocate_pins(count):
+    # Codes come from a sequence run through the keyed permutation, so two allocations can't
+    # collide with each other. The single lookup below only skips codes still held from before
+    # this allocator (random legacy PINs) or from a previous trip around the 2.1B-code space
+    from .models import BusinessMembership
+
+    if not count:
+        return []
+    codes = [encode_pin(permute(n)) for n in _next_values(count)]
+    held = set(BusinessMembership.objects.filter(pin_code__in=codes).values_list("pin_code", flat=True))
+    while held:
+        codes = [code for code in codes if code not in held]
+        extra = [encode_pin(permute(n)) for n in _next_values(count - len(codes))]
+        held = set(BusinessMembership.objects.filter(pin_code__in=extra).values_list("pin_code", flat=True))
+        codes += extra
+    return codes
+
+
+def allocate_pin():
+    return allocate_pins(1)[0]
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils.crypto import salted_hmac
+
+from .models import Business, BusinessMembership, TimeClock, WorkShift
+
+# Rendered PDFs live here (relative to MEDIA_ROOT), one file per report + data fingerprint
+CACHE_DIR = 'reports/cache'
+
+
+def report_fingerprint(business_ids, from_dt, to_dt):
+    # Cheap summary of the rows a report reads. Any insert bumps the max id, any edit bumps
+    # updated_at and any delete drops the count, so a changed fingerprint means a changed report
+    parts = []
+    for qs in (
+        TimeClock.objects.filter(business_id__in=business_ids, clock_in__gte=from_dt, clock_in__lt=to_dt),
+        WorkShift.objects.filter(business_id__in=business_ids, start__lt=to_dt, end__gt=from_dt),
+    ):
+        agg = qs.aggregate(n=Count('id'), last_id=Max('id'), last_change=Max('updated_at'))
+        last_change = agg['last_change'].isoformat() if agg['last_change'] else ''
+        parts.append(f"{agg['n']}:{agg['last_id']}:{last_change}")
+
+    # Staff count + newest id catch joins and leaves; membership updated_at catches role changes
+    # and, through the User and StaffProfile signals, name and position edits. Branch names head
+    # every page of the report
+    staff = BusinessMembership.objects.filter(business_id__in=business_ids).aggregate(
+        n=Count('id', filter=Q(role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR])),
+        last_id=Max('id'),
+        last_change=Max('updated_at'),
+    )
+    last_change = staff['last_change'].isoformat() if staff['last_change'] else ''
+    parts.append(f"{staff['n']}:{staff['last_id']}:{last_change}")
+    parts.extend(Business.objects.filter(pk__in=business_ids).order_by('pk').values_list('name', flat=True))
+    return '|'.join(parts)
+
+
+def report_cache_path(kind, business_ids, from_dt, to_dt, fingerprint, owner_id=None):
+    # HMAC'd with SECRET_KEY so the file name can't be guessed from public ids and dates
+    key = '|'.join([
+        kind,
+        str(owner_id or ''),
+        ','.join(str(b) for b in sorted(business_ids)),
+        from_dt.isoformat(),
+        to_dt.isoformat(),
+        fingerprint,
+    ])
+    digest = salted_hmac('checkpoint.report_cache', key, algorithm='sha256').hexdigest()
+    return f"{CACHE_DIR}/{digest}.pdf"
+
+
+def _current_report(kind, business_ids, from_dt, to_dt, owner_id=None):
+    # (relative path for the current data, whether that PDF is already on disk)
+    fingerprint = report_fingerprint(business_ids, from_dt, to_dt)
+    relative_path = report_cache_path(kind, business_ids, from_dt, to_dt, fingerprint, owner_id=owner_id)
+    full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    if os.path.exists(full_path):
+        # Refresh the mtime so prune_report_cache keeps reports that are still being downloaded
+        os.utime(full_path)
+        return relative_path, True
+    return relative_path, False
+
+
+def built_report(kind, business_ids, from_dt, to_dt, owner_id=None):
+    # Path of the PDF for the current data if one has been rendered, else None. Never renders:
+    # the download views use it so a cache miss goes to the worker instead of a web process
+    relative_path, exists = _current_report(kind, business_ids, from_dt, to_dt, owner_id=owner_id)
+    return relative_path if exists else None
+
+
+def cached_report(kind, business_ids, from_dt, to_dt, render, owner_id=None):
+    # Returns the MEDIA_ROOT-relative path of the report, calling render() only when no PDF
+    # exists for the current data. Written to a temp file and renamed so readers never see half a PDF
+    relative_path, exists = _current_report(kind, business_ids, from_dt, to_dt, owner_id=owner_id)
+    if exists:
+        return relative_path
+    full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+
+    pdf = render()
+    directory = os.path.dirname(full_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(pdf)
+        # mkstemp creates 0600 files; nginx serves /media/ as another user
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return relative_path
+
+
+def prune_report_cache(max_age_seconds):
+    # Superseded fingerprints are never read again; drop files nobody has touched in max_age
+    directory = os.path.join(settings.MEDIA_ROOT, CACHE_DIR)
+    if not os.path.isdir(directory):
+        return 0
+
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
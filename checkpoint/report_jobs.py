@@ -0,0 +1,93 @@
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+# A job left RUNNING this long is assumed to belong to a worker that died and is picked up again
+STALE_AFTER = timedelta(minutes=30)
+
+
+def enqueue_report_job(user, kind, from_date, to_date, business=None):
+    # Returns (job, created); an identical request that is still queued or rendering is reused.
+    # A lookup can't lock a row that doesn't exist yet, so two concurrent first requests are
+    # settled by the one_active_report_job_per_request constraint: the loser reuses the winner's job
+    active = ReportJob.objects.filter(
+        requested_by=user,
+        kind=kind,
+        business=business,
+        from_date=from_date,
+        to_date=to_date,
+        status__in=ReportJob.ACTIVE_STATUSES,
+    )
+    existing = active.first()
+    if existing:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            job = ReportJob.objects.create(
+                requested_by=user,
+                kind=kind,
+                business=business,
+                from_date=from_date,
+                to_date=to_date,
+            )
+    except IntegrityError:
+        existing = active.first()
+        if existing is None:
+            raise
+        return existing, False
+    return job, True
+
+
+def claim_next_job():
+    # Marks the oldest waiting job as RUNNING; skip_locked lets several workers poll the same table
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ReportJob.PENDING)
+                | Q(status=ReportJob.RUNNING, started_at__lt=now - STALE_AFTER)
+            )
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = ReportJob.RUNNING
+        job.started_at = now
+        job.save(update_fields=['status', 'started_at'])
+        return job
+
+
+def run_report_job(job):
+    # Renders the PDF for a claimed job (or reuses the cached one) and records the outcome on the row;
+    # file_path points at the shared report cache, served to the requester by download_report_job
+    from .views.reports import _owner_businesses, _owner_report_file, _supervisor_report_file
+
+    try:
+        if job.kind == ReportJob.OWNER:
+            relative_path = _owner_report_file(
+                job.requested_by, _owner_businesses(job.requested_by), job.from_date, job.to_date
+            )
+        else:
+            relative_path = _supervisor_report_file(job.business, job.from_date, job.to_date)
+
+        job.status = ReportJob.DONE
+        job.file_path = relative_path
+    except Exception as exc:
+        logger.exception("Report job %s failed", job.token)
+        job.status = ReportJob.FAILED
+        job.error = str(exc)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file_path', 'error', 'finished_at'])
+    return job
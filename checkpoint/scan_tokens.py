@@ -0,0 +1,118 @@
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import NamedTuple, Optional
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import BusinessMembership, TimeClock
+from .pin_allocator import allocate_pins
+
+# QR tokens are "<membership pk>-<window>-<signature>", signed with the membership's secret
+# for one time window. Scanning them is a signature check plus the membership row lookup the
+# scan needs anyway, so nothing is written to BusinessMembership on the scan path
+QR_TOKEN_WINDOW = 30
+# Windows either side of the scan time still accepted, for a code shown just before a
+# boundary or a kiosk clock that's slightly off
+QR_TOKEN_GRACE_WINDOWS = 1
+
+_QR_TOKEN_RE = re.compile(r"^(\d+)-(\d+)-([0-9a-f]{16})$")
+
+
+def token_window(when):
+    return int(when.timestamp()) // QR_TOKEN_WINDOW
+
+
+def window_start(window):
+    return datetime.fromtimestamp(window * QR_TOKEN_WINDOW, tz=dt_timezone.utc)
+
+
+def _signature(membership, window):
+    return salted_hmac(
+        "checkpoint.scan_tokens", f"{membership.pk}:{window}",
+        secret=f"{membership.qr_token}", algorithm="sha256",
+    ).hexdigest()[:16]
+
+
+def issue_qr_token(membership, now=None):
+    window = token_window(now or timezone.now())
+    return f"{membership.pk}-{window}-{_signature(membership, window)}"
+
+
+def parse_qr_token(token):
+    # Returns (membership pk, window, signature), or None if it can't be one of ours
+    match = _QR_TOKEN_RE.match(str(token))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)), match.group(3)
+
+
+def qr_signature_valid(membership, window, signature, when):
+    if abs(window - token_window(when)) > QR_TOKEN_GRACE_WINDOWS:
+        return False
+    return constant_time_compare(signature, _signature(membership, window))
+
+
+# What code_spent needs about a member's clock: the latest clock-in or clock-out time recorded
+# (None if never), and when the first clock change since their PIN was issued was written
+class ClockHistory(NamedTuple):
+    last_event: Optional[datetime]
+    first_write: Optional[datetime]
+
+
+def clock_history(memberships):
+    # {membership pk: ClockHistory} for the given memberships, in one query
+    clocks = TimeClock.objects.filter(business_id=OuterRef("business_id"), user_id=OuterRef("user_id"))
+    rows = (
+        BusinessMembership.objects.filter(pk__in=[m.pk for m in memberships])
+        .annotate(
+            last_in=Subquery(clocks.order_by("-clock_in").values("clock_in")[:1]),
+            last_out=Subquery(clocks.filter(clock_out__isnull=False).order_by("-clock_out").values("clock_out")[:1]),
+            first_write=Subquery(
+                clocks.filter(updated_at__gte=OuterRef("pin_rotated_at")).order_by("updated_at").values("updated_at")[:1]
+            ),
+        )
+        .values_list("pk", "last_in", "last_out", "first_write")
+    )
+    return {
+        pk: ClockHistory(max((t for t in (last_in, last_out) if t is not None), default=None), first_write)
+        for pk, last_in, last_out, first_write in rows
+    }
+
+
+def code_spent(membership, history, when, window=None):
+    # Each code changes the clock once. Judged on the clock times actually recorded, not on when
+    # rows were written, so a kiosk's offline clock-in and the clock-out after it both apply when
+    # the queue is sent later. A QR token is spent by any clock event since its window opened. A
+    # PIN is spent by a clock event since it was issued that falls within a window of the scan or
+    # after it (a double tap or a replay), or by a change written after it was issued but before
+    # the scan, by which time the rotation job would have replaced it
+    if history is None:
+        return False
+    last_event, first_write = history
+    if window is not None:
+        return last_event is not None and last_event >= window_start(window)
+    recent = max(membership.pin_rotated_at, when - timedelta(seconds=QR_TOKEN_WINDOW))
+    if last_event is not None and last_event > recent:
+        return True
+    return first_write is not None and first_write < when
+
+
+def rotate_spent_pins(batch_size=500):
+    # Gives a fresh PIN to every membership whose clock changed since its PIN was issued.
+    # Rows a scan currently holds are skipped and picked up on the next run
+    now = timezone.now()
+    spent = BusinessMembership.objects.filter(Exists(TimeClock.objects.filter(
+        business_id=OuterRef("business_id"),
+        user_id=OuterRef("user_id"),
+        updated_at__gte=OuterRef("pin_rotated_at"),
+    )))
+    with transaction.atomic():
+        memberships = list(spent.select_for_update(skip_locked=True).order_by("pk")[:batch_size])
+        for membership, pin in zip(memberships, allocate_pins(len(memberships))):
+            membership.pin_code = pin
+            membership.pin_rotated_at = now
+        BusinessMembership.objects.bulk_update(memberships, ["pin_code", "pin_rotated_at"])
+    return len(memberships)
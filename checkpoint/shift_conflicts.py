@@ -0,0 +1,58 @@
+from itertools import groupby
+from operator import attrgetter
+
+from django.db import IntegrityError, transaction
+
+from .intervals import ShiftSpan, overlapping_pairs
+from .models import WorkShift
+
+# Nobody can be booked into two shifts that overlap, at the same branch or across branches. On
+# PostgreSQL the exclusion constraint declared on WorkShift enforces it, including between
+# concurrent bookings. save_shift checks first on every backend so callers get the clashing
+# shifts back rather than an IntegrityError; on SQLite that check is the only guard
+
+# Name of the exclusion constraint in WorkShift.Meta, as it appears in IntegrityError messages
+CONFLICT_CONSTRAINT = "checkpoint_workshift_no_overlap"
+
+
+# Raised by save_shift; `conflicts` are the person's existing shifts (business joined) it overlaps
+class ShiftConflict(Exception):
+    def __init__(self, conflicts):
+        super().__init__(f"overlaps {len(conflicts)} existing shift(s)")
+        self.conflicts = conflicts
+
+
+def find_conflicts(shift):
+    # The person's other shifts at any branch that overlap this one: one range query on (user, start)
+    if not shift.start < shift.end:
+        return []
+    conflicts = WorkShift.objects.filter(user_id=shift.user_id, start__lt=shift.end, end__gt=shift.start)
+    if shift.pk is not None:
+        conflicts = conflicts.exclude(pk=shift.pk)
+    return list(conflicts.select_related("business").order_by("start"))
+
+
+def save_shift(shift):
+    with transaction.atomic():
+        conflicts = find_conflicts(shift)
+        if conflicts:
+            raise ShiftConflict(conflicts)
+        try:
+            with transaction.atomic():
+                shift.save()
+        except IntegrityError as exc:
+            # A concurrent booking committed between the check and the insert
+            if CONFLICT_CONSTRAINT not in str(exc):
+                raise
+            raise ShiftConflict(find_conflicts(shift)) from exc
+    return shift
+
+
+def existing_conflicts(shifts):
+    # (earlier, later) ShiftSpan pairs of one person's overlapping shifts in a WorkShift queryset,
+    # swept per person
+    rows = shifts.order_by("user_id", "start", "end").values_list("id", "business_id", "user_id", "start", "end")
+    pairs = []
+    for _, spans in groupby(map(ShiftSpan._make, rows.iterator(chunk_size=2000)), key=attrgetter("user_id")):
+        pairs.extend(overlapping_pairs(spans))
+    return pairs
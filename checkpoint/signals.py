@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import BusinessMembership, StaffProfile, TimeClock, WorkShift
+from .staff_search import search_name_for
+from .weekly_hours import refresh_weekly_hours, weeks_touched
+from .utils import bump_business_version, invalidate_staff_status
+
+User = get_user_model()
+
+
+# Any clock, shift or membership change can move someone between status buckets
+# and changes what the branch's calendar/hours feeds return
+@receiver([post_save, post_delete], sender=TimeClock)
+@receiver([post_save, post_delete], sender=WorkShift)
+@receiver([post_save, post_delete], sender=BusinessMembership)
+def invalidate_status_for_business(sender, instance, **kwargs):
+    invalidate_staff_status(instance.business_id)
+    bump_business_version(instance.business_id)
+
+
+# Profiles hang off the membership, so look up the branch through it
+@receiver([post_save, post_delete], sender=StaffProfile)
+def invalidate_status_for_profile(sender, instance, **kwargs):
+    membership = BusinessMembership.objects.filter(id=instance.membership_id)
+    business_id = membership.values_list("business_id", flat=True).first()
+    invalidate_staff_status(business_id)
+    # The position is printed on reports; see report_fingerprint
+    membership.update(updated_at=timezone.now())
+
+
+# Cached snapshots and shift feeds carry display names; last_login-only saves are skipped
+@receiver(post_save, sender=User)
+def invalidate_status_for_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login", "password"}:
+        return
+    memberships = BusinessMembership.objects.filter(user=instance)
+    business_ids = list(memberships.values_list("business_id", flat=True))
+    invalidate_staff_status(*business_ids)
+    bump_business_version(*business_ids)
+    # Reports print the name too; see report_fingerprint
+    memberships.update(updated_at=timezone.now())
+
+
+# Membership search_name is a copy of the user's name, so it follows name and username changes
+@receiver(post_save, sender=User)
+def refresh_staff_search_name(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {"last_login", "password"}:
+        return
+    search_name = search_name_for(instance)
+    BusinessMembership.objects.filter(user=instance).exclude(search_name=search_name).update(search_name=search_name)
+
+
+# A shift edit can move it to another week or person, so remember where it was before saving
+@receiver(pre_save, sender=WorkShift)
+def remember_shift_weeks(sender, instance, **kwargs):
+    instance._weeks_before = None
+    if instance.pk:
+        instance._weeks_before = (
+            WorkShift.objects.filter(pk=instance.pk).values_list("business_id", "user_id", "start", "end").first()
+        )
+
+
+# Deleting a branch or person cascades to their WeeklyHours rows as well, so the per-row refresh
+# is only needed when shifts/clocks themselves are deleted
+def _cascaded(sender, origin):
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is not sender
+
+
+# Keeps WeeklyHours in step: every week the shift covered before and covers now is recomputed
+@receiver([post_save, post_delete], sender=WorkShift)
+def refresh_hours_for_shift(sender, instance, origin=None, **kwargs):
+    if _cascaded(sender, origin):
+        return
+    before = getattr(instance, "_weeks_before", None)
+    if before:
+        business_id, user_id, start, end = before
+        refresh_weekly_hours(business_id, user_id, weeks_touched(start, end))
+    refresh_weekly_hours(instance.business_id, instance.user_id, weeks_touched(instance.start, instance.end))
+
+
+# Only closed entries count as worked time; clock-ins leave the totals alone
+@receiver([post_save, post_delete], sender=TimeClock)
+def refresh_hours_for_clock(sender, instance, origin=None, **kwargs):
+    if instance.clock_out is not None and not _cascaded(sender, origin):
+        refresh_weekly_hours(instance.business_id, instance.user_id, weeks_touched(instance.clock_in, instance.clock_out))
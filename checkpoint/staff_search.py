@@ -0,0 +1,52 @@
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import BusinessMembership
+from .utils import normalize_name
+
+# BusinessMembership.search_name holds "<first last>|<username>" run through normalize_name, so
+# staff lookups are a single indexed query instead of lowercasing every member in Python.
+# normalize_name strips punctuation, so the separator can't appear in either half
+SEARCH_NAME_SEPARATOR = "|"
+
+# Rank values annotated as match_rank, best first
+EXACT_NAME, NAME_PREFIX, WORD_PREFIX, SUBSTRING = range(4)
+
+
+def normalize_query(text):
+    return " ".join(normalize_name(text or "").split())
+
+
+def search_name_for(user):
+    full = normalize_query(f"{user.first_name} {user.last_name}")
+    return f"{full}{SEARCH_NAME_SEPARATOR}{normalize_query(user.username)}"
+
+
+# Memberships in the given branches whose name or username contains the query, ranked: the exact
+# full name, then names starting with it, then a later word starting with it, then anywhere
+# else. Ties go by name. One query; the contains filter uses the trigram index on search_name
+def search_staff(business_ids, query):
+    needle = normalize_query(query)
+    if not needle:
+        return BusinessMembership.objects.none()
+    return (
+        BusinessMembership.objects
+        .filter(business_id__in=business_ids, search_name__contains=needle)
+        .annotate(match_rank=Case(
+            When(search_name__startswith=f"{needle}{SEARCH_NAME_SEPARATOR}", then=Value(EXACT_NAME)),
+            When(search_name__startswith=needle, then=Value(NAME_PREFIX)),
+            When(Q(search_name__contains=f" {needle}") | Q(search_name__contains=f"{SEARCH_NAME_SEPARATOR}{needle}"),
+                 then=Value(WORD_PREFIX)),
+            default=Value(SUBSTRING),
+            output_field=IntegerField(),
+        ))
+        .select_related("user", "business")
+        .order_by("match_rank", "search_name", "business__name")
+    )
+
+
+# Distinct users from ranked memberships, keeping each one's best rank
+def ranked_users(memberships):
+    seen = {}
+    for m in memberships:
+        seen.setdefault(m.user_id, (m.user, m.match_rank))
+    return list(seen.values())
@@ -1,3 +1,102 @@
+// Scans that couldn't reach the server wait here (with the time they happened) until the
+// kiosk is back online, then go up together through the batch endpoint
+const SCAN_QUEUE_KEY = "checkpoint.scanQueue";
+// Queued scans the server refused (code already used, no shift, ...) are kept here with their
+// scan time until a supervisor has entered them by hand and dismissed them
+const SCAN_REVIEW_KEY = "checkpoint.scanReview";
+let flushingQueue = false;
+
+function loadScanQueue() {
+    try {
+        return JSON.parse(localStorage.getItem(SCAN_QUEUE_KEY)) || [];
+    } catch (e) {
+        return [];
+    }
+}
+
+function saveScanQueue(queue) {
+    localStorage.setItem(SCAN_QUEUE_KEY, JSON.stringify(queue));
+}
+
+function loadScanReview() {
+    try {
+        return JSON.parse(localStorage.getItem(SCAN_REVIEW_KEY)) || [];
+    } catch (e) {
+        return [];
+    }
+}
+
+function saveScanReview(items) {
+    localStorage.setItem(SCAN_REVIEW_KEY, JSON.stringify(items));
+    renderScanReview();
+}
+
+function renderScanReview() {
+    const box = document.getElementById("scan-review");
+    if (!box) return;
+    const items = loadScanReview();
+    box.style.display = items.length ? "block" : "none";
+    box.querySelector("ul").replaceChildren(...items.map(item => {
+        const row = document.createElement("li");
+        row.style.cssText = "display: flex; justify-content: space-between; gap: 0.75rem; padding: 0.4rem 0; font-size: 0.82rem;";
+        const text = document.createElement("span");
+        text.textContent = `${new Date(item.scanned_at).toLocaleString()}: ${item.error}`;
+        const dismiss = document.createElement("button");
+        dismiss.textContent = "Done";
+        dismiss.style.cssText = "font-size: 0.75rem; padding: 0.15rem 0.6rem; border-radius: 9999px; border: 1px solid oklch(0% 0 0 / 0.12); background: none; cursor: pointer;";
+        dismiss.addEventListener("click", () => saveScanReview(loadScanReview().filter(other => other.id !== item.id)));
+        row.append(text, dismiss);
+        return row;
+    }));
+}
+
+function queueScan(scan) {
+    const queue = loadScanQueue();
+    queue.push({
+        ...scan,
+        id: `${Date.now()}-${Math.random().toString(36).slice(2, 8)}`,
+        scanned_at: new Date().toISOString(),
+    });
+    saveScanQueue(queue);
+    showResult(`Offline — scan saved and will sync automatically (${queue.length} waiting).`, "info");
+}
+
+async function flushScanQueue() {
+    const queue = loadScanQueue();
+    if (flushingQueue || !queue.length || !navigator.onLine) return;
+    flushingQueue = true;
+    const batch = queue.slice(0, 200);
+    const csrf = document.querySelector("meta[name='csrf-token']").content;
+    try {
+        const resp = await fetch("/scan-batch/", {
+            method: "POST",
+            headers: { "X-CSRFToken": csrf, "Content-Type": "application/json" },
+            body: JSON.stringify({ scans: batch }),
+        });
+        if (!resp.ok) return;  // Keep everything queued and retry later
+        const data = await resp.json();
+        const done = new Set(data.results.map(r => r.id));
+        // Scans taken while this request was in flight are still in storage; keep them
+        saveScanQueue(loadScanQueue().filter(scan => !done.has(scan.id)));
+        const failed = data.results.filter(r => r.status !== 200);
+        if (failed.length) {
+            // Retrying won't change these answers, so they move to the manual-entry list instead of vanishing
+            const scannedAt = new Map(batch.map(scan => [scan.id, scan.scanned_at]));
+            saveScanReview([
+                ...loadScanReview(),
+                ...failed.map(r => ({ id: r.id, scanned_at: scannedAt.get(r.id), error: r.error })),
+            ]);
+            showResult(`Synced ${data.results.length - failed.length} offline scan(s). ${failed.length} need manual entry — see below.`, "error");
+        } else {
+            showResult(`Synced ${data.results.length} offline scan(s).`, "success");
+        }
+    } catch (e) {
+        // Still offline
+    } finally {
+        flushingQueue = false;
+    }
+}
+
 async function handlePin() {
     const input = document.getElementById("pin-input");
     const pin = input.value.trim().toUpperCase();
@@ -20,7 +119,8 @@ async function handlePin() {
             showResult(data.error || "Something went wrong.", "error");
         }
     } catch (e) {
-        showResult("Network error — please try again.", "error");
+        queueScan({ pin });
+        input.value = "";
     }
 }
 
@@ -31,4 +131,9 @@ document.addEventListener("DOMContentLoaded", function () {
             if (e.key === "Enter") handlePin();
         });
     }
+    renderScanReview();
+    flushScanQueue();
 });
+
+window.addEventListener("online", flushScanQueue);
+setInterval(flushScanQueue, 30000);
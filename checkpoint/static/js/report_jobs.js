@@ -0,0 +1,57 @@
+// Report forms carrying data-report-job-url are queued for the background worker
+// instead of being rendered inline; we poll the job and follow the PDF link once it's ready.
+(function () {
+    const POLL_MS = 2000;
+
+    function getCsrf() {
+        return document.cookie.split('; ').find(r => r.startsWith('csrftoken='))?.split('=')[1] || '';
+    }
+
+    async function poll(statusUrl, button) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, POLL_MS));
+            const res = await fetch(statusUrl, { headers: { 'Accept': 'application/json' } });
+            const data = await res.json();
+            if (data.status === 'done') {
+                window.location.href = data.download_url;
+                return;
+            }
+            if (data.status === 'failed' || !res.ok) {
+                throw new Error(data.error || 'The report could not be generated.');
+            }
+            button.textContent = data.status === 'running' ? 'Rendering…' : 'Queued…';
+        }
+    }
+
+    document.querySelectorAll('form[data-report-job-url]').forEach(form => {
+        form.addEventListener('submit', async (event) => {
+            // Buttons with their own formaction (the CSV export) are plain streamed downloads
+            if (event.submitter && event.submitter.hasAttribute('formaction')) {
+                return;
+            }
+            event.preventDefault();
+            const button = form.querySelector('button[type="submit"]');
+            const label = button.textContent;
+            button.disabled = true;
+            button.textContent = 'Queued…';
+
+            try {
+                const res = await fetch(form.dataset.reportJobUrl, {
+                    method: 'POST',
+                    headers: { 'X-CSRFToken': getCsrf() },
+                    body: new FormData(form),
+                });
+                const data = await res.json();
+                if (!res.ok) {
+                    throw new Error(data.error || 'The report could not be queued.');
+                }
+                await poll(data.status_url, button);
+            } catch (err) {
+                alert(err.message);
+            } finally {
+                button.disabled = false;
+                button.textContent = label;
+            }
+        });
+    });
+})();
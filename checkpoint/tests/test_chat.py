@@ -1,13 +1,30 @@
+import json
+import random
 import time
-from datetime import datetime, timedelta
-from unittest.mock import patch
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from asgiref.sync import async_to_sync
 
 from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from ..models import Business, BusinessMembership, WorkShift, StaffProfile
+from ..chat_parser import ChatRoster, parse_chat_query
+from ..intervals import ShiftSpan, overlap_groups, overlapping_pairs, shift_overlap_groups
+from ..staff_search import EXACT_NAME, NAME_PREFIX, search_staff
+from ..views.chat import ChatContext
+from ..utils import (
+    _extraction_cache_key,
+    aextract_hours_query,
+    aextract_person_schedule_query,
+    aextract_schedule_query,
+    extraction_cache_stats,
+    reset_extraction_cache_stats,
+)
 
 User = get_user_model()
 
@@ -70,7 +87,7 @@ class ChatRateLimitTests(TestCase):
     # A successful request should increment the session counter by 1
     def test_usage_increments_after_successful_message(self):
         self._set_usage(0)
-        with patch('checkpoint.views.chat.extract_schedule_query',
+        with patch('checkpoint.views.chat.aextract_schedule_query',
                    return_value={'date': None, 'branch_name': None}):
             self.client.post(self.url, {'message': 'something'})
         count = self.client.session.get(f'chat_{timezone.localdate().isoformat()}', 0)
@@ -90,7 +107,7 @@ class ChatWhoIsWorkingTests(TestCase):
     def test_specific_date_returns_scheduled_employee(self):
         today = timezone.localdate()
         _shift(self.business, self.emp, today)
-        with patch('checkpoint.views.chat.extract_schedule_query',
+        with patch('checkpoint.views.chat.aextract_schedule_query',
                    return_value={'date': today.isoformat(), 'branch_name': None}):
             response = self.client.post(self.url, {'message': f'who is working on {today}'})
         self.assertIn('Bob', response.json()['answer'])
@@ -98,7 +115,7 @@ class ChatWhoIsWorkingTests(TestCase):
     # When no shifts exist the response should say no one is scheduled
     def test_no_shifts_returns_not_scheduled_message(self):
         today = timezone.localdate()
-        with patch('checkpoint.views.chat.extract_schedule_query',
+        with patch('checkpoint.views.chat.aextract_schedule_query',
                    return_value={'date': today.isoformat(), 'branch_name': None}):
             response = self.client.post(self.url, {'message': f'who is working on {today}'})
         self.assertIn('No one is scheduled', response.json()['answer'])
@@ -123,7 +140,7 @@ class ChatWhoIsOffTests(TestCase):
     def test_unscheduled_employee_appears_in_off_list(self):
         monday = self._this_monday()
         _shift(self.business, self.emp1, monday)
-        with patch('checkpoint.views.chat.extract_hours_query',
+        with patch('checkpoint.views.chat.aextract_hours_query',
                    return_value={'person_name': None, 'week': 'this', 'branch_name': None}):
             response = self.client.post(self.url, {'message': 'who is not working this week'})
         answer = response.json()['answer']
@@ -147,7 +164,7 @@ class ChatShiftCountTests(TestCase):
         for i in range(3):
             _shift(self.business, self.emp1, monday + timedelta(days=i))
         _shift(self.business, self.emp2, monday)
-        with patch('checkpoint.views.chat.extract_hours_query',
+        with patch('checkpoint.views.chat.aextract_hours_query',
                    return_value={'person_name': None, 'week': 'this', 'branch_name': None}):
             response = self.client.post(self.url, {'message': 'how many shifts this week'})
         answer = response.json()['answer']
@@ -172,7 +189,7 @@ class ChatOverlappingShiftsTests(TestCase):
         target = timezone.localdate()
         _shift(self.business, self.emp1, target, start_h=9, end_h=17)
         _shift(self.business, self.emp2, target, start_h=12, end_h=20)
-        with patch('checkpoint.views.chat.extract_schedule_query',
+        with patch('checkpoint.views.chat.aextract_schedule_query',
                    return_value={'date': target.isoformat(), 'branch_name': None}):
             response = self.client.post(self.url, {'message': f'who is working at the same time on {target}'})
         answer = response.json()['answer']
@@ -185,11 +202,82 @@ class ChatOverlappingShiftsTests(TestCase):
         target = timezone.localdate()
         _shift(self.business, self.emp1, target, start_h=9, end_h=13)
         _shift(self.business, self.emp2, target, start_h=14, end_h=18)
-        with patch('checkpoint.views.chat.extract_schedule_query',
+        with patch('checkpoint.views.chat.aextract_schedule_query',
                    return_value={'date': target.isoformat(), 'branch_name': None}):
             response = self.client.post(self.url, {'message': f'who is working at the same time on {target}'})
         self.assertIn('No overlapping', response.json()['answer'])
 
+    # In a chain A–B, B–C only the pairs that really overlap are listed, not A with C
+    def test_chained_shifts_list_only_real_pairs(self):
+        target = timezone.localdate()
+        emp3, _ = _add_employee(self.business, 'emp3', 'Dan', 'Brown')
+        _shift(self.business, self.emp1, target, start_h=8, end_h=12)
+        _shift(self.business, self.emp2, target, start_h=11, end_h=15)
+        _shift(self.business, emp3, target, start_h=14, end_h=18)
+        with patch('checkpoint.views.chat.aextract_schedule_query',
+                   return_value={'date': target.isoformat(), 'branch_name': None}):
+            response = self.client.post(self.url, {'message': f'who is working at the same time on {target}'})
+        lines = response.json()['answer'].splitlines()[1:]
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Bob', lines[0])
+        self.assertIn('Carol', lines[0])
+        self.assertIn('Carol', lines[1])
+        self.assertIn('Dan', lines[1])
+        self.assertFalse(any('Bob' in line and 'Dan' in line for line in lines))
+
+
+# The sweep engine must agree with comparing every pair, treat touching shifts as
+# separate, and group whole-branch scans per business
+@override_settings(USE_TZ=True, TIME_ZONE="UTC")
+class IntervalEngineTests(TestCase):
+
+    # Spans as (start hour, end hour) on one day
+    def _spans(self, hours):
+        day = datetime(2026, 3, 2, tzinfo=dt_timezone.utc)
+        return [
+            ShiftSpan(i, 1, i, day + timedelta(hours=start), day + timedelta(hours=end))
+            for i, (start, end) in enumerate(hours)
+        ]
+
+    # Pairs from the sweep match the nested loop on random data
+    def test_pairs_match_brute_force(self):
+        rng = random.Random(7)
+        spans = self._spans([(h, h + rng.choice((1, 3, 6))) for h in (rng.randrange(48) for _ in range(200))])
+        expected = {
+            (a.id, b.id) for a in spans for b in spans
+            if a.id < b.id and a.start < b.end and b.start < a.end
+        }
+        self.assertEqual({tuple(sorted((a.id, b.id))) for a, b in overlapping_pairs(spans)}, expected)
+
+    # A shift ending when the next starts isn't an overlap; a chain A-B-C is one group
+    def test_groups_chain_and_touching_is_not_overlap(self):
+        spans = self._spans([(9, 12), (12, 15), (16, 20), (19, 22), (21, 23)])
+        self.assertEqual(overlapping_pairs(spans[:2]), [])
+        self.assertEqual([[s.id for s in group] for group in overlap_groups(spans)], [[2, 3, 4]])
+
+    # A whole-branch scan groups per business and honours the optional range
+    def test_shift_overlap_groups_per_business(self):
+        owner, cafe = _setup_owner()
+        other = Business.objects.create(name='Other')
+        bob, _ = _add_employee(cafe, 'emp1', 'Bob', 'Jones')
+        carol, _ = _add_employee(cafe, 'emp2', 'Carol', 'White')
+        monday = date(2026, 3, 2)
+        _shift(cafe, bob, monday, 9, 17)
+        _shift(cafe, carol, monday, 12, 20)
+        _shift(cafe, bob, monday + timedelta(days=3), 9, 17)
+        _shift(cafe, carol, monday + timedelta(days=3), 10, 12)
+        dan, _ = _add_employee(other, 'emp3', 'Dan', 'Brown')
+        _shift(other, dan, monday, 9, 17)
+        groups = shift_overlap_groups(WorkShift.objects.all())
+        self.assertEqual(list(groups), [cafe.id])
+        self.assertEqual(len(groups[cafe.id]), 2)
+        tz = timezone.get_current_timezone()
+        first_day = shift_overlap_groups(
+            WorkShift.objects.filter(business=cafe),
+            timezone.make_aware(datetime(2026, 3, 2), tz), timezone.make_aware(datetime(2026, 3, 3), tz),
+        )
+        self.assertEqual(len(first_day[cafe.id]), 1)
+
 
 # Tests that an employee's assigned position is returned when asked
 @override_settings(USE_TZ=True, TIME_ZONE="UTC")
@@ -203,7 +291,7 @@ class ChatPositionTests(TestCase):
     # When a StaffProfile position is set it should appear in the answer alongside the name
     def test_position_returned_when_assigned(self):
         StaffProfile.objects.create(membership=self.mem, position='Kitchen')
-        with patch('checkpoint.views.chat.extract_person_schedule_query',
+        with patch('checkpoint.views.chat.aextract_person_schedule_query',
                    return_value={'person_name': 'Bob', 'week': 'this', 'branch_name': None}):
             response = self.client.post(self.url, {'message': 'what position is Bob'})
         answer = response.json()['answer']
@@ -221,7 +309,7 @@ class ChatResponseTimingTests(TestCase):
 
     # Full round-trip for a schedule query should complete in under 1 second
     def test_response_returns_within_one_second(self):
-        with patch('checkpoint.views.chat.extract_schedule_query',
+        with patch('checkpoint.views.chat.aextract_schedule_query',
                    return_value={'date': timezone.localdate().isoformat(), 'branch_name': None}):
             start = time.time()
             self.client.post(self.url, {'message': 'who is working today'})
@@ -239,7 +327,7 @@ class ChatErrorMessageTests(TestCase):
 
     # An unrecognised message should return HTTP 200 with a non-empty 'answer' string
     def test_unrecognised_query_returns_valid_json_answer(self):
-        with patch('checkpoint.views.chat.extract_schedule_query',
+        with patch('checkpoint.views.chat.aextract_schedule_query',
                    return_value={'date': None, 'branch_name': None}):
             response = self.client.post(self.url, {'message': 'banana'})
         self.assertEqual(response.status_code, 200)
@@ -247,3 +335,280 @@ class ChatErrorMessageTests(TestCase):
         self.assertIn('answer', data)
         self.assertIsInstance(data['answer'], str)
         self.assertGreater(len(data['answer']), 0)
+
+
+# Tests the local intent/entity parser that answers common phrasings without the LLM
+class ChatLocalParserTests(TestCase):
+    def setUp(self):
+        # Saturday, so "friday" and "next week" resolve to known dates
+        self.today = datetime(2026, 10, 17).date()
+        self.roster = ChatRoster(
+            branch_names=['Cafe Nero', 'Nero Soho'],
+            people=[('Bob', 'Jones', 'emp1'), ('Carol', 'White', 'emp2'), ('Will', 'Hart', 'emp3')],
+        )
+
+    def _parse(self, kind, message):
+        return parse_chat_query(kind, message, self.today, self.roster)
+
+    # Relative days, weekdays and a known branch are resolved locally
+    def test_schedule_date_and_branch(self):
+        self.assertEqual(self._parse('schedule', 'who is working tomorrow'),
+                         {'date': '2026-10-18', 'branch_name': None})
+        self.assertEqual(self._parse('schedule', 'who is working at cafe nero on friday'),
+                         {'date': '2026-10-23', 'branch_name': 'Cafe Nero'})
+
+    # A place the roster doesn't know is left to the LLM rather than ignored
+    def test_unknown_branch_falls_back(self):
+        self.assertIsNone(self._parse('schedule', 'who is working at Starbucks tomorrow'))
+
+    # A schedule question without a date isn't guessed at
+    def test_schedule_without_date_falls_back(self):
+        self.assertIsNone(self._parse('schedule', 'who is working'))
+
+    # Hours questions pick up the person and the week; unknown names fall back
+    def test_hours_person_and_week(self):
+        self.assertEqual(self._parse('hours', 'how many hours does Bob have next week'),
+                         {'person_name': 'Bob', 'week': 'next', 'branch_name': None})
+        self.assertIsNone(self._parse('hours', 'how many hours does Jo have'))
+
+    # Everyday words that are also first names only match when capitalised
+    def test_ambiguous_first_name_needs_capital(self):
+        self.assertEqual(self._parse('hours', 'will anyone work this week')['person_name'], None)
+        self.assertEqual(self._parse('person_schedule', 'when does Will work')['person_name'], 'Will')
+
+    # Two different roster people in one question is ambiguous
+    def test_two_people_falls_back(self):
+        self.assertIsNone(self._parse('person_schedule', 'when are bob and carol working'))
+
+    # Shift creation needs a person, a date and a time range, converted to 24h
+    def test_shift_creation(self):
+        self.assertEqual(
+            self._parse('shift_creation', 'add a shift for Bob Jones on 20th Oct 9am to 5pm'),
+            {'person_name': 'Bob Jones', 'branch_name': None, 'date': '2026-10-20',
+             'start_time': '09:00', 'end_time': '17:00'},
+        )
+        self.assertIsNone(self._parse('shift_creation', 'add a shift for Bob Jones on 20th Oct'))
+
+    # Bare ranges are read as a day shift only when just one reading ends after the start
+    def test_shift_creation_bare_ranges(self):
+        for message, times in (
+            ('add Bob Jones 9-5 on 20th Oct', ('09:00', '17:00')),
+            ('add Bob Jones 9-17 on 20th Oct', ('09:00', '17:00')),
+            ('add Bob Jones 1-5pm on 20th Oct', ('13:00', '17:00')),
+        ):
+            parsed = self._parse('shift_creation', message)
+            self.assertEqual((parsed['start_time'], parsed['end_time']), times, message)
+
+    # Anything the parser would have to guess at goes to the LLM instead
+    def test_shift_creation_ambiguous_falls_back(self):
+        for message in (
+            'add Bob Jones 5-11 on 20th Oct',  # morning or evening
+            'add Bob Jones friday 9 to 5 and saturday 10 to 6',  # two shifts
+            'add Bob Jones on 20th Oct 9-1 and 2-6',  # two ranges, one day
+            'add Bob Jones 11pm-7am on 20th Oct',  # overnight
+            'add Bob Jones 17-9 on 20th Oct',
+        ):
+            self.assertIsNone(self._parse('shift_creation', message), message)
+
+    # Coverage questions carry the time of day
+    def test_coverage_time_of_day(self):
+        self.assertEqual(self._parse('coverage', 'who covers the morning on 2026-10-20'),
+                         {'date': '2026-10-20', 'branch_name': None, 'time_of_day': 'morning'})
+
+
+# Tests that the chat view only calls the LLM extractor when the local parser can't answer
+@override_settings(USE_TZ=True, TIME_ZONE="UTC")
+class ChatLocalParserViewTests(TestCase):
+    def setUp(self):
+        self.url = reverse(CHAT_API)
+        self.owner, self.business = _setup_owner()
+        self.emp, _ = _add_employee(self.business, 'emp', 'Bob', 'Jones')
+        self.client.login(username='owner', password='pass')
+
+    # A plain "who is working tomorrow" is answered without touching the LLM
+    def test_common_phrasing_skips_llm(self):
+        _shift(self.business, self.emp, timezone.localdate() + timedelta(days=1))
+        with patch('checkpoint.views.chat.aextract_schedule_query',
+                   side_effect=AssertionError('LLM extractor should not be called')):
+            response = self.client.post(self.url, {'message': 'who is working tomorrow'})
+        self.assertIn('Bob', response.json()['answer'])
+
+    # A branch name the caller doesn't have still goes to the LLM extractor
+    def test_unrecognised_branch_uses_llm(self):
+        with patch('checkpoint.views.chat.aextract_schedule_query',
+                   return_value={'date': timezone.localdate().isoformat(), 'branch_name': None}) as llm:
+            self.client.post(self.url, {'message': 'who is working at Starbucks tomorrow'})
+        llm.assert_called_once()
+
+
+# Tests that repeated extraction questions are served from the cache and counted
+class ChatExtractionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_extraction_cache_stats()
+
+    # Patches the OpenAI client so each call returns the given JSON and can be counted
+    def _fake_client(self, payload):
+        client = MagicMock()
+        client.responses.create = AsyncMock(return_value=MagicMock(output_text=json.dumps(payload)))
+        return patch('checkpoint.utils._get_async_client', return_value=client), client
+
+    # Same question with different case/spacing only reaches the LLM once on the same day
+    def test_repeat_question_is_cached(self):
+        patcher, client = self._fake_client({'date': '2026-10-23', 'branch_name': "Luigi's"})
+        with patcher:
+            first = async_to_sync(aextract_schedule_query)("Who's working Friday at Luigi's?", '2026-10-17')
+            second = async_to_sync(aextract_schedule_query)("  who's WORKING friday  at luigi's? ", '2026-10-17')
+        self.assertEqual(first, second)
+        self.assertEqual(client.responses.create.call_count, 1)
+        stats = extraction_cache_stats()['extract_schedule_query']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    # Messages differing only in digits and separators are different times/dates, never one entry
+    def test_times_and_dates_are_not_merged(self):
+        pairs = [
+            ('schedule ann 1-12 on friday', 'schedule ann 11-2 on friday'),
+            ('schedule ann 9-17 on friday', 'schedule ann 91-7 on friday'),
+            ('schedule ann 9-17 on 2026-10-21', 'schedule ann 9-17 on 2026-1-021'),
+        ]
+        for first, second in pairs:
+            self.assertNotEqual(
+                _extraction_cache_key('extract_shift_creation_query', first, '2026-10-17'),
+                _extraction_cache_key('extract_shift_creation_query', second, '2026-10-17'),
+            )
+
+    # A different day is a different question: "Friday" means another date
+    def test_new_day_misses(self):
+        patcher, client = self._fake_client({'date': '2026-10-23', 'branch_name': None})
+        with patcher:
+            async_to_sync(aextract_schedule_query)('who is working friday', '2026-10-17')
+            async_to_sync(aextract_schedule_query)('who is working friday', '2026-10-18')
+        self.assertEqual(client.responses.create.call_count, 2)
+
+    # Extractors keep separate entries for the same message
+    def test_extractors_do_not_share_entries(self):
+        patcher, client = self._fake_client({'person_name': 'Bob', 'week': 'this', 'branch_name': None})
+        with patcher:
+            async_to_sync(aextract_hours_query)('bob this week', '2026-10-17')
+            async_to_sync(aextract_person_schedule_query)('bob this week', '2026-10-17')
+        self.assertEqual(client.responses.create.call_count, 2)
+
+    # Mutating a returned dict mustn't change what the next caller gets
+    def test_cached_result_is_a_copy(self):
+        patcher, _ = self._fake_client({'date': '2026-10-23', 'branch_name': None})
+        with patcher:
+            async_to_sync(aextract_schedule_query)('who is working friday', '2026-10-17')
+            async_to_sync(aextract_schedule_query)('who is working friday', '2026-10-17')['date'] = 'changed'
+            again = async_to_sync(aextract_schedule_query)('who is working friday', '2026-10-17')
+        self.assertEqual(again['date'], '2026-10-23')
+
+
+# Tests the chat endpoint through the ASGI request handler it is deployed behind
+@override_settings(USE_TZ=True, TIME_ZONE="UTC")
+class ChatAsyncEndpointTests(TestCase):
+    def setUp(self):
+        self.owner, self.business = _setup_owner()
+
+    # A question answered over ASGI counts towards the daily limit like before
+    async def test_async_request_answers_and_counts_usage(self):
+        await self.async_client.aforce_login(self.owner)
+        with patch('checkpoint.views.chat.aextract_schedule_query',
+                   return_value={'date': '2026-10-20', 'branch_name': None}):
+            response = await self.async_client.post(reverse(CHAT_API), {'message': 'who is in on the 20th or so'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('No one is scheduled', response.json()['answer'])
+        session = await self.async_client.asession()
+        self.assertEqual(await session.aget(f'chat_{timezone.localdate().isoformat()}'), 1)
+
+
+# Tests the per-request chat context that resolves branch names in memory
+class ChatContextTests(TestCase):
+    def setUp(self):
+        self.branches = [Business.objects.create(name=name) for name in ("Luigi's Pizza", 'Café Nero', 'Nero Soho')]
+        self.ctx = ChatContext(self.branches, people=[])
+
+    # Substring matches ignore case; normalized matches cover apostrophes and accents
+    def test_find_branches(self):
+        self.assertEqual([b.name for b in self.ctx.find_branches('luigi')], ["Luigi's Pizza"])
+        self.assertEqual([b.name for b in self.ctx.find_branches('Luigis')], ["Luigi's Pizza"])
+        self.assertEqual([b.name for b in self.ctx.find_branches('cafe nero')], ['Café Nero'])
+        self.assertEqual(len(self.ctx.find_branches('nero')), 2)
+
+    # Picking a branch never touches the database, whichever outcome it reaches
+    def test_pick_branch_runs_no_queries(self):
+        with self.assertNumQueries(0):
+            business, reply = self.ctx.pick_branch('soho', ask="Which branch? {options}")
+            _, ambiguous = self.ctx.pick_branch('nero', ask="Which branch? {options}")
+            _, missing = self.ctx.pick_branch('starbucks', ask="Which branch? {options}")
+            _, ask = self.ctx.pick_branch(None, ask="Which branch? {options}")
+        self.assertEqual((business.name, reply), ('Nero Soho', None))
+        self.assertIn('multiple branches', json.loads(ambiguous.content)['answer'])
+        self.assertIn("couldn't find a branch matching 'starbucks'", json.loads(missing.content)['answer'])
+        self.assertEqual(json.loads(ask.content)['answer'], "Which branch? Café Nero, Luigi's Pizza, Nero Soho")
+
+    # ask=None means "any branch will do": the first by name is taken
+    def test_pick_branch_without_asking(self):
+        business, reply = self.ctx.pick_branch(None, ask=None)
+        self.assertEqual((business.name, reply), ('Café Nero', None))
+
+
+# Tests the persisted search name and the ranked staff search used by the chat
+class StaffSearchTests(TestCase):
+    def setUp(self):
+        self.owner, self.business = _setup_owner()
+        self.ann, self.ann_mem = _add_employee(self.business, 'annl', 'Ann', 'Lee')
+        self.leeson, _ = _add_employee(self.business, 'aleeson', 'Ann', 'Leeson')
+        self.zoe, _ = _add_employee(self.business, 'zoe', 'Zoë', "O'Brien")
+
+    # The column is normalized on create and follows later name changes on the user
+    def test_search_name_maintained(self):
+        self.assertEqual(self.ann_mem.search_name, 'ann lee|annl')
+        self.ann.last_name = 'Lee-Smith'
+        self.ann.save()
+        self.ann_mem.refresh_from_db()
+        self.assertEqual(self.ann_mem.search_name, 'ann leesmith|annl')
+
+    # Exact full names rank first, then name prefixes; the whole search is one query
+    def test_results_are_ranked(self):
+        with self.assertNumQueries(1):
+            results = [(m.user.username, m.match_rank) for m in search_staff([self.business.id], 'ann lee')]
+        self.assertEqual(results, [('annl', EXACT_NAME), ('aleeson', NAME_PREFIX)])
+
+    # Accents and punctuation in either the stored name or the query don't block a match
+    def test_normalized_match(self):
+        self.assertEqual([m.user for m in search_staff([self.business.id], 'zoe obrien')], [self.zoe])
+        self.assertEqual([m.user for m in search_staff([self.business.id], "O'Brien")], [self.zoe])
+
+    # Only the branches asked about are searched
+    def test_scoped_to_branches(self):
+        other = Business.objects.create(name='Elsewhere')
+        self.assertFalse(search_staff([other.id], 'ann').exists())
+
+    # Scheduling "Ann Lee" picks her even though "Ann Leeson" also contains the name
+    @override_settings(USE_TZ=True, TIME_ZONE="UTC")
+    def test_chat_shift_creation_prefers_exact_name(self):
+        self.client.login(username='owner', password='pass')
+        with patch('checkpoint.views.chat.aextract_shift_creation_query', return_value={
+            'person_name': 'Ann Lee', 'branch_name': None, 'date': '2026-10-20',
+            'start_time': '09:00', 'end_time': '17:00',
+        }):
+            response = self.client.post(reverse(CHAT_API), {'message': 'schedule ann lee (tuesday) 9 till 5'})
+        self.assertIn('Shift created: Ann Lee', response.json()['answer'])
+        self.assertTrue(WorkShift.objects.filter(user=self.ann).exists())
+
+    # Scheduling over a shift the person already has elsewhere is refused
+    @override_settings(USE_TZ=True, TIME_ZONE="UTC")
+    def test_chat_shift_creation_rejects_overlap(self):
+        other = Business.objects.create(name='Elsewhere')
+        WorkShift.objects.create(
+            business=other, user=self.ann,
+            start=datetime(2026, 10, 20, 12, tzinfo=dt_timezone.utc), end=datetime(2026, 10, 20, 20, tzinfo=dt_timezone.utc),
+        )
+        self.client.login(username='owner', password='pass')
+        with patch('checkpoint.views.chat.aextract_shift_creation_query', return_value={
+            'person_name': 'Ann Lee', 'branch_name': None, 'date': '2026-10-20',
+            'start_time': '09:00', 'end_time': '17:00',
+        }):
+            response = self.client.post(reverse(CHAT_API), {'message': 'schedule ann lee (tuesday) 9 till 5'})
+        self.assertIn('already booked then: Elsewhere', response.json()['answer'])
+        self.assertEqual(WorkShift.objects.filter(user=self.ann).count(), 1)
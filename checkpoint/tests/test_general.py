@@ -1,7 +1,9 @@
 import uuid
 from datetime import timedelta
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -113,3 +115,60 @@ class TimeClockModelTest(TestCase):
         tc = TimeClock.objects.create(business=self.business, user=self.user,
                                       clock_in=now - timedelta(hours=1), clock_out=now)
         self.assertFalse(tc.is_open)
+
+
+# Tests for ForcePasswordChangeMiddleware — staff with a temporary password are sent to the
+# password change page, and the answer is cached in the session rather than re-queried
+class ForcePasswordChangeTest(TestCase):
+    def setUp(self):
+        self.business = Business.objects.create(name='Test Business')
+        self.user = User.objects.create_user(username='invited', password='temp-pass-123')
+        self.membership = BusinessMembership.objects.create(
+            user=self.user, business=self.business,
+            role=BusinessMembership.EMPLOYEE, must_change_password=True,
+        )
+        self.client.login(username='invited', password='temp-pass-123')
+
+    def _membership_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q for q in ctx.captured_queries if 'checkpoint_businessmembership' in q['sql']]
+
+    def test_flagged_staff_redirected(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('password_change'), fetch_redirect_response=False)
+
+    def test_flag_cached_after_first_request(self):
+        # Steady-state requests must not touch the membership table just for this check
+        self.membership.must_change_password = False
+        self.membership.save()
+        self.client.get('/')
+        response, queries = self._membership_queries('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_password_change_clears_cached_flag(self):
+        self.client.get('/')
+        self.client.post(reverse('password_change'), {
+            'old_password': 'temp-pass-123',
+            'new_password1': 'Brand-new-pass-456',
+            'new_password2': 'Brand-new-pass-456',
+        })
+        response, queries = self._membership_queries('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_reissued_temp_password_drops_cached_flag(self):
+        # A new temporary password rotates the session hash, so a stale "cleared" flag can't survive
+        self.membership.must_change_password = False
+        self.membership.save()
+        self.client.get('/')
+
+        self.user.set_password('another-temp-789')
+        self.user.save()
+        self.membership.must_change_password = True
+        self.membership.save()
+
+        self.client.login(username='invited', password='another-temp-789')
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('password_change'), fetch_redirect_response=False)
@@ -3,9 +3,10 @@ from unittest.mock import patch
 
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.core.cache import cache
 from django.utils import timezone
 
-from ..utils import compute_staff_status
+from ..utils import _staff_status_cache_key, compute_staff_status, compute_staff_status_bulk
 from ..models import BusinessMembership, WorkShift, TimeClock, Business
 from django.contrib.auth import get_user_model
 
@@ -16,6 +17,7 @@ User = get_user_model()
 @override_settings(USE_TZ=True, TIME_ZONE="UTC")
 class ComputeStaffStatusTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.business = Business.objects.create(name="Branch 1")
 
         self.owner = User.objects.create_user(username="owner", password="x")
@@ -194,6 +196,88 @@ class ComputeStaffStatusTests(TestCase):
         self.assertNotIn("emp_done", out_usernames)
         self.assertNotIn("emp_done", late_usernames)
 
+    def test_bulk_status_keeps_branches_separate(self):
+        # A late shift at one branch must not leak into another branch the same employee belongs to
+        now = self.aware(2026, 3, 4, 10, 0)
+        other = Business.objects.create(name="Branch 2")
+        BusinessMembership.objects.create(business=other, user=self.emp_late, role=BusinessMembership.EMPLOYEE)
+
+        WorkShift.objects.create(
+            business=self.business,
+            user=self.emp_late,
+            start=now - timedelta(minutes=20),
+            end=now + timedelta(hours=2),
+        )
+
+        with patch("django.utils.timezone.now", return_value=now):
+            results = compute_staff_status_bulk([self.business, other])
+
+        self.assertIn("emp_late", [x["user"].username for x in results[self.business.id]["late_staff"]])
+        self.assertEqual(results[other.id]["late_staff"], [])
+        self.assertIn("emp_late", [x["user"].username for x in results[other.id]["not_scheduled"]])
+
+    def test_bulk_status_query_count_does_not_grow_with_branches(self):
+        # The dashboard calls this once for every branch an owner has, so cost must stay flat
+        now = self.aware(2026, 3, 4, 10, 0)
+        branches = [self.business] + [Business.objects.create(name=f"Extra {i}") for i in range(5)]
+
+        with patch("django.utils.timezone.now", return_value=now):
+            with self.assertNumQueries(2):
+                compute_staff_status_bulk(branches)
+
+
+# Tests for the cached status snapshot: repeat polls should skip the DB until
+# a relevant row changes or a shift boundary passes
+@override_settings(USE_TZ=True, TIME_ZONE="UTC")
+class StaffStatusCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.business = Business.objects.create(name="Branch 1")
+        self.emp = User.objects.create_user(username="emp", password="x")
+        BusinessMembership.objects.create(business=self.business, user=self.emp, role=BusinessMembership.EMPLOYEE)
+        tz = timezone.get_current_timezone()
+        self.now = timezone.make_aware(datetime(2026, 3, 4, 10, 0), tz)
+
+    def _run_at(self, fixed_now):
+        with patch("django.utils.timezone.now", return_value=fixed_now):
+            return compute_staff_status(self.business)
+
+    def test_second_poll_is_served_from_cache(self):
+        self._run_at(self.now)
+        with self.assertNumQueries(0):
+            status = self._run_at(self.now + timedelta(minutes=1))
+        # "now" is refreshed on a hit so minutes-late maths stays current
+        self.assertEqual(status["now"], self.now + timedelta(minutes=1))
+
+    def test_clock_in_invalidates_snapshot(self):
+        self._run_at(self.now)
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeClock.objects.create(business=self.business, user=self.emp, clock_in=self.now)
+        status = self._run_at(self.now)
+        self.assertIn("emp", [x["user"].username for x in status["in_staff"]])
+
+    # The snapshot is only dropped once the write commits, so no reader can re-cache the old rows
+    def test_invalidation_waits_for_commit(self):
+        self._run_at(self.now)
+        with self.captureOnCommitCallbacks() as callbacks:
+            TimeClock.objects.create(business=self.business, user=self.emp, clock_in=self.now)
+            self.assertIsNotNone(cache.get(_staff_status_cache_key(self.business.id)))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(_staff_status_cache_key(self.business.id)))
+
+    def test_snapshot_expires_when_grace_period_passes(self):
+        # Shift started 10 min ago: out at 10:00, but late once the 15-min grace is over
+        WorkShift.objects.create(
+            business=self.business, user=self.emp,
+            start=self.now - timedelta(minutes=10), end=self.now + timedelta(hours=2),
+        )
+        status = self._run_at(self.now)
+        self.assertEqual(status["late_staff"], [])
+
+        status = self._run_at(self.now + timedelta(minutes=6))
+        self.assertIn("emp", [x["user"].username for x in status["late_staff"]])
+
 
 # Tests for branch creation — also verifies that the owner membership is
 # auto-created for the new branch so they don't get locked out of it
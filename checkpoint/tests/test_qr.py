@@ -1,12 +1,18 @@
 import json
+import uuid
 from datetime import timedelta
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 
+from ..clock_service import ClockError, clock_in, lock_membership
 from ..models import Business, BusinessMembership, WorkShift, TimeClock
+from ..pin_allocator import PIN_SPACE, allocate_pins, encode_pin, permute
+from ..scan_tokens import issue_qr_token, parse_qr_token, rotate_spent_pins
 
 User = get_user_model()
 
@@ -32,6 +38,15 @@ def make_shift(business, user, start=None, end=None):
     return WorkShift.objects.create(business=business, user=user, start=start, end=end)
 
 
+# An entry opened a while ago, before the member's current codes were issued, so the
+# scan that closes it isn't mistaken for a replay
+def make_open_clock(business, user, shift=None, minutes_ago=30):
+    clock_in = timezone.now() - timedelta(minutes=minutes_ago)
+    clock = TimeClock.objects.create(business=business, user=user, shift=shift, clock_in=clock_in)
+    TimeClock.objects.filter(pk=clock.pk).update(updated_at=clock_in)
+    return clock
+
+
 # ---------------------------------------------------------------------------
 # QR code generation
 # ---------------------------------------------------------------------------
@@ -50,6 +65,46 @@ class MyQRCodeViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response['Content-Type'], 'image/png')
 
+    def test_svg_format(self):
+        self.client.login(username='emp1', password='testpass123')
+        response = self.client.get(reverse('my_qr_code', args=[self.business.id]), {'format': 'svg'})
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertTrue(response.content.startswith(b'<svg'))
+
+    def test_unknown_format_rejected(self):
+        self.client.login(username='emp1', password='testpass123')
+        response = self.client.get(reverse('my_qr_code', args=[self.business.id]), {'format': 'gif'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_code_revalidates_with_304(self):
+        self.client.login(username='emp1', password='testpass123')
+        url = reverse('my_qr_code', args=[self.business.id])
+        etag = self.client.get(url)['ETag']
+        with patch('checkpoint.views.qr.qrcode.make') as make:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        make.assert_not_called()
+
+    def test_repeat_request_served_from_cache(self):
+        self.client.login(username='emp1', password='testpass123')
+        url = reverse('my_qr_code', args=[self.business.id])
+        first = self.client.get(url)
+        with patch('checkpoint.views.qr.qrcode.make') as make:
+            second = self.client.get(url)
+        make.assert_not_called()
+        self.assertEqual(first.content, second.content)
+
+    def test_token_rotation_changes_image_and_etag(self):
+        # A rotated token must never be answered with the old, now-invalid code
+        self.client.login(username='emp1', password='testpass123')
+        url = reverse('my_qr_code', args=[self.business.id])
+        first = self.client.get(url)
+        self.membership.qr_token = uuid.uuid4()
+        self.membership.save(update_fields=['qr_token'])
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(first.content, second.content)
+
 
 # The scanner page is only for staff who can clock others in — employees use their
 # own QR code and must not be able to reach the scanning interface
@@ -95,29 +150,45 @@ class ProcessQRScanClockInTests(TestCase):
                                 content_type='application/json')
 
     def test_successful_clock_in(self):
-        response = self._scan(self.emp_membership.qr_token)
+        response = self._scan(issue_qr_token(self.emp_membership))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['action'], 'clocked_in')
 
     def test_clock_in_creates_timeclock_record(self):
         # An open TimeClock (clock_out=None) must exist after a successful scan
-        self._scan(self.emp_membership.qr_token)
+        self._scan(issue_qr_token(self.emp_membership))
         self.assertTrue(TimeClock.objects.filter(
             business=self.business, user=self.employee, clock_out__isnull=True
         ).exists())
 
-    def test_token_regenerates_after_clock_in(self):
-        # Token rotation prevents the same QR code being reused for a second clock-in
-        old_token = self.emp_membership.qr_token
-        self._scan(old_token)
-        self.emp_membership.refresh_from_db()
-        self.assertNotEqual(self.emp_membership.qr_token, old_token)
+    def test_token_changes_clock_only_once(self):
+        # Replaying the same code (or the camera seeing it twice) must not clock straight back out
+        token = issue_qr_token(self.emp_membership)
+        self._scan(token)
+        response = self._scan(token)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(TimeClock.objects.filter(user=self.employee, clock_out__isnull=True).count(), 1)
+
+    def test_scan_does_not_write_membership(self):
+        before = BusinessMembership.objects.get(pk=self.emp_membership.pk)
+        self._scan(issue_qr_token(self.emp_membership))
+        after = BusinessMembership.objects.get(pk=self.emp_membership.pk)
+        self.assertEqual((before.qr_token, before.pin_code), (after.qr_token, after.pin_code))
+
+    def test_expired_token_rejected(self):
+        token = issue_qr_token(self.emp_membership, now=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self._scan(token).status_code, 404)
+
+    def test_forged_signature_rejected(self):
+        pk, window, _ = parse_qr_token(issue_qr_token(self.emp_membership))
+        self.assertEqual(self._scan(f"{pk}-{window}-{'0' * 16}").status_code, 404)
+        self.assertFalse(TimeClock.objects.exists())
 
     def test_clock_in_requires_active_shift(self):
         # Without a scheduled shift the scan must fail with a clear error, not silently succeed
         self.shift.delete()
         self.emp_membership.refresh_from_db()
-        response = self._scan(self.emp_membership.qr_token)
+        response = self._scan(issue_qr_token(self.emp_membership))
         self.assertEqual(response.status_code, 400)
         self.assertIn('no active shift', response.json()['error'].lower())
 
@@ -132,10 +203,7 @@ class ProcessQRScanClockOutTests(TestCase):
         make_membership(self.owner, self.business, BusinessMembership.OWNER)
         self.emp_membership = make_membership(self.employee, self.business, BusinessMembership.EMPLOYEE)
         self.shift = make_shift(self.business, self.employee)
-        TimeClock.objects.create(
-            business=self.business, user=self.employee, shift=self.shift,
-            clock_in=timezone.now() - timedelta(minutes=30),
-        )
+        make_open_clock(self.business, self.employee, self.shift)
         self.client.login(username='owner1', password='testpass123')
 
     def _scan(self, token):
@@ -143,13 +211,13 @@ class ProcessQRScanClockOutTests(TestCase):
                                 content_type='application/json')
 
     def test_successful_clock_out(self):
-        response = self._scan(self.emp_membership.qr_token)
+        response = self._scan(issue_qr_token(self.emp_membership))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['action'], 'clocked_out')
 
     def test_clock_out_closes_timeclock_record(self):
         # After clock-out there must be no open TimeClock (clock_out should be set)
-        self._scan(self.emp_membership.qr_token)
+        self._scan(issue_qr_token(self.emp_membership))
         self.assertFalse(TimeClock.objects.filter(
             business=self.business, user=self.employee, clock_out__isnull=True
         ).exists())
@@ -175,18 +243,18 @@ class ProcessQRScanPermissionTests(TestCase):
         emp2 = make_user('emp2')
         make_membership(emp2, self.business, BusinessMembership.EMPLOYEE)
         self.client.login(username='emp2', password='testpass123')
-        self.assertEqual(self._scan(self.emp_membership.qr_token).status_code, 403)
+        self.assertEqual(self._scan(issue_qr_token(self.emp_membership)).status_code, 403)
 
     def test_supervisor_of_same_branch_can_scan(self):
         # Supervisors operate the scanner on behalf of employees, so they must be allowed
         sup = make_user('sup1')
         make_membership(sup, self.business, BusinessMembership.SUPERVISOR)
         self.client.login(username='sup1', password='testpass123')
-        self.assertEqual(self._scan(self.emp_membership.qr_token).status_code, 200)
+        self.assertEqual(self._scan(issue_qr_token(self.emp_membership)).status_code, 200)
 
 
-# PIN clock-in mirrors the QR flow but uses a 6-character code instead of a UUID token;
-# both the PIN and the QR token rotate together after each use
+# PIN clock-in mirrors the QR flow but uses a 6-character code instead of a signed token;
+# a PIN works once and the rotation job replaces it afterwards
 class ProcessPinScanClockInTests(TestCase):
 
     def setUp(self):
@@ -214,14 +282,17 @@ class ProcessPinScanClockInTests(TestCase):
             business=self.business, user=self.employee, clock_out__isnull=True
         ).exists())
 
-    def test_pin_and_token_regenerate_after_pin_scan(self):
-        # Both credentials rotate together so a single scan can't be replayed via either method
+    def test_pin_spent_until_rotated(self):
+        # The scan itself writes nothing; the used PIN is refused until the rotation job replaces it
         old_pin = self.emp_membership.pin_code
-        old_token = self.emp_membership.qr_token
         self._scan_pin(old_pin)
+        self.assertEqual(self._scan_pin(old_pin).status_code, 409)
+
+        self.assertEqual(rotate_spent_pins(), 1)
         self.emp_membership.refresh_from_db()
         self.assertNotEqual(self.emp_membership.pin_code, old_pin)
-        self.assertNotEqual(self.emp_membership.qr_token, old_token)
+        self.assertEqual(self._scan_pin(old_pin).status_code, 404)
+        self.assertEqual(self._scan_pin(self.emp_membership.pin_code).json()['action'], 'clocked_out')
 
     def test_pin_requires_active_shift(self):
         # PIN clock-in enforces the same active-shift requirement as QR clock-in
@@ -242,10 +313,7 @@ class ProcessPinScanClockOutTests(TestCase):
         make_membership(self.owner, self.business, BusinessMembership.OWNER)
         self.emp_membership = make_membership(self.employee, self.business, BusinessMembership.EMPLOYEE)
         self.shift = make_shift(self.business, self.employee)
-        TimeClock.objects.create(
-            business=self.business, user=self.employee, shift=self.shift,
-            clock_in=timezone.now() - timedelta(minutes=30),
-        )
+        make_open_clock(self.business, self.employee, self.shift)
         self.url = reverse('process_pin_scan')
         self.client.login(username='owner1', password='testpass123')
 
@@ -297,3 +365,252 @@ class ProcessPinScanPermissionTests(TestCase):
     def test_owner_can_scan_via_pin(self):
         self.client.login(username='owner1', password='testpass123')
         self.assertEqual(self._scan_pin(self.emp_membership.pin_code).status_code, 200)
+
+
+# ---------------------------------------------------------------------------
+# Clock service / concurrency guards
+# ---------------------------------------------------------------------------
+
+# The clock service serializes changes per member; the database refuses a second
+# open entry outright in case anything ever bypasses it
+class ClockServiceTests(TestCase):
+
+    def setUp(self):
+        self.business = make_business()
+        self.owner = make_user('owner1')
+        self.employee = make_user('emp1')
+        make_membership(self.owner, self.business, BusinessMembership.OWNER)
+        self.emp_membership = make_membership(self.employee, self.business, BusinessMembership.EMPLOYEE)
+        self.shift = make_shift(self.business, self.employee)
+
+    def test_second_open_timeclock_rejected_by_database(self):
+        TimeClock.objects.create(business=self.business, user=self.employee, clock_in=timezone.now())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TimeClock.objects.create(business=self.business, user=self.employee, clock_in=timezone.now())
+
+    def test_closed_timeclocks_not_limited(self):
+        now = timezone.now()
+        for hours in (3, 2):
+            TimeClock.objects.create(
+                business=self.business, user=self.employee,
+                clock_in=now - timedelta(hours=hours), clock_out=now - timedelta(hours=hours - 1),
+            )
+        self.assertEqual(TimeClock.objects.filter(user=self.employee).count(), 2)
+
+    def test_back_to_back_scans_toggle_once_each(self):
+        # Two kiosks scanning the same PIN are serialized: the second scan sees the first's clock-in
+        self.client.login(username='owner1', password='testpass123')
+        url = reverse('process_pin_scan')
+        first = self.client.post(url, data=json.dumps({'pin': self.emp_membership.pin_code}),
+                                 content_type='application/json')
+        rotate_spent_pins()
+        self.emp_membership.refresh_from_db()
+        second = self.client.post(url, data=json.dumps({'pin': self.emp_membership.pin_code}),
+                                  content_type='application/json')
+        self.assertEqual([first.json()['action'], second.json()['action']], ['clocked_in', 'clocked_out'])
+        self.assertEqual(TimeClock.objects.filter(user=self.employee).count(), 1)
+
+    def test_shift_cannot_be_clocked_twice(self):
+        now = timezone.now()
+        TimeClock.objects.create(
+            business=self.business, user=self.employee, shift=self.shift,
+            clock_in=now - timedelta(minutes=50), clock_out=now - timedelta(minutes=10),
+        )
+        with transaction.atomic(), self.assertRaises(ClockError) as ctx:
+            clock_in(lock_membership(pk=self.emp_membership.pk), now)
+        self.assertEqual(ctx.exception.code, ClockError.SHIFT_ALREADY_USED)
+
+    def test_dashboard_clock_in_twice_reports_already_clocked_in(self):
+        self.client.login(username='emp1', password='testpass123')
+        self.client.post(reverse('clock_in', args=[self.business.id]))
+        response = self.client.post(reverse('clock_in', args=[self.business.id]), follow=True)
+        self.assertIn('already clocked in', response.content.decode().lower())
+        self.assertEqual(TimeClock.objects.filter(user=self.employee).count(), 1)
+
+
+# ---------------------------------------------------------------------------
+# Kiosk batch scans
+# ---------------------------------------------------------------------------
+
+# Batches from a rush or an offline queue get one result per item, and the whole batch
+# costs a fixed number of queries however many staff are in it
+class ProcessScanBatchTests(TestCase):
+
+    def setUp(self):
+        self.business = make_business()
+        self.other_business = make_business('Other Branch')
+        self.owner = make_user('owner1')
+        make_membership(self.owner, self.business, BusinessMembership.OWNER)
+        self.memberships = []
+        for i in range(5):
+            employee = make_user(f'emp{i}')
+            self.memberships.append(make_membership(employee, self.business))
+            make_shift(self.business, employee)
+        self.outsider = make_membership(make_user('outsider'), self.other_business)
+        make_shift(self.other_business, self.outsider.user)
+        self.client.login(username='owner1', password='testpass123')
+
+    def _batch(self, scans):
+        return self.client.post(reverse('process_scan_batch'), data=json.dumps({'scans': scans}),
+                                content_type='application/json')
+
+    def test_mixed_batch_returns_result_per_item(self):
+        scans = [
+            {'id': 'a', 'pin': self.memberships[0].pin_code},
+            {'id': 'b', 'token': issue_qr_token(self.memberships[1])},
+            {'id': 'c', 'pin': 'ZZZZZZ'},
+            {'id': 'd', 'pin': self.outsider.pin_code},
+            {'id': 'e', 'token': 'not-a-uuid'},
+        ]
+        results = self._batch(scans).json()['results']
+        self.assertEqual([r['id'] for r in results], ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual([r['status'] for r in results], [200, 200, 404, 403, 400])
+        self.assertEqual(TimeClock.objects.filter(clock_out__isnull=True).count(), 2)
+        self.assertFalse(TimeClock.objects.filter(user=self.outsider.user).exists())
+
+    def test_batch_toggles_open_clocks_out(self):
+        make_open_clock(self.business, self.memberships[0].user)
+        results = self._batch([{'id': 1, 'pin': self.memberships[0].pin_code}]).json()['results']
+        self.assertEqual(results[0]['action'], 'clocked_out')
+        self.assertFalse(TimeClock.objects.filter(clock_out__isnull=True).exists())
+
+    def test_duplicate_scan_in_batch_rejected(self):
+        # Live, the second scan would have found the code already spent
+        pin = self.memberships[0].pin_code
+        results = self._batch([{'id': 1, 'pin': pin}, {'id': 2, 'pin': pin}]).json()['results']
+        self.assertEqual([r['status'] for r in results], [200, 409])
+
+    def test_offline_qr_token_checked_against_scan_time(self):
+        scanned_at = timezone.now() - timedelta(minutes=10)
+        token = issue_qr_token(self.memberships[0], now=scanned_at)
+        results = self._batch([
+            {'id': 1, 'token': token, 'scanned_at': scanned_at.isoformat()},
+            {'id': 2, 'token': token},
+        ]).json()['results']
+        self.assertEqual([r['status'] for r in results], [200, 404])
+
+    def test_offline_clock_in_and_out_sent_in_separate_batches(self):
+        # Spent-ness follows the recorded clock times: flushing the clock-in "now" must not make
+        # the later, still-valid clock-out code look used
+        qr_member, pin_member = self.memberships[0], self.memberships[1]
+        BusinessMembership.objects.filter(pk=pin_member.pk).update(pin_rotated_at=timezone.now() - timedelta(hours=2))
+        scanned_in = timezone.now() - timedelta(minutes=50)
+        scanned_out = timezone.now() - timedelta(minutes=10)
+        first = self._batch([
+            {'id': 1, 'token': issue_qr_token(qr_member, now=scanned_in), 'scanned_at': scanned_in.isoformat()},
+            {'id': 2, 'pin': pin_member.pin_code, 'scanned_at': scanned_in.isoformat()},
+        ]).json()['results']
+        second = self._batch([
+            {'id': 3, 'token': issue_qr_token(qr_member, now=scanned_out), 'scanned_at': scanned_out.isoformat()},
+            {'id': 4, 'pin': pin_member.pin_code, 'scanned_at': scanned_out.isoformat()},
+        ]).json()['results']
+        self.assertEqual([r.get('action') for r in first + second], ['clocked_in'] * 2 + ['clocked_out'] * 2)
+        for member in (qr_member, pin_member):
+            clock = TimeClock.objects.get(user=member.user)
+            self.assertEqual((clock.clock_in, clock.clock_out), (scanned_in, scanned_out))
+
+    def test_offline_clock_in_and_out_in_one_batch(self):
+        # Queued out of order in the same batch, the scans are still applied oldest first
+        member = self.memberships[0]
+        scanned_in = timezone.now() - timedelta(minutes=50)
+        scanned_out = timezone.now() - timedelta(minutes=10)
+        results = self._batch([
+            {'id': 'out', 'token': issue_qr_token(member, now=scanned_out), 'scanned_at': scanned_out.isoformat()},
+            {'id': 'in', 'token': issue_qr_token(member, now=scanned_in), 'scanned_at': scanned_in.isoformat()},
+        ]).json()['results']
+        self.assertEqual([(r['id'], r.get('action')) for r in results], [('out', 'clocked_out'), ('in', 'clocked_in')])
+        clock = TimeClock.objects.get(user=member.user)
+        self.assertEqual((clock.clock_in, clock.clock_out), (scanned_in, scanned_out))
+
+    def test_replayed_offline_scan_is_spent(self):
+        # Sending the same queued clock-in twice must not toggle the clock back out
+        scanned_at = timezone.now() - timedelta(minutes=20)
+        scan = {'id': 1, 'token': issue_qr_token(self.memberships[0], now=scanned_at), 'scanned_at': scanned_at.isoformat()}
+        self._batch([scan])
+        self.assertEqual(self._batch([scan]).json()['results'][0]['status'], 409)
+        self.assertTrue(TimeClock.objects.filter(user=self.memberships[0].user, clock_out__isnull=True).exists())
+
+    def test_offline_scan_keeps_its_scan_time(self):
+        scanned_at = timezone.now() - timedelta(minutes=20)
+        self._batch([{'id': 1, 'pin': self.memberships[0].pin_code, 'scanned_at': scanned_at.isoformat()}])
+        clock = TimeClock.objects.get(user=self.memberships[0].user)
+        self.assertEqual(clock.clock_in, scanned_at)
+
+    def test_stale_offline_scan_rejected(self):
+        scanned_at = timezone.now() - timedelta(days=2)
+        results = self._batch([{'id': 1, 'pin': self.memberships[0].pin_code,
+                                'scanned_at': scanned_at.isoformat()}]).json()['results']
+        self.assertEqual(results[0]['status'], 400)
+        self.assertFalse(TimeClock.objects.exists())
+
+    def test_query_count_independent_of_batch_size(self):
+        def count_for(memberships):
+            from django.db import connection
+            from django.test.utils import CaptureQueriesContext
+            with CaptureQueriesContext(connection) as ctx:
+                self._batch([{'id': m.pk, 'pin': m.pin_code} for m in memberships])
+            return len(ctx.captured_queries)
+
+        self._batch([{'pin': 'ZZZZZZ'}])  # Warm the session so both runs start alike
+        small = count_for(self.memberships[:1])
+        TimeClock.objects.all().delete()
+        large = count_for(self.memberships[1:])
+        self.assertEqual(small, large)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self._batch([{'pin': self.memberships[0].pin_code}]).status_code, 401)
+
+    def test_rejects_oversized_batch(self):
+        self.assertEqual(self._batch([{'pin': 'AAAAAA'}] * 201).status_code, 400)
+
+
+# ---------------------------------------------------------------------------
+# PIN allocation
+# ---------------------------------------------------------------------------
+
+# Rotations draw PINs from a keyed permutation of a sequence, so they never collide
+# with each other and skip anything still held from the old random scheme
+class PinAllocatorTests(TestCase):
+
+    def test_permutation_is_collision_free_and_in_range(self):
+        values = [permute(n) for n in range(20000)]
+        self.assertEqual(len(set(values)), len(values))
+        self.assertTrue(all(0 <= v < PIN_SPACE for v in values))
+
+    def test_encoded_pins_are_six_alphanumerics(self):
+        for n in (0, 1, PIN_SPACE - 1):
+            pin = encode_pin(permute(n))
+            self.assertRegex(pin, r'^[A-Z0-9]{6}$')
+
+    def test_bulk_allocation_is_distinct(self):
+        pins = allocate_pins(50)
+        self.assertEqual(len(set(pins)), 50)
+
+    def test_codes_still_held_are_skipped(self):
+        # e.g. a legacy random PIN that happens to equal the next permuted code
+        membership = make_membership(make_user('emp1'), make_business())
+        BusinessMembership.objects.filter(pk=membership.pk).update(pin_code=encode_pin(permute(0)))
+        with patch('checkpoint.pin_allocator._next_values', side_effect=[[0], [1]]):
+            self.assertEqual(allocate_pins(1), [encode_pin(permute(1))])
+
+
+# The rotation job only touches PINs whose clock changed after they were issued
+class RotateSpentPinsTests(TestCase):
+
+    def setUp(self):
+        self.business = make_business()
+        self.used = make_membership(make_user('emp1'), self.business)
+        self.unused = make_membership(make_user('emp2'), self.business)
+
+    def test_rotates_only_used_pins(self):
+        TimeClock.objects.create(business=self.business, user=self.used.user, clock_in=timezone.now())
+        unused_pin = self.unused.pin_code
+        self.assertEqual(rotate_spent_pins(), 1)
+        self.unused.refresh_from_db()
+        self.assertEqual(self.unused.pin_code, unused_pin)
+        self.assertEqual(rotate_spent_pins(), 0)
+
+    def test_clock_changes_before_issue_do_not_count(self):
+        make_open_clock(self.business, self.used.user)
+        self.assertEqual(rotate_spent_pins(), 0)
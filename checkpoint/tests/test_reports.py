@@ -1,13 +1,26 @@
+import csv
+import io
+import os
+import shutil
+import tempfile
 from datetime import datetime, timedelta, time, date as date_type
 from unittest.mock import patch
 
+from django.core.management import call_command
+from django.db.models import QuerySet
 from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+import pydyf
+from pypdf import PdfReader
 
-from ..models import Business, BusinessMembership, WorkShift, TimeClock, StaffProfile
-from ..views.reports import _build_staff_report_data
+from ..models import Business, BusinessMembership, WorkShift, TimeClock, StaffProfile, ReportJob
+from ..report_jobs import enqueue_report_job
+from ..views.reports import (
+    _build_staff_report_data, _build_report_data, _chunk_branches, _owner_businesses, _owner_report_file,
+    _owner_report_pdf, _report_staff_memberships,
+)
 
 User = get_user_model()
 
@@ -66,6 +79,16 @@ def _timeclock(business, user, date, in_h, in_m, out_h, out_m, shift=None):
     )
 
 
+# Rendered reports are cached on disk; keep them out of the project's mediafiles/
+def _use_temp_media_root(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    media = override_settings(MEDIA_ROOT=media_root)
+    media.enable()
+    test.addCleanup(media.disable)
+    return media_root
+
+
 # Returns a [midnight, next-midnight) window for a single day — matches how the
 # report view builds its date range from the query-string parameters
 def _date_range(d):
@@ -126,6 +149,23 @@ class BuildReportDataTests(TestCase):
         data = _build_staff_report_data(self.business, memberships, from_dt, to_dt)
         self.assertEqual(data[0]['position'], 'Barista')
 
+    def test_multi_branch_data_built_in_two_queries(self):
+        # Owner reports cover every branch; query count must not scale with branches or staff
+        other = Business.objects.create(name='Cafe Two')
+        BusinessMembership.objects.create(user=self.emp, business=other, role=BusinessMembership.EMPLOYEE)
+        carol, _ = _add_employee(other, 'carol', 'Carol', 'White')
+        _timeclock(self.business, self.emp, self.today, 9, 0, 17, 0)
+        _timeclock(other, self.emp, self.today, 18, 0, 20, 0)
+        _timeclock(other, carol, self.today, 9, 0, 12, 0)
+        from_dt, to_dt = _date_range(self.today)
+
+        with self.assertNumQueries(2):
+            data = _build_report_data(_report_staff_memberships([self.business.id, other.id]), from_dt, to_dt)
+
+        self.assertEqual([s['total_seconds'] for s in data[self.business.id]], [8 * 3600])
+        by_name = {s['name']: s['total_seconds'] for s in data[other.id]}
+        self.assertEqual(by_name, {'Bob Jones': 2 * 3600, 'Carol White': 3 * 3600})
+
 
 # Integration tests for the owner report view — WeasyHTML is mocked so tests
 # don't require a headless browser or real PDF rendering
@@ -137,6 +177,7 @@ class OwnerReportViewTests(TestCase):
         self.url = reverse(OWNER_REPORT)
         self.today = timezone.localdate()
         self.client.login(username='owner', password='pass')
+        _use_temp_media_root(self)
 
     def test_unauthenticated_redirects(self):
         self.client.logout()
@@ -150,11 +191,19 @@ class OwnerReportViewTests(TestCase):
         self.assertEqual(resp.status_code, 403)
 
     def test_valid_request_returns_pdf(self):
-        # Confirms Content-Type and Content-Disposition so the browser triggers a download
+        # A miss queues the render instead of blocking the web worker; once the worker has built
+        # it, the same URL returns the PDF with a Content-Disposition that triggers a download
+        params = {'from': str(self.today), 'to': str(self.today)}
         with patch('checkpoint.views.reports.WeasyHTML') as mock_html, \
              patch('checkpoint.views.reports.WeasyCSS'):
             mock_html.return_value.write_pdf.return_value = b'%PDF-fake'
-            resp = self.client.get(self.url, {'from': str(self.today), 'to': str(self.today)})
+            resp = self.client.get(self.url, params)
+            self.assertEqual(resp.status_code, 202)
+            self.assertEqual(resp.json()['status'], ReportJob.PENDING)
+            mock_html.assert_not_called()
+
+            call_command('process_report_jobs', '--once', stdout=io.StringIO())
+            resp = self.client.get(self.url, params)
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp['Content-Type'], 'application/pdf')
         self.assertIn('attachment', resp['Content-Disposition'])
@@ -171,6 +220,7 @@ class SupervisorReportViewTests(TestCase):
         self.url = reverse(SUP_REPORT, kwargs={'business_id': self.business.pk})
         self.today = timezone.localdate()
         self.client.login(username='sup', password='pass')
+        _use_temp_media_root(self)
 
     def test_unauthenticated_redirects(self):
         self.client.logout()
@@ -184,10 +234,316 @@ class SupervisorReportViewTests(TestCase):
         self.assertEqual(resp.status_code, 403)
 
     def test_valid_request_returns_pdf(self):
+        params = {'from': str(self.today), 'to': str(self.today)}
         with patch('checkpoint.views.reports.WeasyHTML') as mock_html, \
              patch('checkpoint.views.reports.WeasyCSS'):
             mock_html.return_value.write_pdf.return_value = b'%PDF-fake'
-            resp = self.client.get(self.url, {'from': str(self.today), 'to': str(self.today)})
+            self.assertEqual(self.client.get(self.url, params).status_code, 202)
+            self.assertEqual(ReportJob.objects.get().business, self.business)
+            call_command('process_report_jobs', '--once', stdout=io.StringIO())
+            resp = self.client.get(self.url, params)
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp['Content-Type'], 'application/pdf')
         self.assertIn('attachment', resp['Content-Disposition'])
+
+
+# Tests for the background report queue — requests only create a job row and the
+# worker command renders it into MEDIA_ROOT
+@override_settings(USE_TZ=True, TIME_ZONE="UTC")
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.owner, self.business = _setup_owner()
+        self.emp, self.mem = _add_employee(self.business, 'emp', 'Bob', 'Jones')
+        self.today = timezone.localdate()
+        self.range = {'from': str(self.today), 'to': str(self.today)}
+        self.client.login(username='owner', password='pass')
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def test_identical_requests_share_one_job(self):
+        # Double-clicking Download must not queue the same render twice
+        first = self.client.post(reverse('request_owner_report'), self.range).json()
+        second = self.client.post(reverse('request_owner_report'), self.range).json()
+        self.assertEqual(first['job'], second['job'])
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_concurrent_first_requests_share_one_job(self):
+        # Both requests miss the lookup before either inserts; the second insert hits the
+        # constraint and falls back to the job the first one created
+        first = ReportJob.objects.create(
+            requested_by=self.owner, kind=ReportJob.OWNER, from_date=self.today, to_date=self.today,
+        )
+        real_first = QuerySet.first
+        lookups = []
+
+        def missing_once(qs):
+            lookups.append(qs)
+            return None if len(lookups) == 1 else real_first(qs)
+
+        with patch.object(QuerySet, 'first', missing_once):
+            job, created = enqueue_report_job(self.owner, ReportJob.OWNER, self.today, self.today)
+        self.assertFalse(created)
+        self.assertEqual(job, first)
+        self.assertEqual(ReportJob.objects.count(), 1)
+
+    def test_finished_job_does_not_block_a_new_one(self):
+        ReportJob.objects.create(
+            requested_by=self.owner, kind=ReportJob.OWNER, from_date=self.today, to_date=self.today,
+            status=ReportJob.DONE,
+        )
+        _, created = enqueue_report_job(self.owner, ReportJob.OWNER, self.today, self.today)
+        self.assertTrue(created)
+
+    def test_employee_cannot_queue_owner_report(self):
+        self.client.login(username='emp', password='pass')
+        resp = self.client.post(reverse('request_owner_report'), self.range)
+        self.assertEqual(resp.status_code, 403)
+
+    def test_worker_writes_pdf_and_status_reports_download_url(self):
+        job_id = self.client.post(
+            reverse('request_supervisor_report', kwargs={'business_id': self.business.pk}), self.range
+        ).json()['job']
+
+        with override_settings(MEDIA_ROOT=self.media_root), \
+             patch('checkpoint.views.reports.WeasyHTML') as mock_html, \
+             patch('checkpoint.views.reports.WeasyCSS'):
+            mock_html.return_value.write_pdf.return_value = b'%PDF-fake'
+            call_command('process_report_jobs', '--once', stdout=io.StringIO())
+
+        job = ReportJob.objects.get(token=job_id)
+        self.assertEqual(job.status, ReportJob.DONE)
+        with open(os.path.join(self.media_root, job.file_path), 'rb') as fh:
+            self.assertEqual(fh.read(), b'%PDF-fake')
+
+        status = self.client.get(reverse('report_job_status', args=[job_id])).json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['download_url'], reverse('download_report_job', args=[job_id]))
+        with override_settings(MEDIA_ROOT=self.media_root):
+            resp = self.client.get(status['download_url'])
+            self.assertEqual(b''.join(resp.streaming_content), b'%PDF-fake')
+        self.assertIn('attachment', resp['Content-Disposition'])
+
+    def _finished_owner_job(self):
+        job_id = self.client.post(reverse('request_owner_report'), self.range).json()['job']
+        with override_settings(MEDIA_ROOT=self.media_root), \
+             patch('checkpoint.views.reports.WeasyHTML') as mock_html, \
+             patch('checkpoint.views.reports.WeasyCSS'):
+            mock_html.return_value.write_pdf.return_value = b'%PDF-fake'
+            call_command('process_report_jobs', '--once', stdout=io.StringIO())
+        return ReportJob.objects.get(token=job_id)
+
+    def test_download_is_handed_to_nginx_after_access_check(self):
+        # The cached file is not under a public URL; nginx only sends it on the view's say-so
+        job = self._finished_owner_job()
+        url = reverse('download_report_job', args=[job.token])
+        with override_settings(MEDIA_ROOT=self.media_root, REPORT_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp['X-Accel-Redirect'], '/protected-media/' + job.file_path)
+            self.assertEqual(resp.content, b'')
+
+            self.client.login(username='emp', password='pass')
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_other_users_cannot_poll_job(self):
+        # Job ids are only meaningful to the person who queued them
+        job_id = self.client.post(reverse('request_owner_report'), self.range).json()['job']
+        self.client.login(username='emp', password='pass')
+        resp = self.client.get(reverse('report_job_status', args=[job_id]))
+        self.assertEqual(resp.status_code, 404)
+
+
+# Tests for the rendered-PDF cache — a report is only re-rendered when the rows it
+# reads change, and both the download views and the worker share the cached file
+@override_settings(USE_TZ=True, TIME_ZONE="UTC")
+class ReportCacheTests(TestCase):
+    def setUp(self):
+        self.owner, self.business = _setup_owner()
+        self.emp, self.mem = _add_employee(self.business, 'emp', 'Bob', 'Jones')
+        self.today = timezone.localdate()
+        self.range = {'from': str(self.today), 'to': str(self.today)}
+        self.client.login(username='owner', password='pass')
+        self.media_root = _use_temp_media_root(self)
+
+    def _download(self):
+        # Renders the owner report through the cache the way the worker does; returns how many
+        # times WeasyPrint ran, then checks the download view serves that file without rendering
+        with patch('checkpoint.views.reports.WeasyHTML') as mock_html, \
+             patch('checkpoint.views.reports.WeasyCSS'):
+            mock_html.return_value.write_pdf.return_value = b'%PDF-fake'
+            _owner_report_file(self.owner, _owner_businesses(self.owner), self.today, self.today)
+            renders = mock_html.call_count
+            resp = self.client.get(reverse(OWNER_REPORT), self.range)
+            self.assertEqual(b''.join(resp.streaming_content), b'%PDF-fake')
+            self.assertEqual(mock_html.call_count, renders)
+        return renders
+
+    def test_repeat_download_reuses_rendered_pdf(self):
+        self.assertEqual(self._download(), 1)
+        self.assertEqual(self._download(), 0)
+
+    def test_new_timeclock_invalidates(self):
+        self._download()
+        _timeclock(self.business, self.emp, self.today, 9, 0, 17, 0)
+        self.assertEqual(self._download(), 1)
+
+    def test_edited_timeclock_invalidates(self):
+        # Closing an open clock-in changes the hours even though no row was added
+        tc = TimeClock.objects.create(
+            business=self.business, user=self.emp,
+            clock_in=_aware(datetime(self.today.year, self.today.month, self.today.day, 9, 0)),
+        )
+        self._download()
+        tc.clock_out = tc.clock_in + timedelta(hours=8)
+        with patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=1)):
+            tc.save(update_fields=['clock_out', 'updated_at'])
+        self.assertEqual(self._download(), 1)
+
+    def test_role_change_invalidates(self):
+        # Employee -> supervisor keeps the staff count and the newest membership id
+        self._download()
+        self.mem.role = BusinessMembership.SUPERVISOR
+        self.mem.save()
+        self.assertEqual(self._download(), 1)
+
+    def test_name_and_position_edits_invalidate(self):
+        self._download()
+        self.emp.first_name = 'Robert'
+        self.emp.save()
+        self.assertEqual(self._download(), 1)
+
+        StaffProfile.objects.create(membership=self.mem, position='Barista')
+        self.assertEqual(self._download(), 1)
+
+    def test_pin_rotation_keeps_cached_pdf(self):
+        self._download()
+        self.mem.pin_rotated_at = timezone.now()
+        self.mem.save(update_fields=['pin_rotated_at'])
+        self.assertEqual(self._download(), 0)
+
+    def test_worker_reuses_pdf_from_download(self):
+        self._download()
+        self.client.post(reverse('request_owner_report'), self.range)
+        with patch('checkpoint.views.reports.WeasyHTML') as mock_html:
+            call_command('process_report_jobs', '--once', stdout=io.StringIO())
+        mock_html.assert_not_called()
+        self.assertEqual(ReportJob.objects.get().status, ReportJob.DONE)
+
+
+# Builds a real single-page PDF with pydyf so merging can be checked without WeasyPrint
+def _one_page_pdf():
+    document = pydyf.PDF()
+    content = pydyf.Stream()
+    document.add_object(content)
+    document.add_page(pydyf.Dictionary({
+        'Type': '/Page',
+        'Parent': document.pages.reference,
+        'MediaBox': pydyf.Array([0, 0, 200, 200]),
+        'Contents': content.reference,
+    }))
+    output = io.BytesIO()
+    document.write(output)
+    return output.getvalue()
+
+
+# Tests for the parallel owner report — each chunk of branches is rendered as its own
+# document in a process pool and the pages are merged in report order
+@override_settings(USE_TZ=True, TIME_ZONE="UTC", REPORT_RENDER_PROCESSES=2)
+class ParallelOwnerReportTests(TestCase):
+    def setUp(self):
+        self.owner, self.business = _setup_owner()
+        self.second = Business.objects.create(name='Second Branch')
+        BusinessMembership.objects.create(user=self.owner, business=self.second, role=BusinessMembership.OWNER)
+        _add_employee(self.business, 'emp', 'Bob', 'Jones')
+        self.today = timezone.localdate()
+
+    def test_chunks_keep_order_and_balance_work(self):
+        branches = [{'name': i, 'staff_data': [{'shift_count': n}]} for i, n in enumerate([10, 1, 1, 10])]
+        groups = _chunk_branches(branches, 2)
+        self.assertEqual([[b['name'] for b in g] for g in groups], [[0, 1], [2, 3]])
+
+    def test_branches_rendered_separately_and_merged(self):
+        with patch('checkpoint.views.reports.render_html_pdfs') as mock_render, \
+             patch('checkpoint.views.reports.WeasyHTML') as mock_html:
+            mock_render.side_effect = lambda htmls, css, processes: [_one_page_pdf() for _ in htmls]
+            pdf = _owner_report_pdf(self.owner, [self.business, self.second], self.today, self.today)
+
+        mock_html.assert_not_called()
+        html_strings = mock_render.call_args.args[0]
+        self.assertEqual(len(html_strings), 2)
+        # Only the first document carries the report header, only the last the footer
+        self.assertIn('All Branches Report', html_strings[0])
+        self.assertNotIn('All Branches Report', html_strings[1])
+        self.assertNotIn('report-footer', html_strings[0])
+        self.assertIn('report-footer', html_strings[1])
+        self.assertEqual(len(PdfReader(io.BytesIO(pdf)).pages), 2)
+
+    @override_settings(REPORT_RENDER_PROCESSES=0)
+    def test_disabled_renders_single_document(self):
+        with patch('checkpoint.views.reports.render_html_pdfs') as mock_render, \
+             patch('checkpoint.views.reports.WeasyHTML') as mock_html, \
+             patch('checkpoint.views.reports.WeasyCSS'):
+            mock_html.return_value.write_pdf.return_value = b'%PDF-fake'
+            _owner_report_pdf(self.owner, [self.business, self.second], self.today, self.today)
+        mock_render.assert_not_called()
+        self.assertEqual(mock_html.call_count, 1)
+
+
+# Tests for the streamed CSV export — same numbers as the PDF, one row per closed clock-in
+@override_settings(USE_TZ=True, TIME_ZONE="UTC")
+class ReportCsvExportTests(TestCase):
+    def setUp(self):
+        self.owner, self.business = _setup_owner()
+        self.sup, _ = _add_supervisor(self.business, 'sup', 'Carol', 'White')
+        self.emp, self.mem = _add_employee(self.business, 'emp', 'Bob', 'Jones')
+        StaffProfile.objects.create(membership=self.mem, position='Barista')
+        self.today = timezone.localdate()
+        self.range = {'from': str(self.today), 'to': str(self.today)}
+
+    def _rows(self, resp):
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertIn('attachment', resp['Content-Disposition'])
+        content = b''.join(resp.streaming_content).decode()
+        return list(csv.reader(io.StringIO(content)))
+
+    def test_rows_include_duration_and_lateness(self):
+        shift = _shift(self.business, self.emp, self.today, 9, 17)
+        _timeclock(self.business, self.emp, self.today, 9, 30, 17, 0, shift=shift)
+        self.client.login(username='sup', password='pass')
+
+        rows = self._rows(self.client.get(
+            reverse('export_supervisor_report_csv', kwargs={'business_id': self.business.pk}), self.range
+        ))
+        self.assertEqual(rows[0][0], 'branch')
+        self.assertEqual(rows[1], [
+            'Cafe Test', 'Bob Jones', 'Barista', 'Employee', str(self.today),
+            '09:00', '09:30', '17:00', '450', '30',
+        ])
+
+    def test_open_clock_ins_excluded(self):
+        TimeClock.objects.create(
+            business=self.business, user=self.emp,
+            clock_in=_aware(datetime(self.today.year, self.today.month, self.today.day, 9, 0)),
+        )
+        self.client.login(username='owner', password='pass')
+        rows = self._rows(self.client.get(reverse('export_owner_report_csv'), self.range))
+        self.assertEqual(len(rows), 1)
+
+    def test_owner_export_covers_all_branches(self):
+        second = Business.objects.create(name='Second Branch')
+        BusinessMembership.objects.create(user=self.owner, business=second, role=BusinessMembership.OWNER)
+        BusinessMembership.objects.create(user=self.emp, business=second, role=BusinessMembership.EMPLOYEE)
+        _timeclock(self.business, self.emp, self.today, 9, 0, 12, 0)
+        _timeclock(second, self.emp, self.today, 13, 0, 17, 0)
+        self.client.login(username='owner', password='pass')
+
+        rows = self._rows(self.client.get(reverse('export_owner_report_csv'), self.range))
+        self.assertEqual([r[0] for r in rows[1:]], ['Cafe Test', 'Second Branch'])
+
+    def test_employee_cannot_export(self):
+        self.client.login(username='emp', password='pass')
+        resp = self.client.get(
+            reverse('export_supervisor_report_csv', kwargs={'business_id': self.business.pk}), self.range
+        )
+        self.assertEqual(resp.status_code, 403)
@@ -1,11 +1,15 @@
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from io import StringIO
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from ..models import Business, BusinessMembership, WorkShift, TimeClock, StaffProfile
+from ..clock_service import toggle_clocks_bulk
+from ..models import Business, BusinessMembership, WorkShift, TimeClock, StaffProfile, WeeklyHours
+from ..weekly_hours import month_totals, week_of, week_totals
 
 User = get_user_model()
 
@@ -72,6 +76,16 @@ class StaffScheduleTest(TestCase):
         self.assertIn(self.shift.id, ids)
         self.assertNotIn(other_shift.id, ids)
 
+    def test_staff_feed_accepts_date_only_window(self):
+        # FullCalendar sends plain dates when no timeZone is configured
+        self.client.force_login(self.employee)
+        day = timezone.localdate(self.shift.start)
+        before = {'start': str(day - timedelta(days=14)), 'end': str(day - timedelta(days=7))}
+        around = {'start': str(day), 'end': str(day + timedelta(days=1))}
+        url = reverse('staff_branch_shifts_json', args=[self.business.id])
+        self.assertEqual(self.client.get(url, before).json(), [])
+        self.assertEqual([s['id'] for s in self.client.get(url, around).json()], [self.shift.id])
+
     def test_employee_cannot_fetch_all_branch_shifts_json(self):
         # The owner/supervisor full-calendar endpoint must be blocked for plain employees
         self.client.force_login(self.employee)
@@ -236,3 +250,102 @@ class StaffHoursAccessTest(TestCase):
         make_membership(other, self.business, BusinessMembership.EMPLOYEE)
         self.client.force_login(other)
         self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+# The weekly hours rollup must follow every shift and clock write, including shifts moved
+# between weeks, entries crossing Sunday midnight and the kiosk's bulk toggle path
+@override_settings(USE_TZ=True, TIME_ZONE='UTC')
+class WeeklyHoursTests(TestCase):
+
+    def setUp(self):
+        self.business = make_business()
+        self.employee = make_user('employee')
+        self.membership = make_membership(self.employee, self.business)
+        self.monday = date(2026, 3, 2)
+
+    def _at(self, day, hour):
+        return datetime.combine(day, time(hour), tzinfo=dt_timezone.utc)
+
+    def _row(self, week):
+        return WeeklyHours.objects.filter(business=self.business, user=self.employee, week_start=week).first()
+
+    # Creating a shift fills its week; deleting the last one removes the row
+    def test_shift_create_and_delete(self):
+        shift = make_shift(self.business, self.employee, self._at(self.monday, 9), self._at(self.monday, 17))
+        row = self._row(self.monday)
+        self.assertEqual((row.scheduled_seconds, row.shift_count, row.worked_seconds), (8 * 3600, 1, 0))
+        shift.delete()
+        self.assertIsNone(self._row(self.monday))
+
+    # Moving a shift into the next week updates both the old and the new week
+    def test_shift_moved_between_weeks(self):
+        make_shift(self.business, self.employee, self._at(self.monday, 9), self._at(self.monday, 13))
+        shift = make_shift(self.business, self.employee, self._at(self.monday, 14), self._at(self.monday, 18))
+        next_monday = self.monday + timedelta(days=7)
+        shift.start, shift.end = self._at(next_monday, 9), self._at(next_monday, 12)
+        shift.save()
+        self.assertEqual((self._row(self.monday).scheduled_seconds, self._row(self.monday).shift_count), (4 * 3600, 1))
+        self.assertEqual((self._row(next_monday).scheduled_seconds, self._row(next_monday).shift_count), (3 * 3600, 1))
+
+    # A Sunday night shift is split at midnight and counts once in each week
+    def test_shift_crossing_week_is_split(self):
+        sunday = self.monday + timedelta(days=6)
+        make_shift(self.business, self.employee, self._at(sunday, 22), self._at(sunday + timedelta(days=1), 4))
+        self.assertEqual((self._row(self.monday).scheduled_seconds, self._row(self.monday).shift_count), (2 * 3600, 1))
+        next_week = self._row(self.monday + timedelta(days=7))
+        self.assertEqual((next_week.scheduled_seconds, next_week.shift_count), (4 * 3600, 1))
+
+    # Worked seconds only count once the clock entry is closed
+    def test_clock_close_adds_worked_seconds(self):
+        clock = TimeClock.objects.create(business=self.business, user=self.employee, clock_in=self._at(self.monday, 9))
+        self.assertIsNone(self._row(self.monday))
+        clock.clock_out = self._at(self.monday, 12)
+        clock.save()
+        self.assertEqual(self._row(self.monday).worked_seconds, 3 * 3600)
+
+    # The kiosk's bulk toggle closes clocks with bulk_update, which sends no signals
+    def test_bulk_toggle_close_updates_rollup(self):
+        clock_in = timezone.now() - timedelta(hours=2)
+        TimeClock.objects.create(business=self.business, user=self.employee, clock_in=clock_in)
+        toggle_clocks_bulk([(self.membership, timezone.now())])
+        row = self._row(week_of(clock_in))
+        self.assertIsNotNone(row)
+        self.assertGreaterEqual(row.worked_seconds, 2 * 3600 - 60)
+
+    # A clock running from Sunday 31 May into Monday 1 June is split at midnight the same way by
+    # the week rollup and the month totals, so the hours modal's week and month figures agree
+    def test_clock_crossing_sunday_midnight_counts_alike_in_week_and_month(self):
+        sunday, monday = date(2026, 5, 31), date(2026, 6, 1)
+        TimeClock.objects.create(
+            business=self.business, user=self.employee,
+            clock_in=self._at(sunday, 22), clock_out=self._at(monday, 4),
+        )
+        may = month_totals(self.business.id, self.employee.id, self._at(date(2026, 5, 1), 0), self._at(monday, 0))
+        june = month_totals(self.business.id, self.employee.id, self._at(monday, 0), self._at(date(2026, 7, 1), 0))
+        self.assertEqual(may[1], timedelta(hours=2))
+        self.assertEqual(june[1], timedelta(hours=4))
+        self.assertEqual(week_totals(self.business.id, self.employee.id, week_of(self._at(sunday, 22)))[1], may[1])
+        self.assertEqual(week_totals(self.business.id, self.employee.id, monday)[1], june[1])
+
+    # The rebuild command reproduces what the signals maintained
+    def test_rebuild_matches_signals(self):
+        make_shift(self.business, self.employee, self._at(self.monday, 9), self._at(self.monday, 17))
+        TimeClock.objects.create(
+            business=self.business, user=self.employee,
+            clock_in=self._at(self.monday, 9), clock_out=self._at(self.monday, 16),
+        )
+        before = list(WeeklyHours.objects.values_list('week_start', 'scheduled_seconds', 'shift_count', 'worked_seconds'))
+        WeeklyHours.objects.all().delete()
+        call_command('rebuild_weekly_hours', stdout=StringIO())
+        after = list(WeeklyHours.objects.values_list('week_start', 'scheduled_seconds', 'shift_count', 'worked_seconds'))
+        self.assertEqual(before, after)
+
+    # The hours JSON reads this week from the rollup and the month from the shifts
+    def test_staff_hours_json_uses_rollup(self):
+        today = timezone.localdate()
+        start = datetime.combine(today, time(0), tzinfo=dt_timezone.utc) + timedelta(minutes=30)
+        make_shift(self.business, self.employee, start, start + timedelta(hours=3))
+        self.client.force_login(self.employee)
+        data = self.client.get(reverse('staff_hours_json', args=[self.business.id, self.employee.id])).json()
+        self.assertEqual(data['week_scheduled'], '3h 00m')
+        self.assertEqual(data['month_scheduled'], '3h 00m')
@@ -1,11 +1,17 @@
 from datetime import timedelta
+from unittest.mock import patch
 
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from ..forms import WorkShiftForm
 from ..models import Business, BusinessMembership, WorkShift, TimeClock, StaffProfile
+from ..shift_conflicts import CONFLICT_CONSTRAINT, ShiftConflict, existing_conflicts, find_conflicts, save_shift
 
 User = get_user_model()
 
@@ -81,6 +87,92 @@ class SupervisorScheduleTest(TestCase):
         self.client.post(reverse('delete_shift', args=[self.business.id, self.shift.id]))
         self.assertFalse(WorkShift.objects.filter(id=self.shift.id).exists())
 
+    def test_branch_feed_limited_to_calendar_window(self):
+        # FullCalendar sends the visible range; shifts outside it must not be serialized
+        old_start = self.shift.start - timedelta(days=60)
+        old = WorkShift.objects.create(
+            business=self.business, user=self.employee,
+            start=old_start, end=old_start + timedelta(hours=8),
+        )
+        self.client.force_login(self.supervisor)
+        window = {
+            'start': (self.shift.start - timedelta(days=1)).isoformat(),
+            'end': (self.shift.start + timedelta(days=6)).isoformat(),
+        }
+        ids = [s['id'] for s in self.client.get(reverse('branch_shifts_json', args=[self.business.id]), window).json()]
+        self.assertEqual(ids, [self.shift.id])
+        self.assertNotIn(old.id, ids)
+
+    def test_branch_feed_includes_shift_overlapping_window_start(self):
+        # An overnight shift that began before the window still shows on the first visible day
+        self.client.force_login(self.supervisor)
+        window = {
+            'start': (self.shift.start + timedelta(hours=2)).isoformat(),
+            'end': (self.shift.start + timedelta(days=7)).isoformat(),
+        }
+        ids = [s['id'] for s in self.client.get(reverse('branch_shifts_json', args=[self.business.id]), window).json()]
+        self.assertEqual(ids, [self.shift.id])
+
+    def test_branch_feed_revalidates_with_etag(self):
+        # An unchanged feed answers 304; editing a shift must make the old ETag stale
+        self.client.force_login(self.supervisor)
+        url = reverse('branch_shifts_json', args=[self.business.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift.notes = 'Moved to bar'
+            self.shift.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()[0]['notes'], 'Moved to bar')
+
+    def test_branch_feed_same_with_and_without_orjson(self):
+        # orjson is optional; the stdlib fallback must produce the same document
+        self.employee.first_name, self.employee.last_name = 'Eve', 'Stone'
+        self.employee.save()
+        self.client.force_login(self.supervisor)
+        url = reverse('branch_shifts_json', args=[self.business.id])
+        fast = self.client.get(url)
+        with patch('checkpoint.utils.orjson', None):
+            fallback = self.client.get(url)
+        self.assertEqual(fast['Content-Type'], 'application/json')
+        self.assertEqual(fast.json(), fallback.json())
+        self.assertEqual(fast.json()[0]['title'], 'Eve Stone')
+        self.assertEqual(fast.json()[0]['start'], self.shift.start.isoformat())
+
+    def test_branch_feed_etag_depends_on_window(self):
+        self.client.force_login(self.supervisor)
+        url = reverse('branch_shifts_json', args=[self.business.id])
+        etag = self.client.get(url)['ETag']
+        window = {
+            'start': (self.shift.start - timedelta(days=1)).isoformat(),
+            'end': (self.shift.start + timedelta(days=6)).isoformat(),
+        }
+        self.assertEqual(self.client.get(url, window, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_branch_feed_version_survives_cache_loss_and_stale_saves(self):
+        # The version lives on the Business row: a cleared cache (another process) keeps the
+        # ETag, and saving a Business loaded before a bump doesn't roll it back
+        self.client.force_login(self.supervisor)
+        url = reverse('branch_shifts_json', args=[self.business.id])
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        stale = Business.objects.get(pk=self.business.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shift.notes = 'Moved to bar'
+            self.shift.save()
+        stale.name = 'Renamed'
+        stale.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_branch_feed_rejects_invalid_window(self):
+        self.client.force_login(self.supervisor)
+        resp = self.client.get(reverse('branch_shifts_json', args=[self.business.id]), {'start': 'soon', 'end': 'later'})
+        self.assertEqual(resp.status_code, 400)
+
 
 # Supervisors manage staff within a branch but cannot perform owner-level
 # operations that affect the business structure itself (create/delete branches)
@@ -164,6 +256,35 @@ class StaffHoursJsonTest(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertIn('week_worked', resp.json())
 
+    def test_membership_table_read_once_per_request(self):
+        # Middleware and the view's permission check share the request's membership map
+        self.client.force_login(self.supervisor)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        membership_queries = [q for q in ctx.captured_queries if 'checkpoint_businessmembership' in q['sql']]
+        self.assertEqual(len(membership_queries), 1)
+
+    def test_unchanged_hours_answer_304(self):
+        # The dashboard modal revalidates with If-None-Match; nothing changed, so no body is sent
+        self.client.force_login(self.supervisor)
+        etag = self.client.get(self.url)['ETag']
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        self.assertEqual(resp.content, b'')
+
+    def test_new_clock_in_changes_etag(self):
+        self.client.force_login(self.supervisor)
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            TimeClock.objects.create(
+                business=self.business, user=self.employee,
+                clock_in=timezone.now() - timedelta(hours=2), clock_out=timezone.now(),
+            )
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
 
 # Supervisors are also schedulable staff, so clock-in and clock-out must work
 # for them under the same active-shift requirement that applies to employees
@@ -192,3 +313,78 @@ class SupervisorClockTest(TestCase):
         self.client.force_login(self.supervisor)
         self.client.post(reverse('clock_out', args=[self.business.id]))
         self.assertFalse(TimeClock.objects.filter(user=self.supervisor, clock_out__isnull=True).exists())
+
+
+# A person can't be booked into overlapping shifts at any branch; back-to-back is fine
+class ShiftConflictTests(TestCase):
+    def setUp(self):
+        self.business = make_business()
+        self.other_branch = make_business('Other Branch')
+        self.supervisor = make_user('supervisor', first_name='Sam')
+        self.employee = make_user('employee', first_name='Eve', last_name='Lane')
+        make_membership(self.supervisor, self.business, BusinessMembership.SUPERVISOR)
+        make_membership(self.employee, self.business)
+        make_membership(self.employee, self.other_branch)
+        self.start = (timezone.now() + timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.booked = WorkShift.objects.create(
+            business=self.other_branch, user=self.employee,
+            start=self.start, end=self.start + timedelta(hours=8),
+        )
+
+    def _post_shift(self, start, hours):
+        return self.client.post(reverse('create_shift', args=[self.business.id]), {
+            'user': self.employee.id,
+            'start': timezone.localtime(start).strftime('%Y-%m-%dT%H:%M'),
+            'end': timezone.localtime(start + timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M'),
+            'notes': '',
+        }, follow=True)
+
+    # An overlap with a shift at another branch is refused with a message naming it
+    def test_cross_branch_overlap_rejected(self):
+        self.client.force_login(self.supervisor)
+        resp = self._post_shift(self.start + timedelta(hours=4), 8)
+        self.assertFalse(WorkShift.objects.filter(business=self.business).exists())
+        self.assertIn('Eve Lane is already booked: Other Branch', [str(m) for m in resp.context['messages']][0])
+
+    # Form validation leaves the overlap to save_shift, so the message above isn't swallowed
+    def test_form_does_not_validate_overlap(self):
+        form = WorkShiftForm({
+            'user': self.employee.id,
+            'start': timezone.localtime(self.start + timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M'),
+            'end': timezone.localtime(self.start + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M'),
+            'notes': '',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+    # A shift starting exactly when the other ends doesn't conflict
+    def test_back_to_back_allowed(self):
+        self.client.force_login(self.supervisor)
+        self._post_shift(self.start + timedelta(hours=8), 4)
+        self.assertTrue(WorkShift.objects.filter(business=self.business, user=self.employee).exists())
+
+    # The check is a single range query
+    def test_find_conflicts_is_one_query(self):
+        shift = WorkShift(business=self.business, user=self.employee,
+                          start=self.start + timedelta(hours=1), end=self.start + timedelta(hours=2))
+        with self.assertNumQueries(1):
+            conflicts = find_conflicts(shift)
+        self.assertEqual(conflicts, [self.booked])
+        with self.assertRaises(ShiftConflict):
+            save_shift(shift)
+
+    # Existing double-bookings are found per person, not between different people. They predate
+    # the constraint, so on PostgreSQL it is dropped for this test; the DDL rolls back with it
+    def test_existing_conflicts_per_person(self):
+        if connection.vendor == 'postgresql':
+            constraint = next(c for c in WorkShift._meta.constraints if c.name == CONFLICT_CONSTRAINT)
+            with connection.cursor() as cursor:
+                # setUp's deferred foreign key checks would otherwise block the ALTER TABLE
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            with connection.schema_editor() as editor:
+                editor.remove_constraint(WorkShift, constraint)
+        WorkShift.objects.create(business=self.business, user=self.supervisor,
+                                 start=self.start, end=self.start + timedelta(hours=8))
+        clash = WorkShift.objects.create(business=self.business, user=self.employee,
+                                         start=self.start + timedelta(hours=7), end=self.start + timedelta(hours=9))
+        pairs = existing_conflicts(WorkShift.objects.all())
+        self.assertEqual([(a.id, b.id) for a, b in pairs], [(self.booked.id, clash.id)])
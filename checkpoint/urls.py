@@ -38,8 +38,9 @@ urlpatterns = [
 
     path("business/<int:business_id>/my-qr/", views.my_qr_code, name="my_qr_code"),
     path("business/<int:business_id>/qr-scanner/", views.qr_scanner, name="qr_scanner"),
-    path("qr-scan/<uuid:token>/", views.process_qr_scan, name="process_qr_scan"),
+    path("qr-scan/<str:token>/", views.process_qr_scan, name="process_qr_scan"),
     path("pin-scan/", views.process_pin_scan, name="process_pin_scan"),
+    path("scan-batch/", views.process_scan_batch, name="process_scan_batch"),
 
     path('business/<int:business_id>/staff/<int:membership_id>/', views.staff_detail, name='staff_detail'),
     path('branches/<int:business_id>/assign-roles/', views.assign_roles, name='assign_roles'),
@@ -49,6 +50,12 @@ urlpatterns = [
 
     path('report/owner/', views.download_owner_report, name='download_owner_report'),
     path('business/<int:business_id>/report/supervisor/', views.download_supervisor_report, name='download_supervisor_report'),
+    path('report/owner/export.csv', views.export_owner_report_csv, name='export_owner_report_csv'),
+    path('business/<int:business_id>/report/supervisor/export.csv', views.export_supervisor_report_csv, name='export_supervisor_report_csv'),
+    path('report/owner/jobs/', views.request_owner_report, name='request_owner_report'),
+    path('business/<int:business_id>/report/supervisor/jobs/', views.request_supervisor_report, name='request_supervisor_report'),
+    path('report/jobs/<uuid:token>/', views.report_job_status, name='report_job_status'),
+    path('report/jobs/<uuid:token>/download/', views.download_report_job, name='download_report_job'),
 
     path('under-construction/', TemplateView.as_view(template_name='under_construction.html'), name='under_construction'),
 ]
\ No newline at end of file
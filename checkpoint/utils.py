@@ -1,13 +1,25 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
 from django.utils import timezone 
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.crypto import get_random_string
 from django.http import JsonResponse, HttpResponse
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
-import os, json, re
+import os, json, re, functools, hashlib, unicodedata
 from datetime import datetime, time, timedelta
-from openai import OpenAI
-from .models import BusinessMembership, WorkShift, TimeClock, StaffProfile
+from time import perf_counter
+from openai import AsyncOpenAI
+
+try:
+    import orjson
+except ImportError:  # optional speed-up for the JSON feeds
+    orjson = None
+from .models import Business, BusinessMembership, WorkShift, TimeClock
 
 WEEKDAY_MAP = {
     "monday": 0,
@@ -19,7 +31,7 @@ WEEKDAY_MAP = {
     "sunday": 6
 }
 
-_client = None
+_async_client = None
 
 def generate_temporary_password(length=12):
     return get_random_string(length)
@@ -79,15 +91,69 @@ def send_shift_removed_email(user, business_name, start, end):
     )
     send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email], fail_silently=False)
 
-def get_owner_membership(request, business_id, *, json=False, message=None):
-    owner_membership = (BusinessMembership.objects.filter(
-            user=request.user, 
-            role=BusinessMembership.OWNER, 
-            business_id=business_id
-        )
-        .select_related('business')
-        .first()
+# All of request.user's memberships keyed by business id, loaded with one query the first
+# time anything asks and then reused for the rest of the request
+def get_membership_map(request):
+    memberships = getattr(request, "_membership_map", None)
+    if memberships is None:
+        if not request.user.is_authenticated:
+            return {}
+        memberships = {
+            m.business_id: m
+            for m in BusinessMembership.objects.filter(user=request.user).select_related('business').order_by('id')
+        }
+        request._membership_map = memberships
+    return memberships
+
+# get_membership_map for async views; fills the same per-request cache
+async def aget_membership_map(request):
+    memberships = getattr(request, "_membership_map", None)
+    if memberships is None:
+        user = await request.auser()
+        if not user.is_authenticated:
+            return {}
+        memberships = {
+            m.business_id: m
+            async for m in BusinessMembership.objects.filter(user=user).select_related('business').order_by('id')
+        }
+        request._membership_map = memberships
+    return memberships
+
+# For views that change request.user's own memberships and then read them again
+def clear_membership_map(request):
+    request.__dict__.pop("_membership_map", None)
+
+MUST_CHANGE_PASSWORD_SESSION_KEY = "must_change_password"
+
+# Whether request.user still has to replace a temporary password. Resolved once per login and
+# kept in the session; re-issuing a temporary password changes the password hash, which flushes
+# the user's existing sessions and with them this cached answer
+def must_change_password(request):
+    cached = request.session.get(MUST_CHANGE_PASSWORD_SESSION_KEY)
+    if cached is not None and cached.get("user") == request.user.pk:
+        return cached["flag"]
+
+    flag = any(
+        m.must_change_password and m.role != BusinessMembership.OWNER
+        for m in get_membership_map(request).values()
     )
+    set_must_change_password(request, flag)
+    return flag
+
+def set_must_change_password(request, flag):
+    request.session[MUST_CHANGE_PASSWORD_SESSION_KEY] = {"user": request.user.pk, "flag": flag}
+
+def _member_of(request, business_id, role=BusinessMembership.EMPLOYEE):
+    try:
+        membership = get_membership_map(request).get(int(business_id))
+    except (TypeError, ValueError):
+        return None
+    if membership and membership.has_min_role(role):
+        return membership
+    return None
+
+def get_owner_membership(request, business_id, *, json=False, message=None):
+    owner_membership = _member_of(request, business_id, BusinessMembership.OWNER)
 
     if owner_membership:
         return owner_membership, owner_membership.business, None
@@ -98,13 +164,7 @@ def get_owner_membership(request, business_id, *, json=False, message=None):
     return None, None, HttpResponse(msg, status=403)
 
 def get_membership(request, business_id, *, json=False, message=None):
-    membership = (BusinessMembership.objects.filter(
-            user=request.user, 
-            business_id=business_id
-        )
-        .select_related('business')
-        .first()
-    )
+    membership = _member_of(request, business_id)
 
     if membership:
         return membership, membership.business, None
@@ -115,14 +175,7 @@ def get_membership(request, business_id, *, json=False, message=None):
     return None, None, HttpResponse(msg, status=403)
 
 def get_supervisor_membership(request, business_id, *, json=False, message=None):
-    membership = (BusinessMembership.objects.filter(
-        user=request.user, 
-        business_id=business_id, 
-        role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-    )
-    .select_related('business')
-    .first()
-    )
+    membership = _member_of(request, business_id, BusinessMembership.SUPERVISOR)
 
     if membership:
         return membership, membership.business, None
@@ -132,133 +185,247 @@ def get_supervisor_membership(request, business_id, *, json=False, message=None)
         return None, None, JsonResponse({"error": msg}, status=403)
     return None, None, HttpResponse(msg, status=403)
 
-def user_display_name(user):
-    full_name = f"{user.first_name} {user.last_name}".strip()
-    return full_name if full_name else user.username
-
-def shift_to_dict(shift):
-    user = shift.user
-    return {
-        "id": shift.id,
-        "title": user_display_name(user) if user else "Unassigned",
-        "start": shift.start.isoformat(),
-        "end": shift.end.isoformat(),
-        "notes": shift.notes or "",
-    }
-
-def _get_client():
-    global _client
-    if _client is None:
-        _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    return _client
+def _display_name(first_name, last_name, username):
+    full_name = f"{first_name} {last_name}".strip()
+    return full_name if full_name else username
+
+SHIFT_FEED_FIELDS = ("id", "start", "end", "notes", "user__first_name", "user__last_name", "user__username")
+
+# Calendar feed as JSON bytes. Reads plain tuples instead of model instances; orjson (when
+# installed) encodes the datetimes natively, the stdlib fallback formats them with isoformat()
+def shift_feed_json(queryset):
+    rows = queryset.values_list(*SHIFT_FEED_FIELDS)
+    if orjson is not None:
+        return orjson.dumps([
+            {"id": pk, "title": _display_name(first, last, username), "start": start, "end": end, "notes": notes or ""}
+            for pk, start, end, notes, first, last, username in rows
+        ])
+    return json.dumps([
+        {"id": pk, "title": _display_name(first, last, username), "start": start.isoformat(), "end": end.isoformat(), "notes": notes or ""}
+        for pk, start, end, notes, first, last, username in rows
+    ], separators=(",", ":")).encode()
+
+def _parse_calendar_bound(value):
+    # FullCalendar sends ISO dates or datetimes; an unencoded '+' offset arrives as a space
+    value = (value or "").strip().replace(" ", "+")
+    try:
+        dt = parse_datetime(value)
+        if dt is None:
+            day = parse_date(value)
+            dt = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        return None
+    if dt is not None and timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, timezone.get_current_timezone())
+    return dt
+
+# Reads FullCalendar's ?start=&end= window; returns (start, end, error_response).
+# Without either param both bounds are None and callers fall back to the full history
+def parse_calendar_window(params):
+    raw_start, raw_end = params.get("start"), params.get("end")
+    if not raw_start and not raw_end:
+        return None, None, None
+
+    start, end = _parse_calendar_bound(raw_start), _parse_calendar_bound(raw_end)
+    if start is None or end is None or start >= end:
+        return None, None, JsonResponse({"error": "Invalid start/end range."}, status=400)
+    return start, end, None
+
+# Shifts overlapping [start, end); served by the (business, start) / (business, user, start) indexes
+def shifts_in_window(queryset, start, end):
+    if start is None:
+        return queryset
+    return queryset.filter(start__lt=end, end__gt=start)
+
+# Per-branch change counter (Business.version) behind the JSON feeds' ETags
+def business_version(business_id):
+    return Business.objects.filter(pk=business_id).values_list("version", flat=True).first()
+
+def bump_business_version(*business_ids):
+    # Deferred to commit so a reader can never pair the new version with pre-commit rows, and so
+    # the writer's transaction doesn't hold the branch row lock
+    ids = {bid for bid in business_ids if bid is not None}
+    if ids:
+        transaction.on_commit(lambda: Business.objects.filter(pk__in=ids).update(version=F("version") + 1))
+
+# Strong ETag for a branch JSON feed: the change counter plus whatever else shapes the payload.
+# Must be computed before the rows are read, never after
+def feed_etag(business_id, *parts):
+    raw = ":".join(str(part) for part in (business_version(business_id), *parts))
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+# Returns a 304 when If-None-Match already names this ETag, otherwise None
+def not_modified_response(request, etag):
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        with_etag(response, etag)
+    return response
+
+# no-cache makes the browser revalidate every time, which is exactly what the ETag answers cheaply
+def with_etag(response, etag):
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+# The chat view is async, so the client keeps its connection pool on the worker's event loop
+def _get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _async_client
 
 def compute_staff_status(business, minutes=15):
+    return compute_staff_status_bulk([business], minutes=minutes)[business.id]
+
+def _staff_status_cache_key(business_id):
+    return f"staff_status:{business_id}"
+
+# Drops cached snapshots; called from the model signals in signals.py. Deferred to commit like
+# bump_business_version, or a reader could re-cache the pre-commit snapshot before the write lands
+def invalidate_staff_status(*business_ids):
+    keys = [_staff_status_cache_key(bid) for bid in business_ids if bid is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+# Cached front for _compute_staff_status_bulk. A snapshot only changes when a
+# clock/shift/membership/profile row changes (handled by signals) or when "now"
+# crosses a shift boundary, so each entry carries the time it stops being valid.
+def compute_staff_status_bulk(businesses, minutes=15):
     now = timezone.localtime(timezone.now())
+    businesses = list(businesses)
+
+    cached = cache.get_many([_staff_status_cache_key(b.id) for b in businesses])
+    results = {}
+    stale = []
+    for b in businesses:
+        entry = cached.get(_staff_status_cache_key(b.id))
+        if entry and entry["minutes"] == minutes and entry["computed_at"] <= now < entry["valid_until"]:
+            results[b.id] = {**entry["status"], "now": now}
+        else:
+            stale.append(b)
+
+    if stale:
+        fresh, valid_until = _compute_staff_status_bulk(stale, minutes, now)
+        for b in stale:
+            results[b.id] = fresh[b.id]
+            timeout = max(1, int((valid_until[b.id] - now).total_seconds()))
+            cache.set(_staff_status_cache_key(b.id), {
+                "status": fresh[b.id],
+                "minutes": minutes,
+                "computed_at": now,
+                "valid_until": valid_until[b.id],
+            }, timeout)
+
+    return results
+
+# Buckets staff into in/late/out/done/not-scheduled for many branches at once.
+# Two queries total regardless of branch count: memberships (with profile and the
+# latest open clock-in folded in as a subquery) and today's shifts for every branch.
+# Also returns, per branch, the next moment a bucket could flip on time alone
+# (a shift start, start + grace, shift end, or midnight).
+def _compute_staff_status_bulk(businesses, minutes, now):
     today = timezone.localdate()
     tz = timezone.get_current_timezone()
 
     day_start = timezone.make_aware(datetime.combine(today, time.min), tz)
     day_end = timezone.make_aware(datetime.combine(today, time.max), tz)
 
-    grace_period = now - timedelta(minutes=minutes)
+    business_ids = [b.id for b in businesses]
 
-    staff_memberships = BusinessMembership.objects.filter(
-        business=business,
-        role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR]
-    ).select_related("user").order_by("user__username")
+    open_clock_in = (
+        TimeClock.objects.filter(
+            business=OuterRef("business"),
+            user=OuterRef("user"),
+            clock_out__isnull=True,
+        )
+        .order_by("-clock_in")
+        .values("clock_in")[:1]
+    )
 
-    staff_users = [m.user for m in staff_memberships]
+    staff_memberships = (
+        BusinessMembership.objects.filter(
+            business_id__in=business_ids,
+            role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR]
+        )
+        .select_related("user", "profile")
+        .annotate(open_clock_in=Subquery(open_clock_in))
+        .order_by("user__username")
+    )
 
-    position_by_user = {
-        p.membership.user_id: p.position
-        for p in StaffProfile.objects.filter(
-            membership__business=business
-        ).select_related("membership")
-    }
+    grace = timedelta(minutes=minutes)
+    # Late/done flip once now is strictly past the boundary, hence the extra microsecond
+    tick = timedelta(microseconds=1)
+    valid_until = {business_id: day_end + tick for business_id in business_ids}
 
-    shifts_recent = WorkShift.objects.filter(
-        business=business,
-        user__in=staff_users,
+    shifts_by_key = {}
+    for shift in WorkShift.objects.filter(
+        business_id__in=business_ids,
         start__lte=day_end,
         end__gte=day_start
-    ).select_related("user").order_by("start")
-
-    shifts_by_user = {}
-    for shift in shifts_recent:
-        shifts_by_user.setdefault(shift.user_id, []).append(shift)
-
-    next_shifts = WorkShift.objects.filter(
-        business=business,
-        user__in=staff_users,
-        start__gt=now,
-        start__gte=day_start,
-        start__lte=day_end
-    ).select_related("user").order_by("start")
-
-    next_shift_by_user = {}
-    for shift in next_shifts:
-        if shift.user_id not in next_shift_by_user:
-            next_shift_by_user[shift.user_id] = shift
-
-    open_clocks = TimeClock.objects.filter(
-        business=business,
-        user__in=staff_users,
-        clock_out__isnull=True
-    ).select_related("user", "shift")
-
-    clock_by_user = {tc.user_id: tc for tc in open_clocks}
-
-    in_staff, late_staff, out_staff, done_staff, not_scheduled = [], [], [], [], []
+    ).order_by("start"):
+        shifts_by_key.setdefault((shift.business_id, shift.user_id), []).append(shift)
+        for boundary in (shift.start, shift.start + grace + tick, shift.end + tick):
+            if now < boundary < valid_until[shift.business_id]:
+                valid_until[shift.business_id] = boundary
+
+    results = {
+        business_id: {
+            "in_staff": [],
+            "late_staff": [],
+            "out_staff": [],
+            "done_staff": [],
+            "not_scheduled": [],
+            "now": now,
+        }
+        for business_id in business_ids
+    }
 
-    for user in staff_users:
-        open_tc = clock_by_user.get(user.id)
-        todays_shifts = shifts_by_user.get(user.id, [])
+    for m in staff_memberships:
+        status = results[m.business_id]
+        user = m.user
+        profile = getattr(m, "profile", None)
+        pos = profile.position if profile else ""
+        todays_shifts = shifts_by_key.get((m.business_id, m.user_id), [])
 
-        if not todays_shifts and not open_tc:
-            not_scheduled.append({
-                "user": user,
-                "position": position_by_user.get(user.id, ""),
-            })
+        if not todays_shifts and not m.open_clock_in:
+            status["not_scheduled"].append({"user": user, "position": pos})
             continue
-        
-        if open_tc:
-            in_staff.append({"user": user, "clock_in": open_tc.clock_in, "position": position_by_user.get(user.id, "")})
+
+        if m.open_clock_in:
+            status["in_staff"].append({"user": user, "clock_in": m.open_clock_in, "position": pos})
             continue
 
         active_shift = None
+        past_shift = None
+        next_shift = None
         for shift in todays_shifts:
-            if shift.start <= now <= shift.end:
+            if active_shift is None and shift.start <= now <= shift.end:
                 active_shift = shift
-                break
-        
-        past_shifts = None
-        for shift in todays_shifts:
-            if shift.end < now:
-                past_shifts = shift
-                break 
-
-
-        pos = position_by_user.get(user.id, "")
-        if active_shift and now > (active_shift.start + timedelta(minutes=minutes)):
-            late_staff.append({"user": user, "shift": active_shift, "position": pos})
-        elif past_shifts and not active_shift:
-            done_staff.append({"user": user, "shift": past_shifts, "position": pos})
+            if past_shift is None and shift.end < now:
+                past_shift = shift
+            if next_shift is None and now < shift.start and day_start <= shift.start:
+                next_shift = shift
+
+        if active_shift and now > (active_shift.start + grace):
+            status["late_staff"].append({"user": user, "shift": active_shift, "position": pos})
+        elif past_shift and not active_shift:
+            status["done_staff"].append({"user": user, "shift": past_shift, "position": pos})
         else:
-            out_staff.append({
+            status["out_staff"].append({
                 "user": user,
                 "shift": active_shift,
-                "next_shift": next_shift_by_user.get(user.id),
+                "next_shift": next_shift,
                 "position": pos,
             })
 
-    return {
-        "in_staff": in_staff,
-        "late_staff": late_staff,
-        "out_staff": out_staff,
-        "done_staff": done_staff,
-        "not_scheduled": not_scheduled,
-        "now": now
-    }
+    return results, valid_until
+
+# Strip accents, then drop everything that isn't a letter, digit, or space
+def normalize_name(s):
+    s = unicodedata.normalize('NFD', s)
+    s = ''.join(c for c in s if unicodedata.category(c) != 'Mn')
+    s = re.sub(r"[^\w\s]", "", s, flags=re.UNICODE)
+    return s.lower().strip()
 
 # Utility function to find the next date for a given weekday, used in schedule query parsing.
 
@@ -282,13 +449,138 @@ def extract_weekday_request(text: str):
     
     return None, None
 
-# For extracting date and branch name from a schedule query message using the OpenAI API.
+EXTRACTION_CACHE_STATS = ("hits", "misses", "llm_ms")
+_cached_extractors = []
+
+
+def _extraction_stat_key(name, stat):
+    return f"chat_extract_stats:{name}:{stat}"
+
+
+# Counters live in the shared cache so every worker adds to the same totals. The file cache's
+# incr isn't atomic across processes, so under load they're close rather than exact
+async def _abump_extraction_stat(name, stat, amount=1):
+    key = _extraction_stat_key(name, stat)
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        await cache.aincr(key, amount)
+    except ValueError:  # evicted between add and incr
+        await cache.aset(key, amount, timeout=None)
+
+
+# Answers are keyed on today's date, so they are no use after local midnight
+def _seconds_until_day_ends(today_iso):
+    day = parse_date(today_iso or "")
+    if day is None:
+        return 60 * 60
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return max(int((end - timezone.now()).total_seconds()), 60)
+
+
+# Wraps an aextract_*_query helper so the same question on the same day only reaches the LLM
+# once across all workers. Only case and spacing are ignored when comparing messages: digits,
+# dashes and colons carry times and dates ("1-12" vs "11-2"), and punctuation elsewhere can
+# change the meaning too. Entries and counters are named without the "a" (extract_schedule_query)
+def _extraction_cache_key(name, message, today_iso):
+    normalized = " ".join((message or "").casefold().split())
+    if not normalized:
+        return None
+    return f"chat_extract:{name}:{today_iso}:{hashlib.sha1(normalized.encode()).hexdigest()}"
+
+
+def cached_extraction(extractor):
+    name = extractor.__name__.removeprefix("a")
+    _cached_extractors.append(name)
+
+    @functools.wraps(extractor)
+    async def wrapper(message, today_iso):
+        key = _extraction_cache_key(name, message, today_iso)
+        if key is None:
+            return await extractor(message, today_iso)
+        result = await cache.aget(key)
+        if result is not None:
+            await _abump_extraction_stat(name, "hits")
+            return dict(result)
+        started = perf_counter()
+        result = await extractor(message, today_iso)
+        await _abump_extraction_stat(name, "misses")
+        await _abump_extraction_stat(name, "llm_ms", int((perf_counter() - started) * 1000))
+        await cache.aset(key, result, timeout=_seconds_until_day_ends(today_iso))
+        return result
+
+    return wrapper
+
+
+# Per-extractor hit/miss totals, with the LLM time each hit is estimated to have saved
+# (the average time a miss spent waiting on the model)
+def extraction_cache_stats():
+    keys = {
+        (name, stat): _extraction_stat_key(name, stat)
+        for name in _cached_extractors for stat in EXTRACTION_CACHE_STATS
+    }
+    values = cache.get_many(list(keys.values()))
+    stats = {}
+    for name in _cached_extractors:
+        hits, misses, llm_ms = (values.get(keys[name, stat], 0) for stat in EXTRACTION_CACHE_STATS)
+        avg_ms = llm_ms / misses if misses else 0
+        stats[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0,
+            "avg_llm_ms": round(avg_ms),
+            "saved_ms": round(hits * avg_ms),
+        }
+    return stats
+
+
+def reset_extraction_cache_stats():
+    cache.delete_many([
+        _extraction_stat_key(name, stat) for name in _cached_extractors for stat in EXTRACTION_CACHE_STATS
+    ])
+
 
-def extract_person_schedule_query(message: str, today_iso: str) -> dict:
+# Each extractor below is a prompt (JSON schema + instructions for today) and the empty result
+# returned for a blank message or unreadable output; _arun_extraction sends it to the model
+def _extraction_request(prompt, message, today_iso):
+    schema, instructions = prompt(today_iso)
+    return {
+        "model": "gpt-4o-mini",
+        "instructions": instructions,
+        "input": message,
+        "text": {
+            "format": {
+                "type": "json_schema",
+                "name": schema["name"],
+                "schema": schema["schema"],
+                "strict": True
+            }
+        },
+        "max_output_tokens": 150,
+    }
+
+
+def _extraction_result(resp, defaults):
+    raw = (resp.output_text or "").strip()
+    try:
+        parsed = json.loads(raw)
+        return {key: parsed.get(key, default) for key, default in defaults.items()}
+    except Exception:
+        # if parsing fails, return safe nulls
+        return dict(defaults)
+
+
+async def _arun_extraction(prompt, defaults, message, today_iso):
     msg = (message or "").strip()
     if not msg:
-        return {"person_name": None, "week": "this", "branch_name": None}
+        return dict(defaults)
+    resp = await _get_async_client().responses.create(**_extraction_request(prompt, msg, today_iso))
+    return _extraction_result(resp, defaults)
+
+
+_PERSON_SCHEDULE_QUERY_DEFAULTS = {"person_name": None, "week": "this", "branch_name": None}
 
+
+def _person_schedule_query_prompt(today_iso):
     schema = {
         "name": "person_schedule_query",
         "schema": {
@@ -312,46 +604,25 @@ def extract_person_schedule_query(message: str, today_iso: str) -> dict:
             "required": ["person_name", "week", "branch_name"]
         }
     }
-
-    client = _get_client()
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=(
-            f"Today is {today_iso}.\n"
-            "Extract the staff member's name being asked about, which week (this or next), "
-            "and the restaurant/branch name if mentioned.\n"
-            "Default week to 'this' if not specified.\n"
-            "Return ONLY JSON matching the schema."
-        ),
-        input=msg,
-        text={
-            "format": {
-                "type": "json_schema",
-                "name": schema["name"],
-                "schema": schema["schema"],
-                "strict": True
-            }
-        },
-        max_output_tokens=150
+    instructions = (
+        f"Today is {today_iso}.\n"
+        "Extract the staff member's name being asked about, which week (this or next), "
+        "and the restaurant/branch name if mentioned.\n"
+        "Default week to 'this' if not specified.\n"
+        "Return ONLY JSON matching the schema."
     )
+    return schema, instructions
 
-    raw = (resp.output_text or "").strip()
-    try:
-        parsed = json.loads(raw)
-        return {
-            "person_name": parsed.get("person_name"),
-            "week": parsed.get("week", "this"),
-            "branch_name": parsed.get("branch_name"),
-        }
-    except Exception:
-        return {"person_name": None, "week": "this", "branch_name": None}
 
+@cached_extraction
+async def aextract_person_schedule_query(message: str, today_iso: str) -> dict:
+    return await _arun_extraction(_person_schedule_query_prompt, _PERSON_SCHEDULE_QUERY_DEFAULTS, message, today_iso)
 
-def extract_coverage_query(message: str, today_iso: str) -> dict:
-    msg = (message or "").strip()
-    if not msg:
-        return {"date": None, "branch_name": None, "time_of_day": None}
 
+_COVERAGE_QUERY_DEFAULTS = {"date": None, "branch_name": None, "time_of_day": None}
+
+
+def _coverage_query_prompt(today_iso):
     schema = {
         "name": "coverage_query",
         "schema": {
@@ -375,48 +646,27 @@ def extract_coverage_query(message: str, today_iso: str) -> dict:
             "required": ["date", "branch_name", "time_of_day"]
         }
     }
-
-    client = _get_client()
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=(
-            f"Today is {today_iso} in Europe/Dublin.\n"
-            "Extract the target date, restaurant/branch name, and time-of-day qualifier.\n"
-            "Rules for weekdays: plain 'Saturday' means next Saturday after today.\n"
-            "'next Saturday' means the Saturday after today.\n"
-            "'this Saturday' means this week's Saturday if not passed, else next.\n"
-            "time_of_day: set to 'morning', 'afternoon', 'evening', or 'night' only if explicitly mentioned. Otherwise null.\n"
-            "Return ONLY JSON matching the schema."
-        ),
-        input=msg,
-        text={
-            "format": {
-                "type": "json_schema",
-                "name": schema["name"],
-                "schema": schema["schema"],
-                "strict": True
-            }
-        },
-        max_output_tokens=150
+    instructions = (
+        f"Today is {today_iso} in Europe/Dublin.\n"
+        "Extract the target date, restaurant/branch name, and time-of-day qualifier.\n"
+        "Rules for weekdays: plain 'Saturday' means next Saturday after today.\n"
+        "'next Saturday' means the Saturday after today.\n"
+        "'this Saturday' means this week's Saturday if not passed, else next.\n"
+        "time_of_day: set to 'morning', 'afternoon', 'evening', or 'night' only if explicitly mentioned. Otherwise null.\n"
+        "Return ONLY JSON matching the schema."
     )
+    return schema, instructions
 
-    raw = (resp.output_text or "").strip()
-    try:
-        parsed = json.loads(raw)
-        return {
-            "date": parsed.get("date"),
-            "branch_name": parsed.get("branch_name"),
-            "time_of_day": parsed.get("time_of_day"),
-        }
-    except Exception:
-        return {"date": None, "branch_name": None, "time_of_day": None}
 
+@cached_extraction
+async def aextract_coverage_query(message: str, today_iso: str) -> dict:
+    return await _arun_extraction(_coverage_query_prompt, _COVERAGE_QUERY_DEFAULTS, message, today_iso)
 
-def extract_hours_query(message: str, today_iso: str) -> dict:
-    msg = (message or "").strip()
-    if not msg:
-        return {"person_name": None, "week": "this", "branch_name": None}
 
+_HOURS_QUERY_DEFAULTS = {"person_name": None, "week": "this", "branch_name": None}
+
+
+def _hours_query_prompt(today_iso):
     schema = {
         "name": "hours_query",
         "schema": {
@@ -440,51 +690,30 @@ def extract_hours_query(message: str, today_iso: str) -> dict:
             "required": ["person_name", "week", "branch_name"]
         }
     }
-
-    client = _get_client()
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=(
-            f"Today is {today_iso}.\n"
-            "Extract the staff member's name, which week, and the branch/restaurant name from a work-hours question.\n"
-            "The message typically follows the pattern: 'how many hours does [PERSON NAME] have [this/next] week [at/in BRANCH NAME]?'\n"
-            "person_name: the person whose hours are being asked about — the name that follows 'does', 'did', 'has', or 'for'. Set to null if asking about all staff.\n"
-            "branch_name: the restaurant or location name that appears after 'at' or 'in'. Set to null if no branch is mentioned.\n"
-            "Do NOT put a person's name in branch_name. Do NOT put a branch name in person_name.\n"
-            "Example: 'how many hours does John Smith have this week at Luigi's' → person_name='John Smith', branch_name=\"Luigi's\".\n"
-            "Example: 'how many hours does Papa Cookeria have this week' → person_name='Papa Cookeria', branch_name=null.\n"
-            "Default week to 'this' if not specified.\n"
-            "Return ONLY JSON matching the schema."
-        ),
-        input=msg,
-        text={
-            "format": {
-                "type": "json_schema",
-                "name": schema["name"],
-                "schema": schema["schema"],
-                "strict": True
-            }
-        },
-        max_output_tokens=150
+    instructions = (
+        f"Today is {today_iso}.\n"
+        "Extract the staff member's name, which week, and the branch/restaurant name from a work-hours question.\n"
+        "The message typically follows the pattern: 'how many hours does [PERSON NAME] have [this/next] week [at/in BRANCH NAME]?'\n"
+        "person_name: the person whose hours are being asked about — the name that follows 'does', 'did', 'has', or 'for'. Set to null if asking about all staff.\n"
+        "branch_name: the restaurant or location name that appears after 'at' or 'in'. Set to null if no branch is mentioned.\n"
+        "Do NOT put a person's name in branch_name. Do NOT put a branch name in person_name.\n"
+        "Example: 'how many hours does John Smith have this week at Luigi's' → person_name='John Smith', branch_name=\"Luigi's\".\n"
+        "Example: 'how many hours does Papa Cookeria have this week' → person_name='Papa Cookeria', branch_name=null.\n"
+        "Default week to 'this' if not specified.\n"
+        "Return ONLY JSON matching the schema."
     )
+    return schema, instructions
 
-    raw = (resp.output_text or "").strip()
-    try:
-        parsed = json.loads(raw)
-        return {
-            "person_name": parsed.get("person_name"),
-            "week": parsed.get("week", "this"),
-            "branch_name": parsed.get("branch_name"),
-        }
-    except Exception:
-        return {"person_name": None, "week": "this", "branch_name": None}
 
+@cached_extraction
+async def aextract_hours_query(message: str, today_iso: str) -> dict:
+    return await _arun_extraction(_hours_query_prompt, _HOURS_QUERY_DEFAULTS, message, today_iso)
 
-def extract_schedule_query(message: str, today_iso: str) -> dict:
-    msg = (message or "").strip()
-    if not msg:
-        return {"date": None, "branch_name": None}
 
+_SCHEDULE_QUERY_DEFAULTS = {"date": None, "branch_name": None}
+
+
+def _schedule_query_prompt(today_iso):
     schema = {
         "name": "schedule_query",
         "schema": {
@@ -497,55 +726,34 @@ def extract_schedule_query(message: str, today_iso: str) -> dict:
             "required": ["date", "branch_name"]
         }
     }
-
-    client = _get_client()
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=(
-            "Extract the target date and restaurant/branch name from the message.\n"
-            f"Today is {today_iso} in Europe/Dublin.\n"
-            "Relative day rules:\n"
-            f"- 'today' means {today_iso}.\n"
-            "- 'tomorrow' means the day after today.\n"
-            "- 'yesterday' means the day before today.\n"
-            "Rules for weekdays:\n"
-            "- If the user says a weekday like 'Friday' with no other qualifiers, choose the NEXT occurrence of that weekday after today.\n"
-            "- If the user says 'next Friday', choose the NEXT occurrence of Friday after today.\n"
-            "- If the user says 'this Friday', choose the Friday in the current week if it hasn't passed yet; otherwise the next Friday.\n"
-            "If user says 'Friday 20th' without month, choose the closest future matching date.\n"
-            "If no restaurant is mentioned, set branch_name to null.\n"
-            "Return ONLY JSON matching the schema."
-        ),
-        input=msg,
-        text={
-            "format": {
-                "type": "json_schema",
-                "name": schema["name"],
-                "schema": schema["schema"],
-                "strict": True
-            }
-        },
-        max_output_tokens=150
+    instructions = (
+        "Extract the target date and restaurant/branch name from the message.\n"
+        f"Today is {today_iso} in Europe/Dublin.\n"
+        "Relative day rules:\n"
+        f"- 'today' means {today_iso}.\n"
+        "- 'tomorrow' means the day after today.\n"
+        "- 'yesterday' means the day before today.\n"
+        "Rules for weekdays:\n"
+        "- If the user says a weekday like 'Friday' with no other qualifiers, choose the NEXT occurrence of that weekday after today.\n"
+        "- If the user says 'next Friday', choose the NEXT occurrence of Friday after today.\n"
+        "- If the user says 'this Friday', choose the Friday in the current week if it hasn't passed yet; otherwise the next Friday.\n"
+        "If user says 'Friday 20th' without month, choose the closest future matching date.\n"
+        "If no restaurant is mentioned, set branch_name to null.\n"
+        "Return ONLY JSON matching the schema."
     )
+    return schema, instructions
 
-    raw = (resp.output_text or "").strip()
-    try:
-        parsed = json.loads(raw)
-        return {
-            "date": parsed.get("date"),
-            "branch_name": parsed.get("branch_name"),
-        }
-    except Exception:
-        # if parsing fails, return safe nulls
-        return {"date": None, "branch_name": None}
 
+@cached_extraction
+async def aextract_schedule_query(message: str, today_iso: str) -> dict:
+    return await _arun_extraction(_schedule_query_prompt, _SCHEDULE_QUERY_DEFAULTS, message, today_iso)
+
+
+_SHIFT_CREATION_QUERY_DEFAULTS = {"person_name": None, "branch_name": None, "date": None, "start_time": None, "end_time": None}
 
-def extract_shift_creation_query(message: str, today_iso: str) -> dict:
-    # Parses a natural-language scheduling request into structured fields for WorkShift creation
-    msg = (message or "").strip()
-    if not msg:
-        return {"person_name": None, "branch_name": None, "date": None, "start_time": None, "end_time": None}
 
+# Parses a natural-language scheduling request into structured fields for WorkShift creation
+def _shift_creation_query_prompt(today_iso):
     schema = {
         "name": "shift_creation_query",
         "schema": {
@@ -576,49 +784,27 @@ def extract_shift_creation_query(message: str, today_iso: str) -> dict:
             "required": ["person_name", "branch_name", "date", "start_time", "end_time"]
         }
     }
-
-    client = _get_client()
-    resp = client.responses.create(
-        model="gpt-4o-mini",
-        instructions=(
-            f"Today is {today_iso} in Europe/Dublin.\n"
-            "Extract the employee's full name, branch name, date, start time, and end time from the scheduling request.\n"
-            "The message typically follows the pattern: 'schedule [PERSON NAME] in [BRANCH NAME] for [TIME RANGE] on [DAY]'.\n"
-            "person_name is the name immediately after 'schedule' and before the word 'in' (or 'at') that precedes the branch.\n"
-            "branch_name is the restaurant/location name that comes after 'in' or 'at', before 'for'.\n"
-            "Do NOT include 'in [branch]' as part of person_name. Do NOT include the person's name as part of branch_name.\n"
-            "Names may be in any capitalisation (e.g. 'john smith', 'JOHN SMITH', 'John Smith') — extract them exactly as written.\n"
-            "Example: 'schedule John Smith in Luigi's for 9-17 on Friday' → person_name='John Smith', branch_name=\"Luigi's\".\n"
-            "Relative day rules:\n"
-            f"- 'today' means {today_iso}.\n"
-            "- 'tomorrow' means the day after today.\n"
-            "- If the user says a weekday like 'Friday' with no qualifier, choose the NEXT occurrence after today.\n"
-            "- 'next Friday' means the next Friday after today.\n"
-            "Convert all times to 24-hour HH:MM format.\n"
-            "If any field is missing or unclear, return null for that field.\n"
-            "Return ONLY JSON matching the schema."
-        ),
-        input=msg,
-        text={
-            "format": {
-                "type": "json_schema",
-                "name": schema["name"],
-                "schema": schema["schema"],
-                "strict": True
-            }
-        },
-        max_output_tokens=150
+    instructions = (
+        f"Today is {today_iso} in Europe/Dublin.\n"
+        "Extract the employee's full name, branch name, date, start time, and end time from the scheduling request.\n"
+        "The message typically follows the pattern: 'schedule [PERSON NAME] in [BRANCH NAME] for [TIME RANGE] on [DAY]'.\n"
+        "person_name is the name immediately after 'schedule' and before the word 'in' (or 'at') that precedes the branch.\n"
+        "branch_name is the restaurant/location name that comes after 'in' or 'at', before 'for'.\n"
+        "Do NOT include 'in [branch]' as part of person_name. Do NOT include the person's name as part of branch_name.\n"
+        "Names may be in any capitalisation (e.g. 'john smith', 'JOHN SMITH', 'John Smith') — extract them exactly as written.\n"
+        "Example: 'schedule John Smith in Luigi's for 9-17 on Friday' → person_name='John Smith', branch_name=\"Luigi's\".\n"
+        "Relative day rules:\n"
+        f"- 'today' means {today_iso}.\n"
+        "- 'tomorrow' means the day after today.\n"
+        "- If the user says a weekday like 'Friday' with no qualifier, choose the NEXT occurrence after today.\n"
+        "- 'next Friday' means the next Friday after today.\n"
+        "Convert all times to 24-hour HH:MM format.\n"
+        "If any field is missing or unclear, return null for that field.\n"
+        "Return ONLY JSON matching the schema."
     )
+    return schema, instructions
 
-    raw = (resp.output_text or "").strip()
-    try:
-        parsed = json.loads(raw)
-        return {
-            "person_name": parsed.get("person_name"),
-            "branch_name": parsed.get("branch_name"),
-            "date": parsed.get("date"),
-            "start_time": parsed.get("start_time"),
-            "end_time": parsed.get("end_time"),
-        }
-    except Exception:
-        return {"person_name": None, "branch_name": None, "date": None, "start_time": None, "end_time": None}
\ No newline at end of file
+
+@cached_extraction
+async def aextract_shift_creation_query(message: str, today_iso: str) -> dict:
+    return await _arun_extraction(_shift_creation_query_prompt, _SHIFT_CREATION_QUERY_DEFAULTS, message, today_iso)
@@ -5,5 +5,8 @@ from .schedule import (branch_schedule, branch_shifts_json, create_shift, delete
                        pending_shift_notifications, send_shift_notifications)
 from .chat import schedule_chat, schedule_chat_api
 from .clock import clock_in, clock_out, staff_branch_shifts_json, my_hours, staff_hours_json
-from .qr import my_qr_code, qr_scanner, process_qr_scan, process_pin_scan
-from .reports import download_owner_report, download_supervisor_report
+from .qr import my_qr_code, qr_scanner, process_qr_scan, process_pin_scan, process_scan_batch
+from .reports import (download_owner_report, download_supervisor_report,
+                      export_owner_report_csv, export_supervisor_report_csv,
+                      request_owner_report, request_supervisor_report, report_job_status,
+                      download_report_job)
@@ -7,6 +7,7 @@ from django.urls import reverse_lazy
 
 from ..forms import OwnerSignUpForm, StyledPasswordChangeForm
 from ..models import Business, BusinessMembership
+from ..utils import set_must_change_password
 
 User = get_user_model()
 
@@ -47,4 +48,5 @@ class FirstLoginPasswordChangeView(PasswordChangeView):
             user=self.request.user,
             must_change_password=True
         ).update(must_change_password=False)
+        set_must_change_password(self.request, False)
         return response
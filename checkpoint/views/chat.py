@@ -1,8 +1,8 @@
 import re as _re
-import unicodedata
 from collections import defaultdict
 from datetime import datetime, timedelta, time
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
@@ -11,37 +11,91 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST
 
-from ..models import Business, BusinessMembership, WorkShift
+from ..chat_parser import ChatRoster, parse_chat_query
+from ..intervals import overlapping_pairs
+from ..shift_conflicts import ShiftConflict, save_shift
+from ..models import BusinessMembership, WeeklyHours, WorkShift
+from ..staff_search import EXACT_NAME, ranked_users, search_staff
 from ..utils import (
-    extract_schedule_query,
-    extract_hours_query,
-    extract_coverage_query,
-    extract_person_schedule_query,
-    extract_shift_creation_query,
+    aextract_schedule_query,
+    aextract_hours_query,
+    aextract_coverage_query,
+    aextract_person_schedule_query,
+    aextract_shift_creation_query,
+    aget_membership_map,
     extract_weekday_request,
     next_weekday,
+    normalize_name,
     compute_staff_status,
 )
 
 User = get_user_model()
 
-# Strip accents, then drop everything that isn't a letter, digit, or space
-def _normalize_name(s):
-    s = unicodedata.normalize('NFD', s)
-    s = ''.join(c for c in s if unicodedata.category(c) != 'Mn')
-    s = _re.sub(r"[^\w\s]", "", s, flags=_re.UNICODE)
-    return s.lower().strip()
-
-# Tries exact substring match first; fall back to normalized match so that
-# special characters (apostrophes, accents, &, etc.) don't break lookups
-def _find_branch(owned_ids, branch_name):
-    matches = Business.objects.filter(id__in=owned_ids, name__icontains=branch_name).order_by("name")
-    if matches.exists():
-        return matches
-    norm = _normalize_name(branch_name)
-    all_branches = Business.objects.filter(id__in=owned_ids).order_by("name")
-    matched_ids = [b.id for b in all_branches if norm in _normalize_name(b.name)]
-    return Business.objects.filter(id__in=matched_ids).order_by("name")
+# Everything the chat needs to know about the caller's branches, built once per request from the
+# membership map: the branches they supervise (sorted by name, normalized names precomputed) and
+# the staff in them. Branch questions are then answered in memory whichever intent asks
+class ChatContext:
+    def __init__(self, branches, people):
+        self.branches = sorted(branches, key=lambda b: b.name)
+        self.owned_ids = [b.id for b in self.branches]
+        self.roster = ChatRoster(branch_names=[b.name for b in self.branches], people=people)
+        self._normalized = [(normalize_name(b.name), b) for b in self.branches]
+
+    # Tries a case-insensitive substring match first; falls back to normalized match so that
+    # special characters (apostrophes, accents, &, etc.) don't break lookups
+    def find_branches(self, branch_name):
+        needle = branch_name.strip().casefold()
+        matches = [b for b in self.branches if needle in b.name.casefold()]
+        if matches:
+            return matches
+        norm = normalize_name(branch_name)
+        return [b for name, b in self._normalized if norm in name]
+
+    # Picks the one branch a question is about. Returns (business, None), or (None, reply) when
+    # there's nothing to pick or the caller has to choose; ask=None takes the first branch instead
+    def pick_branch(self, branch_name, *, ask, none="You don't manage any branches yet."):
+        if branch_name:
+            matches = self.find_branches(branch_name)
+            if not matches:
+                return None, JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name.strip()}'."})
+            if len(matches) > 1:
+                options = ", ".join(b.name for b in matches[:8])
+                return None, JsonResponse({"answer": f"That matches multiple branches: {options}. Be more specific."})
+            return matches[0], None
+        if not self.branches:
+            return None, JsonResponse({"answer": none})
+        if len(self.branches) > 1 and ask is not None:
+            options = ", ".join(b.name for b in self.branches[:8])
+            return None, JsonResponse({"answer": ask.format(options=options)})
+        return self.branches[0], None
+
+
+# Loaded once per request on the event loop; the membership map already carries the branches,
+# so this costs the one staff query
+async def _chat_context(request):
+    ctx = getattr(request, '_chat_context', None)
+    if ctx is None:
+        branches = [
+            m.business for m in (await aget_membership_map(request)).values()
+            if m.has_min_role(BusinessMembership.SUPERVISOR)
+        ]
+        people = User.objects.filter(
+            businessmembership__business_id__in=[b.id for b in branches]
+        ).values_list('first_name', 'last_name', 'username').distinct()
+        ctx = ChatContext(branches, [row async for row in people])
+        request._chat_context = ctx
+    return ctx
+
+
+# Answers from the local parser when it can account for the whole message, otherwise awaits the
+# LLM extractor (passed in so the call resolves at request time)
+async def _extract(ctx, kind, msg, llm_extractor):
+    today = timezone.localdate()
+    parsed = parse_chat_query(kind, msg, today, ctx.roster)
+    if parsed is not None:
+        return parsed
+    return await llm_extractor(msg, today.isoformat())
+
 
 DAILY_CHAT_LIMIT = 30
 
@@ -52,10 +106,10 @@ def _chat_usage_today(request):
     return request.session.get(key, 0), key
 
 
-def _increment_chat_usage(request):
-    count, key = _chat_usage_today(request)
-    request.session[key] = count + 1
-    request.session.modified = True
+async def _achat_usage_today(request):
+    # Same counter, read without blocking the event loop
+    key = f'chat_{timezone.localdate().isoformat()}'
+    return await request.session.aget(key, 0), key
 
 
 @login_required
@@ -68,654 +122,486 @@ def schedule_chat(request):
     })
 
 
-@login_required
-@require_POST
-@csrf_protect
-def schedule_chat_api(request):
-    # Main chat endpoint, dispatches to the matching intent handler below
-    msg = (request.POST.get("message") or "").strip()
-    if not msg:
-        return JsonResponse({"answer": "Type: who's working next Friday in Luigi's?"})
+# Intent: who is late today
+def _answer_late(request, ctx, msg, extracted):
+    branch_name = extracted.get("branch_name")
 
-    used, _ = _chat_usage_today(request)
-    if used >= DAILY_CHAT_LIMIT:
-        return JsonResponse({
-            "answer": f"You've reached your daily limit of {DAILY_CHAT_LIMIT} questions. Check back tomorrow!",
-            "limit_reached": True,
-        })
-    _increment_chat_usage(request)
+    business, reply = ctx.pick_branch(
+        branch_name,
+        ask="Which branch? You have access to: {options}. Ask like: who's late at Luigi's?",
+        none="You don't seem to have access to any branches yet.",
+    )
+    if reply:
+        return reply
 
-    # Intent: who is late today 
-    if _re.search(r"\blate\b", msg, _re.IGNORECASE):
-        today = timezone.localdate().isoformat()
-        extracted = extract_schedule_query(msg, today)
-        branch_name = extracted.get("branch_name")
+    status = compute_staff_status(business)
+    late = status["late_staff"]
+    now = status["now"]
 
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user,
-            role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    if not late:
+        return JsonResponse({"answer": f"No one is late at {business.name} right now."})
 
-        if branch_name:
-            matches = _find_branch(owned_ids, branch_name)
-            if matches.count() == 0:
-                return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
-            if matches.count() > 1:
-                options = ", ".join(matches.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"That matches multiple branches: {options}. Be more specific."})
-            business = matches.first()
-        else:
-            owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-            if owned.count() == 0:
-                return JsonResponse({"answer": "You don't seem to have access to any branches yet."})
-            if owned.count() > 1:
-                options = ", ".join(owned.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"Which branch? You have access to: {options}. Ask like: who's late at Luigi's?"})
-            business = owned.first()
+    lines = []
+    for s in late:
+        u = s["user"]
+        name = (u.first_name + " " + u.last_name).strip() or u.username
+        shift_start = timezone.localtime(s["shift"].start).strftime("%H:%M")
+        minutes_late = int((now - s["shift"].start).total_seconds() // 60)
+        pos = " (" + s["position"] + ")" if s.get("position") else ""
+        lines.append("- " + name + pos + ": shift started " + shift_start + ", " + str(minutes_late) + " min late")
+
+    answer = f"Late at {business.name} right now ({now.strftime('%H:%M')}):\n" + "\n".join(lines)
+    return JsonResponse({"answer": answer})
 
-        status = compute_staff_status(business)
-        late = status["late_staff"]
-        now = status["now"]
 
-        if not late:
-            return JsonResponse({"answer": f"No one is late at {business.name} right now."})
+# Intent: hours worked/scheduled for a week
+def _answer_hours(request, ctx, msg, extracted):
+    person_name = extracted.get("person_name")
+    week = extracted.get("week", "this")
+    branch_name = extracted.get("branch_name")
 
-        lines = []
-        for s in late:
-            u = s["user"]
-            name = (u.first_name + " " + u.last_name).strip() or u.username
-            shift_start = timezone.localtime(s["shift"].start).strftime("%H:%M")
-            minutes_late = int((now - s["shift"].start).total_seconds() // 60)
-            pos = " (" + s["position"] + ")" if s.get("position") else ""
-            lines.append("- " + name + pos + ": shift started " + shift_start + ", " + str(minutes_late) + " min late")
-
-        answer = f"Late at {business.name} right now ({now.strftime('%H:%M')}):\n" + "\n".join(lines)
-        return JsonResponse({"answer": answer})
-
-    # Intent: hours worked/scheduled for a week
-    if _re.search(r"\bhours?\b", msg, _re.IGNORECASE):
-        today = timezone.localdate().isoformat()
-        extracted = extract_hours_query(msg, today)
-        person_name = extracted.get("person_name")
-        week = extracted.get("week", "this")
-        branch_name = extracted.get("branch_name")
-
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user, role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    business, reply = ctx.pick_branch(
+        branch_name,
+        ask=None if person_name else "Which branch? You manage:{options}. Ask like: who has the most hours next week at Luigi's?",
+    )
+    if reply:
+        return reply
 
-        if branch_name:
-            matches = _find_branch(owned_ids, branch_name)
-            if matches.count() == 0:
-                return JsonResponse({"answer": "I couldn't find a branch matching '" + branch_name + "'."})
-            if matches.count() > 1:
-                options = ", ".join(matches.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": "That matches multiple branches: " + options + ". Be more specific."})
-            business = matches.first()
-        else:
-            owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-            if owned.count() == 0:
-                return JsonResponse({"answer": "You don't manage any branches yet."})
-            if owned.count() > 1 and not person_name:
-                options = ", ".join(owned.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": "Which branch? You manage:" + options + ". Ask like: who has the most hours next week at Luigi's?"})
-            business = owned.first()
+    today_date = timezone.localdate()
+    this_monday = today_date - timedelta(days=today_date.weekday())
+    week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
+    week_end = week_start + timedelta(days=6)
+    week_label = "next week" if week == "next" else "this week"
+
+    rows = [
+        row for row in WeeklyHours.objects.filter(business=business, week_start=week_start).select_related("user")
+        if row.shift_count
+    ]
+    if not rows:
+        return JsonResponse({"answer": "No shifts scheduled at " + business.name + " " + week_label + "."})
+
+    user_totals = {}
+    user_names = {}
+    for row in rows:
+        if person_name and person_name.lower() not in (row.user.first_name + " " + row.user.last_name).lower() and person_name.lower() not in row.user.username.lower():
+            continue
+        user_totals[row.user_id] = timedelta(seconds=row.scheduled_seconds)
+        user_names[row.user_id] = (row.user.first_name + " " + row.user.last_name).strip() or row.user.username
+
+    if not user_totals:
+        return JsonResponse({"answer": "No shifts found for '" + person_name + "' at " + business.name + " " + week_label + "."})
+
+    sorted_staff = sorted(user_totals.items(), key=lambda x: -x[1].total_seconds())
+    lines = []
+    for uid, total in sorted_staff:
+        hours = total.total_seconds() / 3600
+        lines.append("- " + user_names[uid] + ": " + str(round(hours, 1)) + "h")
 
-        today_date = timezone.localdate()
-        this_monday = today_date - timedelta(days=today_date.weekday())
-        week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
-        week_end = week_start + timedelta(days=6)
-        week_label = "next week" if week == "next" else "this week"
-
-        tz = timezone.get_current_timezone()
-        start_dt = timezone.make_aware(datetime.combine(week_start, time.min), tz)
-        end_dt = timezone.make_aware(datetime.combine(week_end, time.max), tz)
-
-        shifts = WorkShift.objects.filter(
-            business=business, start__lte=end_dt, end__gte=start_dt
-        ).select_related("user")
-
-        if not shifts.exists():
-            return JsonResponse({"answer": "No shifts scheduled at " + business.name + " " + week_label + "."})
-
-        user_totals = defaultdict(timedelta)
-        user_names = {}
-        for s in shifts:
-            if person_name and person_name.lower() not in (s.user.first_name + " " + s.user.last_name).lower() and person_name.lower() not in s.user.username.lower():
-                continue
-            user_totals[s.user_id] += s.end - s.start
-            user_names[s.user_id] = (s.user.first_name + " " + s.user.last_name).strip() or s.user.username
-
-        if not user_totals:
-            return JsonResponse({"answer": "No shifts found for '" + person_name + "' at " + business.name + " " + week_label + "."})
-
-        sorted_staff = sorted(user_totals.items(), key=lambda x: -x[1].total_seconds())
-        lines = []
-        for uid, total in sorted_staff:
-            hours = total.total_seconds() / 3600
-            lines.append("- " + user_names[uid] + ": " + str(round(hours, 1)) + "h")
-
-        date_range = week_start.strftime("%d %b") + "–" + week_end.strftime("%d %b")
-        answer = "Hours at " + business.name + " " + week_label + " (" + date_range + "):\n" + "\n".join(lines)
-        return JsonResponse({"answer": answer})
-
-    # Intent: shift count per person
-    if _re.search(r"\bhow\s+many\s+shifts?\b|\bmost\s+shifts?\b|\bfewest\s+shifts?\b|\bshift\s+count\b", msg, _re.IGNORECASE):
-        today_iso = timezone.localdate().isoformat()
-        extracted = extract_hours_query(msg, today_iso)
-        person_name = extracted.get("person_name")
-        week = extracted.get("week", "this")
-        branch_name = extracted.get("branch_name")
-
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user, role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    date_range = week_start.strftime("%d %b") + "–" + week_end.strftime("%d %b")
+    answer = "Hours at " + business.name + " " + week_label + " (" + date_range + "):\n" + "\n".join(lines)
+    return JsonResponse({"answer": answer})
 
-        if branch_name:
-            matches = _find_branch(owned_ids, branch_name)
-            if matches.count() == 0:
-                return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
-            if matches.count() > 1:
-                options = ", ".join(matches.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"That matches multiple branches: {options}. Be more specific."})
-            business = matches.first()
-        else:
-            owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-            if owned.count() == 0:
-                return JsonResponse({"answer": "You don't manage any branches yet."})
-            if owned.count() > 1 and not person_name:
-                options = ", ".join(owned.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"Which branch? You manage:{options}."})
-            business = owned.first()
 
-        today_date = timezone.localdate()
-        this_monday = today_date - timedelta(days=today_date.weekday())
-        week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
-        week_end = week_start + timedelta(days=6)
-        week_label = "next week" if week == "next" else "this week"
-
-        tz = timezone.get_current_timezone()
-        start_dt = timezone.make_aware(datetime.combine(week_start, time.min), tz)
-        end_dt = timezone.make_aware(datetime.combine(week_end, time.max), tz)
-
-        shifts = WorkShift.objects.filter(
-            business=business, start__lte=end_dt, end__gte=start_dt
-        ).select_related("user")
-
-        if not shifts.exists():
-            return JsonResponse({"answer": f"No shifts scheduled at {business.name} {week_label}."})
-
-        user_counts = defaultdict(int)
-        user_names = {}
-        for s in shifts:
-            if person_name and person_name.lower() not in (s.user.first_name + " " + s.user.last_name).lower() and person_name.lower() not in s.user.username.lower():
-                continue
-            user_counts[s.user_id] += 1
-            user_names[s.user_id] = (s.user.first_name + " " + s.user.last_name).strip() or s.user.username
-
-        if not user_counts:
-            return JsonResponse({"answer": f"No shifts found for '{person_name}' at {business.name} {week_label}."})
-
-        sorted_staff = sorted(user_counts.items(), key=lambda x: -x[1])
-        lines = [f"- {user_names[uid]}: {count} shift{'s' if count != 1 else ''}" for uid, count in sorted_staff]
-        date_range = week_start.strftime("%d %b") + "–" + week_end.strftime("%d %b")
-        return JsonResponse({"answer": f"Shift count at {business.name} {week_label} ({date_range}):\n" + "\n".join(lines)})
-
-    # Intent: coverage/headcount on a given day
-    if _re.search(r"\bhow many\b|\banyone\b|\bheadcount\b|\bcoverage\b", msg, _re.IGNORECASE):
-        today = timezone.localdate().isoformat()
-        extracted = extract_coverage_query(msg, today)
-        iso_date = extracted.get("date")
-        branch_name = extracted.get("branch_name")
-        time_of_day = extracted.get("time_of_day")
-
-        if not iso_date:
-            return JsonResponse({"answer": "I couldn't work out which day you mean. Try: how many staff on Saturday at Luigi's?"})
+# Intent: shift count per person
+def _answer_shift_count(request, ctx, msg, extracted):
+    person_name = extracted.get("person_name")
+    week = extracted.get("week", "this")
+    branch_name = extracted.get("branch_name")
 
-        try:
-            target_date = datetime.fromisoformat(iso_date).date()
-        except Exception:
-            return JsonResponse({"answer": "That date looked invalid. Try: how many staff on Saturday?"})
+    business, reply = ctx.pick_branch(
+        branch_name,
+        ask=None if person_name else "Which branch? You manage:{options}.",
+    )
+    if reply:
+        return reply
 
-        # Python weekday resolution overrides the AI-extracted date for named days
-        weekday_idx, qualifier = extract_weekday_request(msg)
-        if weekday_idx is not None:
-            today_date = timezone.localdate()
-            if qualifier == "next":
-                target_date = next_weekday(today_date, weekday_idx)
-            elif qualifier == "this":
-                candidate = today_date + timedelta(days=(weekday_idx - today_date.weekday()))
-                target_date = candidate if candidate >= today_date else next_weekday(today_date, weekday_idx)
-            else:
-                target_date = next_weekday(today_date, weekday_idx)
+    today_date = timezone.localdate()
+    this_monday = today_date - timedelta(days=today_date.weekday())
+    week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
+    week_end = week_start + timedelta(days=6)
+    week_label = "next week" if week == "next" else "this week"
+
+    rows = [
+        row for row in WeeklyHours.objects.filter(business=business, week_start=week_start).select_related("user")
+        if row.shift_count
+    ]
+    if not rows:
+        return JsonResponse({"answer": f"No shifts scheduled at {business.name} {week_label}."})
+
+    user_counts = {}
+    user_names = {}
+    for row in rows:
+        if person_name and person_name.lower() not in (row.user.first_name + " " + row.user.last_name).lower() and person_name.lower() not in row.user.username.lower():
+            continue
+        user_counts[row.user_id] = row.shift_count
+        user_names[row.user_id] = (row.user.first_name + " " + row.user.last_name).strip() or row.user.username
+
+    if not user_counts:
+        return JsonResponse({"answer": f"No shifts found for '{person_name}' at {business.name} {week_label}."})
+
+    sorted_staff = sorted(user_counts.items(), key=lambda x: -x[1])
+    lines = [f"- {user_names[uid]}: {count} shift{'s' if count != 1 else ''}" for uid, count in sorted_staff]
+    date_range = week_start.strftime("%d %b") + "–" + week_end.strftime("%d %b")
+    return JsonResponse({"answer": f"Shift count at {business.name} {week_label} ({date_range}):\n" + "\n".join(lines)})
+
+
+# Intent: coverage/headcount on a given day
+def _answer_coverage(request, ctx, msg, extracted):
+    iso_date = extracted.get("date")
+    branch_name = extracted.get("branch_name")
+    time_of_day = extracted.get("time_of_day")
 
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user, role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    if not iso_date:
+        return JsonResponse({"answer": "I couldn't work out which day you mean. Try: how many staff on Saturday at Luigi's?"})
 
-        if branch_name:
-            matches = _find_branch(owned_ids, branch_name)
-            if matches.count() == 0:
-                return JsonResponse({"answer": "I couldn't find a branch matching '" + branch_name + "'."})
-            if matches.count() > 1:
-                options = ", ".join(matches.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": "That matches multiple branches: " + options + ". Be more specific."})
-            business = matches.first()
-        else:
-            owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-            if owned.count() == 0:
-                return JsonResponse({"answer": "You don't manage any branches yet."})
-            if owned.count() > 1:
-                options = ", ".join(owned.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": "Which branch? You manage:" + options + ". Ask like: how many staff on Saturday at Luigi's?"})
-            business = owned.first()
-
-        tz = timezone.get_current_timezone()
-
-        TIME_WINDOWS = {
-            "morning":   (time(6, 0),  time(12, 0)),
-            "afternoon": (time(12, 0), time(17, 0)),
-            "evening":   (time(17, 0), time(21, 0)),
-            "night":     (time(21, 0), time(23, 59, 59)),
-        }
-
-        if time_of_day and time_of_day in TIME_WINDOWS:
-            win_start, win_end = TIME_WINDOWS[time_of_day]
-            filter_start = timezone.make_aware(datetime.combine(target_date, win_start), tz)
-            filter_end   = timezone.make_aware(datetime.combine(target_date, win_end), tz)
-            time_label = " (" + time_of_day + ")"
+    try:
+        target_date = datetime.fromisoformat(iso_date).date()
+    except Exception:
+        return JsonResponse({"answer": "That date looked invalid. Try: how many staff on Saturday?"})
+
+    # Python weekday resolution overrides the AI-extracted date for named days
+    weekday_idx, qualifier = extract_weekday_request(msg)
+    if weekday_idx is not None:
+        today_date = timezone.localdate()
+        if qualifier == "next":
+            target_date = next_weekday(today_date, weekday_idx)
+        elif qualifier == "this":
+            candidate = today_date + timedelta(days=(weekday_idx - today_date.weekday()))
+            target_date = candidate if candidate >= today_date else next_weekday(today_date, weekday_idx)
         else:
-            filter_start = timezone.make_aware(datetime.combine(target_date, time.min), tz)
-            filter_end   = timezone.make_aware(datetime.combine(target_date, time.max), tz)
-            time_label = ""
+            target_date = next_weekday(today_date, weekday_idx)
 
-        shifts = WorkShift.objects.filter(
-            business=business,
-            start__lt=filter_end,
-            end__gt=filter_start,
-        ).select_related("user").order_by("start")
+    business, reply = ctx.pick_branch(
+        branch_name,
+        ask="Which branch? You manage:{options}. Ask like: how many staff on Saturday at Luigi's?",
+    )
+    if reply:
+        return reply
+
+    tz = timezone.get_current_timezone()
 
-        date_label = target_date.strftime("%A %d %b")
+    TIME_WINDOWS = {
+        "morning":   (time(6, 0),  time(12, 0)),
+        "afternoon": (time(12, 0), time(17, 0)),
+        "evening":   (time(17, 0), time(21, 0)),
+        "night":     (time(21, 0), time(23, 59, 59)),
+    }
+
+    if time_of_day and time_of_day in TIME_WINDOWS:
+        win_start, win_end = TIME_WINDOWS[time_of_day]
+        filter_start = timezone.make_aware(datetime.combine(target_date, win_start), tz)
+        filter_end   = timezone.make_aware(datetime.combine(target_date, win_end), tz)
+        time_label = " (" + time_of_day + ")"
+    else:
+        filter_start = timezone.make_aware(datetime.combine(target_date, time.min), tz)
+        filter_end   = timezone.make_aware(datetime.combine(target_date, time.max), tz)
+        time_label = ""
+
+    shifts = WorkShift.objects.filter(
+        business=business,
+        start__lt=filter_end,
+        end__gt=filter_start,
+    ).select_related("user").order_by("start")
 
-        if not shifts.exists():
-            return JsonResponse({"answer": "No one is scheduled at " + business.name + " on " + date_label + time_label + "."})
+    date_label = target_date.strftime("%A %d %b")
 
+    if not shifts.exists():
+        return JsonResponse({"answer": "No one is scheduled at " + business.name + " on " + date_label + time_label + "."})
+
+    lines = []
+    for s in shifts:
+        u = s.user
+        name = (u.first_name + " " + u.last_name).strip() or u.username
+        slot = timezone.localtime(s.start).strftime("%H:%M") + "-" + timezone.localtime(s.end).strftime("%H:%M")
+        lines.append("  - " + name + ": " + slot)
+
+    count = len(lines)
+    header = str(count) + " staff at " + business.name + " on " + date_label + time_label + ":"
+    return JsonResponse({"answer": header + "\n" + "\n".join(lines)})
+
+
+# Intent: when is a specific person working
+def _answer_person_schedule(request, ctx, msg, extracted):
+    person_name = extracted.get("person_name")
+    week = extracted.get("week", "this")
+    branch_name = extracted.get("branch_name")
+
+    if not person_name:
+        return JsonResponse({"answer": "I couldn't work out who you're asking about. Try: when is John working this week?"})
+
+    today_date = timezone.localdate()
+    this_monday = today_date - timedelta(days=today_date.weekday())
+    week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
+    week_end = week_start + timedelta(days=6)
+    week_label = "next week" if week == "next" else "this week"
+
+    tz = timezone.get_current_timezone()
+    start_dt = timezone.make_aware(datetime.combine(week_start, time.min), tz)
+    end_dt = timezone.make_aware(datetime.combine(week_end, time.max), tz)
+
+    # Find matching staff across all accessible branches, best match first
+    matched_users = [u for u, _ in ranked_users(search_staff(ctx.owned_ids, person_name))]
+
+    if not matched_users:
+        return JsonResponse({"answer": "I couldn't find anyone called '" + person_name + "' in your branches."})
+
+    if branch_name:
+        businesses = ctx.find_branches(branch_name)
+        if not businesses:
+            return JsonResponse({"answer": "I couldn't find a branch matching '" + branch_name + "'."})
+    else:
+        businesses = ctx.branches
+
+    shifts = WorkShift.objects.filter(
+        business__in=businesses,
+        user__in=matched_users,
+        start__lte=end_dt,
+        end__gte=start_dt,
+    ).select_related("user", "business").order_by("start")
+
+    if not shifts.exists():
+        display = (matched_users[0].first_name + " " + matched_users[0].last_name).strip() or matched_users[0].username
+        return JsonResponse({"answer": display + " has no shifts " + week_label + "."})
+
+    by_user = defaultdict(list)
+    for s in shifts:
+        by_user[s.user_id].append(s)
+
+    sections = []
+    for uid, user_shifts in by_user.items():
+        u = user_shifts[0].user
+        display = (u.first_name + " " + u.last_name).strip() or u.username
         lines = []
-        for s in shifts:
-            u = s.user
-            name = (u.first_name + " " + u.last_name).strip() or u.username
+        for s in user_shifts:
+            day = timezone.localtime(s.start).strftime("%A %d %b")
             slot = timezone.localtime(s.start).strftime("%H:%M") + "-" + timezone.localtime(s.end).strftime("%H:%M")
-            lines.append("  - " + name + ": " + slot)
+            branch_label = " at " + s.business.name if len(businesses) > 1 else ""
+            lines.append("  " + day + ": " + slot + branch_label)
+        sections.append(display + " " + week_label + ":\n" + "\n".join(lines))
 
-        count = len(lines)
-        header = str(count) + " staff at " + business.name + " on " + date_label + time_label + ":"
-        return JsonResponse({"answer": header + "\n" + "\n".join(lines)})
+    return JsonResponse({"answer": "\n\n".join(sections)})
 
-    # Intent: when is a specific person working 
-    if _re.search(r"\bwhen is\b|\bwhen does\b|\bwhen will\b|\bschedule for\b|\bshifts? for\b", msg, _re.IGNORECASE):
-        today = timezone.localdate().isoformat()
-        extracted = extract_person_schedule_query(msg, today)
-        person_name = extracted.get("person_name")
-        week = extracted.get("week", "this")
-        branch_name = extracted.get("branch_name")
 
-        if not person_name:
-            return JsonResponse({"answer": "I couldn't work out who you're asking about. Try: when is John working this week?"})
+# Intent: what position/role does someone have
+def _answer_position(request, ctx, msg, extracted):
+    person_name = extracted.get("person_name")
+    branch_name = extracted.get("branch_name")
 
-        today_date = timezone.localdate()
-        this_monday = today_date - timedelta(days=today_date.weekday())
-        week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
-        week_end = week_start + timedelta(days=6)
-        week_label = "next week" if week == "next" else "this week"
-
-        tz = timezone.get_current_timezone()
-        start_dt = timezone.make_aware(datetime.combine(week_start, time.min), tz)
-        end_dt = timezone.make_aware(datetime.combine(week_end, time.max), tz)
-
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user, role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
-
-        # Find matching staff across all accessible branches
-        name_lower = person_name.lower()
-        member_users = User.objects.filter(
-            businessmembership__business_id__in=owned_ids
-        ).distinct()
-        matched_users = [
-            u for u in member_users
-            if name_lower in (u.first_name + " " + u.last_name).lower()
-            or name_lower in u.username.lower()
-        ]
+    if not person_name:
+        return JsonResponse({"answer": "I couldn't work out who you're asking about. Try: what position is John?"})
 
-        if not matched_users:
-            return JsonResponse({"answer": "I couldn't find anyone called '" + person_name + "' in your branches."})
+    if branch_name:
+        businesses = ctx.find_branches(branch_name)
+        if not businesses:
+            return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
+    else:
+        businesses = ctx.branches
+        if not businesses:
+            return JsonResponse({"answer": "You don't manage any branches yet."})
 
-        if branch_name:
-            businesses = list(_find_branch(owned_ids, branch_name))
-            if not businesses:
-                return JsonResponse({"answer": "I couldn't find a branch matching '" + branch_name + "'."})
-        else:
-            businesses = list(Business.objects.filter(id__in=owned_ids).order_by("name"))
-
-        shifts = WorkShift.objects.filter(
-            business__in=businesses,
-            user__in=matched_users,
-            start__lte=end_dt,
-            end__gte=start_dt,
-        ).select_related("user", "business").order_by("start")
-
-        if not shifts.exists():
-            display = (matched_users[0].first_name + " " + matched_users[0].last_name).strip() or matched_users[0].username
-            return JsonResponse({"answer": display + " has no shifts " + week_label + "."})
-
-        by_user = defaultdict(list)
-        for s in shifts:
-            by_user[s.user_id].append(s)
-
-        sections = []
-        for uid, user_shifts in by_user.items():
-            u = user_shifts[0].user
-            display = (u.first_name + " " + u.last_name).strip() or u.username
-            lines = []
-            for s in user_shifts:
-                day = timezone.localtime(s.start).strftime("%A %d %b")
-                slot = timezone.localtime(s.start).strftime("%H:%M") + "-" + timezone.localtime(s.end).strftime("%H:%M")
-                branch_label = " at " + s.business.name if len(businesses) > 1 else ""
-                lines.append("  " + day + ": " + slot + branch_label)
-            sections.append(display + " " + week_label + ":\n" + "\n".join(lines))
-
-        return JsonResponse({"answer": "\n\n".join(sections)})
-
-    # Intent: what position/role does someone have
-    if _re.search(r"\bposition\b|\bwhat role\b", msg, _re.IGNORECASE):
-        today = timezone.localdate().isoformat()
-        extracted = extract_person_schedule_query(msg, today)
-        person_name = extracted.get("person_name")
-        branch_name = extracted.get("branch_name")
-
-        if not person_name:
-            return JsonResponse({"answer": "I couldn't work out who you're asking about. Try: what position is John?"})
-
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user,
-            role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    matched = list(search_staff([b.id for b in businesses], person_name).filter(
+        role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR]
+    ).select_related('profile'))
 
-        if branch_name:
-            businesses = list(_find_branch(owned_ids, branch_name))
-            if not businesses:
-                return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
-        else:
-            businesses = list(Business.objects.filter(id__in=owned_ids).order_by("name"))
-            if not businesses:
-                return JsonResponse({"answer": "You don't manage any branches yet."})
-
-        name_lower = person_name.lower()
-        memberships = BusinessMembership.objects.filter(
-            business__in=businesses,
-            role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR]
-        ).select_related('user', 'profile', 'business')
-
-        matched = [
-            m for m in memberships
-            if name_lower in (m.user.first_name + ' ' + m.user.last_name).lower()
-            or name_lower in m.user.username.lower()
-        ]
+    if not matched:
+        return JsonResponse({"answer": f"I couldn't find anyone called '{person_name}' in your branches."})
 
-        if not matched:
-            return JsonResponse({"answer": f"I couldn't find anyone called '{person_name}' in your branches."})
+    lines = []
+    for m in matched:
+        display = (m.user.first_name + ' ' + m.user.last_name).strip() or m.user.username
+        profile = getattr(m, 'profile', None)
+        pos = profile.position if profile and profile.position else 'No position assigned'
+        branch_label = f" ({m.business.name})" if len(businesses) > 1 else ""
+        lines.append(f"- {display}{branch_label}: {pos}")
 
-        lines = []
-        for m in matched:
-            display = (m.user.first_name + ' ' + m.user.last_name).strip() or m.user.username
-            profile = getattr(m, 'profile', None)
-            pos = profile.position if profile and profile.position else 'No position assigned'
-            branch_label = f" ({m.business.name})" if len(businesses) > 1 else ""
-            lines.append(f"- {display}{branch_label}: {pos}")
-
-        header = f"Position for {person_name}:" if len(matched) == 1 else f"Positions for '{person_name}':"
-        return JsonResponse({"answer": header + "\n" + "\n".join(lines)})
-
-    # Intent: who has no shifts this/next week 
-    if _re.search(r"\bnot\s+(?:working|scheduled)\b|\bno\s+shifts?\b|\bwho.*\boff\b|\bdays?\s+off\b", msg, _re.IGNORECASE):
-        today_iso = timezone.localdate().isoformat()
-        extracted = extract_hours_query(msg, today_iso)
-        week = extracted.get("week", "this")
-        branch_name = extracted.get("branch_name")
-
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user, role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    header = f"Position for {person_name}:" if len(matched) == 1 else f"Positions for '{person_name}':"
+    return JsonResponse({"answer": header + "\n" + "\n".join(lines)})
 
-        if branch_name:
-            matches = _find_branch(owned_ids, branch_name)
-            if matches.count() == 0:
-                return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
-            if matches.count() > 1:
-                options = ", ".join(matches.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"That matches multiple branches: {options}. Be more specific."})
-            business = matches.first()
-        else:
-            owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-            if owned.count() == 0:
-                return JsonResponse({"answer": "You don't manage any branches yet."})
-            if owned.count() > 1:
-                options = ", ".join(owned.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"Which branch? You manage:{options}."})
-            business = owned.first()
 
-        today_date = timezone.localdate()
-        this_monday = today_date - timedelta(days=today_date.weekday())
-        week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
-        week_end = week_start + timedelta(days=6)
-        week_label = "next week" if week == "next" else "this week"
+# Intent: who has no shifts this/next week
+def _answer_not_working(request, ctx, msg, extracted):
+    week = extracted.get("week", "this")
+    branch_name = extracted.get("branch_name")
 
-        tz = timezone.get_current_timezone()
-        start_dt = timezone.make_aware(datetime.combine(week_start, time.min), tz)
-        end_dt = timezone.make_aware(datetime.combine(week_end, time.max), tz)
+    business, reply = ctx.pick_branch(branch_name, ask="Which branch? You manage:{options}.")
+    if reply:
+        return reply
 
-        all_memberships = BusinessMembership.objects.filter(
-            business=business,
-            role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR]
-        ).select_related('user')
-
-        scheduled_ids = set(WorkShift.objects.filter(
-            business=business, start__lte=end_dt, end__gte=start_dt
-        ).values_list('user_id', flat=True))
-
-        off_staff = [m for m in all_memberships if m.user_id not in scheduled_ids]
-
-        if not off_staff:
-            return JsonResponse({"answer": f"Everyone at {business.name} has at least one shift {week_label}."})
-
-        lines = ["- " + ((m.user.first_name + " " + m.user.last_name).strip() or m.user.username) for m in off_staff]
-        date_range = week_start.strftime("%d %b") + "–" + week_end.strftime("%d %b")
-        return JsonResponse({"answer": f"Not scheduled at {business.name} {week_label} ({date_range}):\n" + "\n".join(lines)})
-
-    # Intent: overlapping shifts on a given day 
-    if _re.search(r"\boverlap\b|\bsame\s+time\b|\bat\s+the\s+same\s+time\b|\bworking\s+together\b", msg, _re.IGNORECASE):
-        today_iso = timezone.localdate().isoformat()
-        extracted = extract_schedule_query(msg, today_iso)
-        iso_date = extracted.get("date")
-        branch_name = extracted.get("branch_name")
-
-        _rel = _re.search(r'\b(today|tomorrow|yesterday)\b', msg, _re.IGNORECASE)
-        if _rel:
-            _offsets = {'today': 0, 'tomorrow': 1, 'yesterday': -1}
-            target_date = timezone.localdate() + timedelta(days=_offsets[_rel.group(1).lower()])
-        elif iso_date:
-            try:
-                target_date = datetime.fromisoformat(iso_date).date()
-            except Exception:
-                return JsonResponse({"answer": "That date looked invalid."})
-        else:
-            weekday_idx, qualifier = extract_weekday_request(msg)
-            if weekday_idx is not None:
-                _td = timezone.localdate()
-                if qualifier == "next":
-                    target_date = next_weekday(_td, weekday_idx)
-                elif qualifier == "this":
-                    candidate = _td + timedelta(days=(weekday_idx - _td.weekday()))
-                    target_date = candidate if candidate >= _td else next_weekday(_td, weekday_idx)
-                else:
-                    target_date = next_weekday(_td, weekday_idx)
-            else:
-                return JsonResponse({"answer": "Which day? Try: who's working at the same time on Saturday?"})
+    today_date = timezone.localdate()
+    this_monday = today_date - timedelta(days=today_date.weekday())
+    week_start = this_monday + timedelta(days=7) if week == "next" else this_monday
+    week_end = week_start + timedelta(days=6)
+    week_label = "next week" if week == "next" else "this week"
 
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user, role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    tz = timezone.get_current_timezone()
+    start_dt = timezone.make_aware(datetime.combine(week_start, time.min), tz)
+    end_dt = timezone.make_aware(datetime.combine(week_end, time.max), tz)
 
-        if branch_name:
-            matches = _find_branch(owned_ids, branch_name)
-            if matches.count() == 0:
-                return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
-            if matches.count() > 1:
-                options = ", ".join(matches.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"That matches multiple branches: {options}. Be more specific."})
-            business = matches.first()
-        else:
-            owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-            if owned.count() == 0:
-                return JsonResponse({"answer": "You don't manage any branches yet."})
-            if owned.count() > 1:
-                options = ", ".join(owned.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"Which branch? You manage:{options}."})
-            business = owned.first()
-
-        tz = timezone.get_current_timezone()
-        day_start = timezone.make_aware(datetime.combine(target_date, time.min), tz)
-        day_end = timezone.make_aware(datetime.combine(target_date, time.max), tz)
-
-        shifts = list(WorkShift.objects.filter(
-            business=business, start__lt=day_end, end__gt=day_start
-        ).select_related('user').order_by('start'))
-
-        date_label = target_date.strftime('%A %d %b')
-
-        if not shifts:
-            return JsonResponse({"answer": f"No shifts at {business.name} on {date_label}."})
-        if len(shifts) < 2:
-            return JsonResponse({"answer": f"Only one shift at {business.name} on {date_label} — no overlaps."})
-
-        # Intent: overlapping shifts on a given day
-        pairs = []
-        for i in range(len(shifts)):
-            for j in range(i + 1, len(shifts)):
-                s1, s2 = shifts[i], shifts[j]
-                if s1.start < s2.end and s2.start < s1.end:
-                    n1 = (s1.user.first_name + ' ' + s1.user.last_name).strip() or s1.user.username
-                    n2 = (s2.user.first_name + ' ' + s2.user.last_name).strip() or s2.user.username
-                    t1 = f"{timezone.localtime(s1.start).strftime('%H:%M')}–{timezone.localtime(s1.end).strftime('%H:%M')}"
-                    t2 = f"{timezone.localtime(s2.start).strftime('%H:%M')}–{timezone.localtime(s2.end).strftime('%H:%M')}"
-                    pairs.append(f"- {n1} ({t1}) ↔ {n2} ({t2})")
-
-        if not pairs:
-            return JsonResponse({"answer": f"No overlapping shifts at {business.name} on {date_label}."})
-
-        return JsonResponse({"answer": f"Overlapping shifts at {business.name} on {date_label}:\n" + "\n".join(pairs)})
-
-    # Intent: create a shift via natural language 
-    if _re.search(r"\bschedule\b", msg, _re.IGNORECASE):
-        today_iso = timezone.localdate().isoformat()
-        extracted = extract_shift_creation_query(msg, today_iso)
-        person_name = extracted.get("person_name")
-        branch_name = extracted.get("branch_name")
-        iso_date = extracted.get("date")
-        start_time_str = extracted.get("start_time")
-        end_time_str = extracted.get("end_time")
-
-        if not person_name:
-            return JsonResponse({"answer": "I couldn't work out who to schedule. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
-        if not iso_date:
-            return JsonResponse({"answer": "I couldn't work out the date. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
-        if not start_time_str or not end_time_str:
-            return JsonResponse({"answer": "I couldn't work out the shift times. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
+    all_memberships = BusinessMembership.objects.filter(
+        business=business,
+        role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR]
+    ).select_related('user')
+
+    scheduled_ids = set(WorkShift.objects.filter(
+        business=business, start__lte=end_dt, end__gte=start_dt
+    ).values_list('user_id', flat=True))
 
+    off_staff = [m for m in all_memberships if m.user_id not in scheduled_ids]
+
+    if not off_staff:
+        return JsonResponse({"answer": f"Everyone at {business.name} has at least one shift {week_label}."})
+
+    lines = ["- " + ((m.user.first_name + " " + m.user.last_name).strip() or m.user.username) for m in off_staff]
+    date_range = week_start.strftime("%d %b") + "–" + week_end.strftime("%d %b")
+    return JsonResponse({"answer": f"Not scheduled at {business.name} {week_label} ({date_range}):\n" + "\n".join(lines)})
+
+
+# Intent: overlapping shifts on a given day
+def _answer_overlap(request, ctx, msg, extracted):
+    iso_date = extracted.get("date")
+    branch_name = extracted.get("branch_name")
+
+    _rel = _re.search(r'\b(today|tomorrow|yesterday)\b', msg, _re.IGNORECASE)
+    if _rel:
+        _offsets = {'today': 0, 'tomorrow': 1, 'yesterday': -1}
+        target_date = timezone.localdate() + timedelta(days=_offsets[_rel.group(1).lower()])
+    elif iso_date:
         try:
-            shift_date = datetime.fromisoformat(iso_date).date()
+            target_date = datetime.fromisoformat(iso_date).date()
         except Exception:
-            return JsonResponse({"answer": "I couldn't parse the date. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
-
-        # Override AI date with Python-computed weekday — AI frequently picks the wrong week
-        today_date = timezone.localdate()
+            return JsonResponse({"answer": "That date looked invalid."})
+    else:
         weekday_idx, qualifier = extract_weekday_request(msg)
         if weekday_idx is not None:
+            _td = timezone.localdate()
             if qualifier == "next":
-                shift_date = next_weekday(today_date, weekday_idx)
+                target_date = next_weekday(_td, weekday_idx)
             elif qualifier == "this":
-                candidate = today_date + timedelta(days=(weekday_idx - today_date.weekday()))
-                shift_date = candidate if candidate >= today_date else next_weekday(today_date, weekday_idx)
+                candidate = _td + timedelta(days=(weekday_idx - _td.weekday()))
+                target_date = candidate if candidate >= _td else next_weekday(_td, weekday_idx)
             else:
-                shift_date = next_weekday(today_date, weekday_idx)
+                target_date = next_weekday(_td, weekday_idx)
+        else:
+            return JsonResponse({"answer": "Which day? Try: who's working at the same time on Saturday?"})
 
-        try:
-            start_dt = timezone.make_aware(datetime.combine(shift_date, datetime.strptime(start_time_str, "%H:%M").time()), timezone.get_current_timezone())
-            end_dt = timezone.make_aware(datetime.combine(shift_date, datetime.strptime(end_time_str, "%H:%M").time()), timezone.get_current_timezone())
-        except Exception:
-            return JsonResponse({"answer": "I couldn't parse the shift times. Try: 9:00–17:00 on Friday."})
+    business, reply = ctx.pick_branch(branch_name, ask="Which branch? You manage:{options}.")
+    if reply:
+        return reply
 
-        if end_dt <= start_dt:
-            return JsonResponse({"answer": "The end time must be after the start time."})
+    tz = timezone.get_current_timezone()
+    day_start = timezone.make_aware(datetime.combine(target_date, time.min), tz)
+    day_end = timezone.make_aware(datetime.combine(target_date, time.max), tz)
 
-        owned_ids = BusinessMembership.objects.filter(
-            user=request.user,
-            role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-        ).values_list("business_id", flat=True)
+    shifts = list(WorkShift.objects.filter(
+        business=business, start__lt=day_end, end__gt=day_start
+    ).select_related('user').order_by('start'))
 
-        if branch_name:
-            matches = _find_branch(owned_ids, branch_name)
-            if matches.count() == 0:
-                return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
-            if matches.count() > 1:
-                options = ", ".join(matches.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"That matches multiple branches: {options}. Be more specific."})
-            business = matches.first()
-        else:
-            owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-            if owned.count() == 0:
-                return JsonResponse({"answer": "You don't seem to have access to any branches yet."})
-            if owned.count() > 1:
-                options = ", ".join(owned.values_list("name", flat=True)[:8])
-                return JsonResponse({"answer": f"Which branch? You have access to: {options}. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
-            business = owned.first()
-
-        name_lower = person_name.lower()
-        members = User.objects.filter(businessmembership__business=business).distinct()
-        matched = [
-            u for u in members
-            if name_lower in (u.first_name + " " + u.last_name).lower()
-            or name_lower in u.username.lower()
-        ]
+    date_label = target_date.strftime('%A %d %b')
+
+    if not shifts:
+        return JsonResponse({"answer": f"No shifts at {business.name} on {date_label}."})
+    if len(shifts) < 2:
+        return JsonResponse({"answer": f"Only one shift at {business.name} on {date_label} — no overlaps."})
+
+    # Only pairs that really overlap: in a chain A–B, B–C, A and C may never be on together
+    pairs = overlapping_pairs(shifts)
+    if not pairs:
+        return JsonResponse({"answer": f"No overlapping shifts at {business.name} on {date_label}."})
 
-        if not matched:
-            return JsonResponse({"answer": f"I couldn't find anyone called '{person_name}' at {business.name}."})
-        if len(matched) > 1:
-            names = ", ".join((u.first_name + " " + u.last_name).strip() or u.username for u in matched)
-            return JsonResponse({"answer": f"Multiple staff match '{person_name}': {names}. Use the full name."})
+    def label(s):
+        name = (s.user.first_name + ' ' + s.user.last_name).strip() or s.user.username
+        return f"{name} ({timezone.localtime(s.start).strftime('%H:%M')}–{timezone.localtime(s.end).strftime('%H:%M')})"
 
-        employee = matched[0]
+    lines = [f"- {label(a)} ↔ {label(b)}" for a, b in pairs]
 
-        # Prevent exact duplicate shifts
-        if WorkShift.objects.filter(business=business, user=employee, start=start_dt, end=end_dt).exists():
-            return JsonResponse({"answer": f"{employee.get_full_name() or employee.username} already has that exact shift."})
+    return JsonResponse({"answer": f"Overlapping shifts at {business.name} on {date_label}:\n" + "\n".join(lines)})
 
-        WorkShift.objects.create(
+
+# Intent: create a shift via natural language
+def _answer_create_shift(request, ctx, msg, extracted):
+    person_name = extracted.get("person_name")
+    branch_name = extracted.get("branch_name")
+    iso_date = extracted.get("date")
+    start_time_str = extracted.get("start_time")
+    end_time_str = extracted.get("end_time")
+
+    if not person_name:
+        return JsonResponse({"answer": "I couldn't work out who to schedule. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
+    if not iso_date:
+        return JsonResponse({"answer": "I couldn't work out the date. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
+    if not start_time_str or not end_time_str:
+        return JsonResponse({"answer": "I couldn't work out the shift times. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
+
+    try:
+        shift_date = datetime.fromisoformat(iso_date).date()
+    except Exception:
+        return JsonResponse({"answer": "I couldn't parse the date. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday."})
+
+    # Override AI date with Python-computed weekday — AI frequently picks the wrong week
+    today_date = timezone.localdate()
+    weekday_idx, qualifier = extract_weekday_request(msg)
+    if weekday_idx is not None:
+        if qualifier == "next":
+            shift_date = next_weekday(today_date, weekday_idx)
+        elif qualifier == "this":
+            candidate = today_date + timedelta(days=(weekday_idx - today_date.weekday()))
+            shift_date = candidate if candidate >= today_date else next_weekday(today_date, weekday_idx)
+        else:
+            shift_date = next_weekday(today_date, weekday_idx)
+
+    try:
+        start_dt = timezone.make_aware(datetime.combine(shift_date, datetime.strptime(start_time_str, "%H:%M").time()), timezone.get_current_timezone())
+        end_dt = timezone.make_aware(datetime.combine(shift_date, datetime.strptime(end_time_str, "%H:%M").time()), timezone.get_current_timezone())
+    except Exception:
+        return JsonResponse({"answer": "I couldn't parse the shift times. Try: 9:00–17:00 on Friday."})
+
+    if end_dt <= start_dt:
+        return JsonResponse({"answer": "The end time must be after the start time."})
+
+    business, reply = ctx.pick_branch(
+        branch_name,
+        ask="Which branch? You have access to: {options}. Try: schedule John Smith in Luigi's for 9:00–17:00 on Friday.",
+        none="You don't seem to have access to any branches yet.",
+    )
+    if reply:
+        return reply
+
+    matched = ranked_users(search_staff([business.id], person_name))
+
+    if not matched:
+        return JsonResponse({"answer": f"I couldn't find anyone called '{person_name}' at {business.name}."})
+    # A full name that matches exactly wins over people it is merely part of ("Ann Lee" vs "Ann Leeson")
+    exact = [u for u, rank in matched if rank == EXACT_NAME]
+    if len(matched) > 1 and len(exact) != 1:
+        names = ", ".join((u.first_name + " " + u.last_name).strip() or u.username for u, _ in matched)
+        return JsonResponse({"answer": f"Multiple staff match '{person_name}': {names}. Use the full name."})
+
+    employee = exact[0] if exact else matched[0][0]
+
+    display = employee.get_full_name() or employee.username
+    # Overlaps with any of their shifts, at this branch or another, are refused (exact duplicates included)
+    try:
+        save_shift(WorkShift(
             business=business,
             user=employee,
             start=start_dt,
             end=end_dt,
             created_by=request.user,
+        ))
+    except ShiftConflict as exc:
+        booked = ", ".join(
+            f"{c.business.name} {timezone.localtime(c.start):%a %d %b %H:%M}–{timezone.localtime(c.end):%H:%M}"
+            for c in exc.conflicts
         )
+        return JsonResponse({"answer": f"{display} is already booked then: {booked}."})
+
+    date_label = shift_date.strftime("%A %d %b")
+    return JsonResponse({"answer": f"Shift created: {display} at {business.name} on {date_label}, {start_time_str}–{end_time_str}."})
 
-        display = employee.get_full_name() or employee.username
-        date_label = shift_date.strftime("%A %d %b")
-        return JsonResponse({"answer": f"Shift created: {display} at {business.name} on {date_label}, {start_time_str}–{end_time_str}."})
 
-    # Default intent: who is working on a given day
+# Default intent: who is working on a given day
+def _answer_who_is_working(request, ctx, msg, extracted):
     today_date = timezone.localdate()
-    today = today_date.isoformat()
-    extracted = extract_schedule_query(msg, today)
 
     iso_date = extracted.get("date")
     branch_name = extracted.get("branch_name")
@@ -745,30 +631,12 @@ def schedule_chat_api(request):
         else:
             target_date = next_weekday(today_date, weekday_idx)
 
-    owned_ids = BusinessMembership.objects.filter(
-        user=request.user,
-        role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-    ).values_list("business_id", flat=True)
-
-    if branch_name:
-        branch_name = branch_name.strip()
-        matches = _find_branch(owned_ids, branch_name)
-
-        if matches.count() == 0:
-            return JsonResponse({"answer": f"I couldn't find a branch matching '{branch_name}'."})
-        if matches.count() > 1:
-            options = ", ".join(matches.values_list("name", flat=True)[:8])
-            return JsonResponse({"answer": f"That matches multiple branches: {options}. Be more specific."})
-
-        business = matches.first()
-    else:
-        owned = Business.objects.filter(id__in=owned_ids).order_by("name")
-        if owned.count() == 0:
-            return JsonResponse({"answer": "You don't manage any branches yet."})
-        if owned.count() > 1:
-            options = ", ".join(owned.values_list("name", flat=True)[:8])
-            return JsonResponse({"answer": f"Which branch? You manage:{options}. Ask like: who's working Friday in Luigi's?"})
-        business = owned.first()
+    business, reply = ctx.pick_branch(
+        branch_name,
+        ask="Which branch? You manage:{options}. Ask like: who's working Friday in Luigi's?",
+    )
+    if reply:
+        return reply
 
     tz = timezone.get_current_timezone()
     start_dt = timezone.make_aware(datetime.combine(target_date, time.min), tz)
@@ -791,3 +659,57 @@ def schedule_chat_api(request):
 
     answer = f"Scheduled at {business.name} on {target_date.strftime('%A %d %b %Y')}:\n" + "\n".join(lines)
     return JsonResponse({"answer": answer})
+
+
+# Picks the intent by keyword, in priority order: the local parser kind, the async LLM extractor
+# and the function that answers it. Resolved per call so the extractors can be patched in tests
+def _chat_intent(msg):
+    def mentions(pattern):
+        return _re.search(pattern, msg, _re.IGNORECASE)
+
+    if mentions(r"\blate\b"):
+        return "branch", aextract_schedule_query, _answer_late
+    if mentions(r"\bhours?\b"):
+        return "hours", aextract_hours_query, _answer_hours
+    if mentions(r"\bhow\s+many\s+shifts?\b|\bmost\s+shifts?\b|\bfewest\s+shifts?\b|\bshift\s+count\b"):
+        return "hours", aextract_hours_query, _answer_shift_count
+    if mentions(r"\bhow many\b|\banyone\b|\bheadcount\b|\bcoverage\b"):
+        return "coverage", aextract_coverage_query, _answer_coverage
+    if mentions(r"\bwhen is\b|\bwhen does\b|\bwhen will\b|\bschedule for\b|\bshifts? for\b"):
+        return "person_schedule", aextract_person_schedule_query, _answer_person_schedule
+    if mentions(r"\bposition\b|\bwhat role\b"):
+        return "person_schedule", aextract_person_schedule_query, _answer_position
+    if mentions(r"\bnot\s+(?:working|scheduled)\b|\bno\s+shifts?\b|\bwho.*\boff\b|\bdays?\s+off\b"):
+        return "hours", aextract_hours_query, _answer_not_working
+    if mentions(r"\boverlap\b|\bsame\s+time\b|\bat\s+the\s+same\s+time\b|\bworking\s+together\b"):
+        return "schedule", aextract_schedule_query, _answer_overlap
+    if mentions(r"\bschedule\b"):
+        return "shift_creation", aextract_shift_creation_query, _answer_create_shift
+    return "schedule", aextract_schedule_query, _answer_who_is_working
+
+
+# Async so the LLM round trip doesn't hold a worker: served by the ASGI app (myproject/asgi.py),
+# only the answer function's database work runs on a thread
+@login_required
+@require_POST
+@csrf_protect
+async def schedule_chat_api(request):
+    # Main chat endpoint, dispatches to the matching intent handler above
+    msg = (request.POST.get("message") or "").strip()
+    if not msg:
+        return JsonResponse({"answer": "Type: who's working next Friday in Luigi's?"})
+
+    used, key = await _achat_usage_today(request)
+    if used >= DAILY_CHAT_LIMIT:
+        return JsonResponse({
+            "answer": f"You've reached your daily limit of {DAILY_CHAT_LIMIT} questions. Check back tomorrow!",
+            "limit_reached": True,
+        })
+    await request.session.aset(key, used + 1)
+
+    # Load the user here so the sync answer functions reuse it instead of querying again
+    request.user = await request.auser()
+    ctx = await _chat_context(request)
+    kind, llm_extractor, answer = _chat_intent(msg)
+    extracted = await _extract(ctx, kind, msg, llm_extractor)
+    return await sync_to_async(answer)(request, ctx, msg, extracted)
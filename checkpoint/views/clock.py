@@ -3,110 +3,85 @@ from datetime import datetime, timedelta, time
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import F, DurationField, ExpressionWrapper, DateTimeField, Sum, Value
-from django.db.models.functions import Coalesce, Greatest, Least
-from django.http import JsonResponse
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 
-from ..models import Business, BusinessMembership, TimeClock, WorkShift
-from ..utils import get_membership
+from .. import clock_service
+from ..clock_service import ClockError, lock_membership
+from ..models import WorkShift
+from ..utils import feed_etag, get_membership, get_supervisor_membership, not_modified_response, with_etag
+from ..weekly_hours import month_totals, week_totals
 
 User = get_user_model()
 
 
-@login_required
-@require_POST
-def clock_in(request, business_id):
-    # Requires an active shift at the current time; prevents double clock-ins per shift
-    _, business, error_response = get_membership(request, business_id)
+# Dashboard wording for clock service errors
+CLOCK_ERROR_MESSAGES = {
+    ClockError.ALREADY_CLOCKED_IN: "You are already clocked in.",
+    ClockError.NOT_CLOCKED_IN: "You are not clocked in.",
+    ClockError.NO_ACTIVE_SHIFT: "You can only clock in during your scheduled shift.",
+    ClockError.SHIFT_ALREADY_USED: "You have already clocked in for this shift.",
+}
+
+
+def _change_own_clock(request, business_id, action, success_message):
+    # Runs a clock service action for request.user under the membership row lock
+    membership, _, error_response = get_membership(request, business_id)
     if error_response:
         return error_response
 
-    now = timezone.now()
-
-    if TimeClock.objects.filter(
-        business=business,
-        user=request.user,
-        clock_out__isnull=True
-    ).exists():
-        messages.error(request, "You are already clocked in.")
-        return redirect("dashboard")
-
-    active_shift = WorkShift.objects.filter(
-        business=business,
-        user=request.user,
-        start__lte=now,
-        end__gte=now
-    ).order_by("start").first()
-
-    if not active_shift:
-        messages.error(request, "You can only clock in during your scheduled shift.")
-        return redirect("dashboard")
-
-    if TimeClock.objects.filter(
-        business=business,
-        user=request.user,
-        shift=active_shift
-    ).exists():
-        messages.error(request, "You have already clocked in for this shift.")
-        return redirect("dashboard")
-
-    TimeClock.objects.create(
-        business=business,
-        user=request.user,
-        shift=active_shift,
-        clock_in=now
-    )
-
-    messages.success(request, "Clocked in successfully.")
+    try:
+        with transaction.atomic():
+            action(lock_membership(pk=membership.pk), timezone.now())
+    except ClockError as exc:
+        messages.error(request, CLOCK_ERROR_MESSAGES[exc.code])
+    except IntegrityError:
+        # Only reachable if another clock-in slipped past the lock; the partial unique index refused it
+        messages.error(request, CLOCK_ERROR_MESSAGES[ClockError.ALREADY_CLOCKED_IN])
+    else:
+        messages.success(request, success_message)
     return redirect("dashboard")
 
 
 @login_required
 @require_POST
-def clock_out(request, business_id):
-    # Closes the most recent open TimeClock entry for this user
-    membership, business, error_response = get_membership(request, business_id)
-    if error_response:
-        return error_response
-
-    now = timezone.now()
-
-    open_clock = TimeClock.objects.filter(
-        business=business,
-        user=request.user,
-        clock_out__isnull=True
-    ).order_by("-clock_in").first()
-
-    if not open_clock:
-        messages.error(request, "You are not clocked in.")
-        return redirect("dashboard")
+def clock_in(request, business_id):
+    # Requires an active shift at the current time; prevents double clock-ins per shift
+    return _change_own_clock(request, business_id, clock_service.clock_in, "Clocked in successfully.")
 
-    open_clock.clock_out = now
-    open_clock.save(update_fields=["clock_out"])
 
-    messages.success(request, "Clocked out successfully.")
-    return redirect("dashboard")
+@login_required
+@require_POST
+def clock_out(request, business_id):
+    # Closes the open TimeClock entry for this user
+    return _change_own_clock(request, business_id, clock_service.clock_out, "Clocked out successfully.")
 
 
 def staff_branch_shifts_json(request, business_id):
-    # JSON endpoint used by the staff schedule calendar
-    from ..utils import shift_to_dict
+    # JSON endpoint used by the staff schedule calendar, limited to the visible window
+    from ..utils import parse_calendar_window, shift_feed_json, shifts_in_window
     _, business, error_response = get_membership(request, business_id, json=True)
 
     if error_response:
         return error_response
 
+    start, end, error_response = parse_calendar_window(request.GET)
+    if error_response:
+        return error_response
+
+    etag = feed_etag(business.id, 'staff_shifts', request.user.id, start, end)
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
+
     shifts = (
-        WorkShift.objects.filter(business=business, user=request.user)
-        .select_related('user')
+        shifts_in_window(WorkShift.objects.filter(business=business, user=request.user), start, end)
         .order_by('start')
     )
-
-    data = [shift_to_dict(shift) for shift in shifts]
-    return JsonResponse(data, safe=False)
+    return with_etag(HttpResponse(shift_feed_json(shifts), content_type='application/json'), etag)
 
 
 @login_required
@@ -131,65 +106,11 @@ def my_hours(request, business_id):
     def start_of_day(d):
         return timezone.make_aware(datetime.combine(d, time.min), tz)
 
-    week_start_dt = start_of_day(week_start)
-    week_end_dt = start_of_day(week_end)
-    month_start_dt = start_of_day(month_start)
-    month_end_dt = start_of_day(month_end)
-
-    duration_expr = ExpressionWrapper(
-        F('clock_out') - F('clock_in'),
-        output_field=DurationField()
+    week_scheduled, week_worked = week_totals(business.id, request.user.id, week_start)
+    month_scheduled, month_worked = month_totals(
+        business.id, request.user.id, start_of_day(month_start), start_of_day(month_end),
     )
 
-    def worked_total_for_range(start_dt, end_dt):
-        # Sums actual clocked durations that overlap the given range
-        qs = TimeClock.objects.filter(
-            business=business,
-            user=request.user,
-            clock_out__isnull=False,
-            clock_in__lt=end_dt,
-            clock_out__gt=start_dt,
-        )
-        return qs.aggregate(
-            total=Coalesce(
-                Sum(duration_expr),
-                Value(timedelta(0)),
-                output_field=DurationField(),
-            )
-        )["total"]
-
-    def scheduled_total_for_range(start_dt, end_dt):
-        # Clips each shift to the range boundary before summing, so partial overlaps are counted correctly
-        qs = (
-            WorkShift.objects
-            .filter(
-                business=business,
-                user=request.user,
-                start__lt=end_dt,
-                end__gt=start_dt,
-            )
-            .annotate(
-                overlap=ExpressionWrapper(
-                    Least(F("end"), Value(end_dt, output_field=DateTimeField()))
-                    - Greatest(F("start"), Value(start_dt, output_field=DateTimeField())),
-                    output_field=DurationField(),
-                )
-            )
-            .filter(overlap__gt=timedelta(0))
-        )
-        return qs.aggregate(
-            total=Coalesce(
-                Sum("overlap"),
-                Value(timedelta(0)),
-                output_field=DurationField(),
-            )
-        )["total"]
-
-    week_worked = worked_total_for_range(week_start_dt, week_end_dt)
-    month_worked = worked_total_for_range(month_start_dt, month_end_dt)
-    week_scheduled = scheduled_total_for_range(week_start_dt, week_end_dt)
-    month_scheduled = scheduled_total_for_range(month_start_dt, month_end_dt)
-
     def hours_minutes(td):
         seconds = int(td.total_seconds())
         return seconds // 3600, (seconds % 3600) // 60
@@ -219,21 +140,22 @@ def my_hours(request, business_id):
 @login_required
 def staff_hours_json(request, business_id, user_id):
     # JSON endpoint for the hours modal; accessible to owners/supervisors or the staff member themselves
-    is_supervisor = BusinessMembership.objects.filter(
-        user=request.user,
-        business_id=business_id,
-        role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-    ).exists()
+    supervisor_membership, _, _ = get_supervisor_membership(request, business_id, json=True)
     is_own_hours = str(request.user.id) == str(user_id)
-    if not is_supervisor and not is_own_hours:
+    if not supervisor_membership and not is_own_hours:
         return JsonResponse({'error': 'Forbidden'}, status=403)
 
+    # Totals depend on the branch's rows and on which week/month "today" falls in
+    today = timezone.localdate()
+    etag = feed_etag(business_id, 'hours', user_id, today)
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
+
     target_user = get_user_model().objects.filter(id=user_id).first()
     if not target_user:
         return JsonResponse({'error': 'User not found'}, status=404)
 
-    business = Business.objects.filter(id=business_id).first()
-    today = timezone.localdate()
     tz = timezone.get_current_timezone()
 
     week_start = today - timedelta(days=today.weekday())
@@ -244,39 +166,21 @@ def staff_hours_json(request, business_id, user_id):
     def start_of_day(d):
         return timezone.make_aware(datetime.combine(d, time.min), tz)
 
-    week_start_dt = start_of_day(week_start)
-    week_end_dt = start_of_day(week_end)
-    month_start_dt = start_of_day(month_start)
-    month_end_dt = start_of_day(month_end)
-
-    duration_expr = ExpressionWrapper(F('clock_out') - F('clock_in'), output_field=DurationField())
-
-    def worked_total(start_dt, end_dt):
-        return TimeClock.objects.filter(
-            business=business, user=target_user,
-            clock_out__isnull=False, clock_in__lt=end_dt, clock_out__gt=start_dt,
-        ).aggregate(total=Coalesce(Sum(duration_expr), Value(timedelta(0)), output_field=DurationField()))["total"]
-
-    def scheduled_total(start_dt, end_dt):
-        qs = WorkShift.objects.filter(
-            business=business, user=target_user, start__lt=end_dt, end__gt=start_dt,
-        ).annotate(overlap=ExpressionWrapper(
-            Least(F("end"), Value(end_dt, output_field=DateTimeField()))
-            - Greatest(F("start"), Value(start_dt, output_field=DateTimeField())),
-            output_field=DurationField(),
-        )).filter(overlap__gt=timedelta(0))
-        return qs.aggregate(total=Coalesce(Sum("overlap"), Value(timedelta(0)), output_field=DurationField()))["total"]
+    week_scheduled, week_worked = week_totals(business_id, target_user.id, week_start)
+    month_scheduled, month_worked = month_totals(
+        business_id, target_user.id, start_of_day(month_start), start_of_day(month_end),
+    )
 
     def hm(td):
         s = int(td.total_seconds())
         return s // 3600, (s % 3600) // 60
 
-    ww_h, ww_m = hm(worked_total(week_start_dt, week_end_dt))
-    mw_h, mw_m = hm(worked_total(month_start_dt, month_end_dt))
-    ws_h, ws_m = hm(scheduled_total(week_start_dt, week_end_dt))
-    ms_h, ms_m = hm(scheduled_total(month_start_dt, month_end_dt))
+    ww_h, ww_m = hm(week_worked)
+    mw_h, mw_m = hm(month_worked)
+    ws_h, ws_m = hm(week_scheduled)
+    ms_h, ms_m = hm(month_scheduled)
 
-    return JsonResponse({
+    return with_etag(JsonResponse({
         'name': target_user.get_full_name() or target_user.username,
         'week_start': str(week_start),
         'week_end': str(week_end - timedelta(days=1)),
@@ -286,4 +190,4 @@ def staff_hours_json(request, business_id, user_id):
         'month_worked': f"{mw_h}h {mw_m:02d}m",
         'week_scheduled': f"{ws_h}h {ws_m:02d}m",
         'month_scheduled': f"{ms_h}h {ms_m:02d}m",
-    })
+    }), etag)
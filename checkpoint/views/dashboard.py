@@ -6,7 +6,7 @@ from django.utils import timezone
 from django.views.decorators.http import require_POST
 
 from ..models import BusinessMembership
-from ..utils import get_membership, compute_staff_status, send_staff_message_email
+from ..utils import get_membership, compute_staff_status_bulk, send_staff_message_email
 from .chat import DAILY_CHAT_LIMIT
 
 User = get_user_model()
@@ -24,9 +24,11 @@ def dashboard(request):
         branches = [m.business for m in owner_memberships]
         owned_branch_ids = [b.id for b in branches]
 
+        status_by_branch = compute_staff_status_bulk(branches)
+
         branches_with_status = []
         for b in branches:
-            status = compute_staff_status(b)
+            status = status_by_branch[b.id]
 
             staff_memberships = BusinessMembership.objects.filter(
                 business=b,
@@ -72,10 +74,12 @@ def dashboard(request):
     preferred_view = request.session.get('dashboard_view', 'supervisor') if show_role_switcher else ('supervisor' if has_supervisor else 'employee')
 
     if has_supervisor and preferred_view == 'supervisor':
+        status_by_branch = compute_staff_status_bulk([m.business for m in supervisor_memberships])
+
         branches_with_status = []
         for sup_mem in supervisor_memberships:
             business = sup_mem.business
-            status = compute_staff_status(business)
+            status = status_by_branch[business.id]
             staff_memberships = BusinessMembership.objects.filter(
                 business=business,
                 role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR]
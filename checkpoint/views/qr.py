@@ -1,34 +1,77 @@
+import hashlib
 import io
 import json
-import uuid
+from collections import defaultdict
+from datetime import timedelta
+from operator import itemgetter
 
 import qrcode
+import qrcode.image.svg
 
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
+from django.utils.http import quote_etag
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.http import require_POST
 
-from ..models import BusinessMembership, TimeClock, WorkShift, generate_pin
-from ..utils import get_membership, get_supervisor_membership
+from ..clock_service import CLOCKED_IN, ClockError, lock_membership, toggle_clock, toggle_clocks_bulk
+from ..models import BusinessMembership
+from ..scan_tokens import (
+    QR_TOKEN_WINDOW, clock_history, code_spent, issue_qr_token, parse_qr_token, qr_signature_valid,
+)
+from ..utils import get_membership, get_membership_map, get_supervisor_membership, not_modified_response, with_etag
+
+
+# Rendered codes only change when the signed token moves to a new window, so they're cached under
+# a key that includes it; superseded entries age out on their own
+QR_IMAGE_CACHE_SECONDS = QR_TOKEN_WINDOW * 2
+QR_IMAGE_FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def _render_qr(data, fmt):
+    if fmt == "svg":
+        # Pure-Python SVG path output, no PIL involved
+        return qrcode.make(data, image_factory=qrcode.image.svg.SvgPathFillImage).to_string()
+    buf = io.BytesIO()
+    qrcode.make(data).save(buf, format='PNG')
+    return buf.getvalue()
 
 
 @login_required
 def my_qr_code(request, business_id):
-    # Returns the staff member's personal QR code as a PNG image
+    # Returns the staff member's personal QR code as a PNG (or SVG with ?format=svg)
     membership, business, error_response = get_membership(request, business_id)
     if error_response:
         return error_response
 
-    token = str(membership.qr_token)
+    fmt = request.GET.get("format", "png")
+    if fmt not in QR_IMAGE_FORMATS:
+        return HttpResponse("Unsupported format.", status=400)
+
+    token = issue_qr_token(membership)
     scan_url = request.build_absolute_uri(f"/qr-scan/{token}/")
+    digest = hashlib.sha1(f"{membership.pk}|{token}|{scan_url}|{fmt}".encode()).hexdigest()
 
-    img = qrcode.make(scan_url)
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    buf.seek(0)
-    return HttpResponse(buf.getvalue(), content_type='image/png')
+    # Phones refreshing an unchanged code get a 304 without touching the image at all
+    etag = quote_etag(digest)
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
+
+    cache_key = f"qr_image:{digest}"
+    image = cache.get(cache_key)
+    if image is None:
+        image = _render_qr(scan_url, fmt)
+        cache.set(cache_key, image, QR_IMAGE_CACHE_SECONDS)
+    return with_etag(HttpResponse(image, content_type=QR_IMAGE_FORMATS[fmt]), etag)
 
 
 @login_required
@@ -41,77 +84,68 @@ def qr_scanner(request, business_id):
     return render(request, "dashboard/qr_scanner.html", {"business": business})
 
 
+# Scanner wording for clock service errors; {name} is the scanned employee
+SCAN_ERROR_MESSAGES = {
+    ClockError.NO_ACTIVE_SHIFT: "{name} has no active shift right now.",
+    ClockError.SHIFT_ALREADY_USED: "{name} already clocked in for this shift.",
+}
+QR_NOT_FOUND_MESSAGE = "Invalid QR code or expired QR code."
+PIN_NOT_FOUND_MESSAGE = "Invalid code — please check and try again."
+CODE_SPENT_MESSAGE = "{name}'s code was just used — wait for the new one to appear and scan again."
+
+
+def _process_scan(request, lookup, not_found_message, qr=None, when=None):
+    # Shared QR/PIN flow: lock the scanned member, check the code is still live and toggle their
+    # clock, all in one transaction so two kiosks scanning the same person can't both clock them in.
+    # `qr` is the (window, signature) of a QR token, checked against the member's secret
+    when = when or timezone.now()
+    try:
+        with transaction.atomic():
+            try:
+                membership = lock_membership(**lookup)
+            except BusinessMembership.DoesNotExist:
+                return JsonResponse({"error": not_found_message}, status=404)
+            if qr and not qr_signature_valid(membership, *qr, when):
+                return JsonResponse({"error": not_found_message}, status=404)
+
+            _, _, error_response = get_supervisor_membership(
+                request, membership.business_id, json=True,
+                message="You don't have permission to clock staff in/out here.",
+            )
+            if error_response:
+                return error_response
+
+            employee = membership.user
+            name = employee.get_full_name() or employee.username
+            history = clock_history([membership]).get(membership.pk)
+            if code_spent(membership, history, when, window=qr[0] if qr else None):
+                return JsonResponse({"error": CODE_SPENT_MESSAGE.format(name=name)}, status=409)
+
+            try:
+                action, _ = toggle_clock(membership, when)
+            except ClockError as exc:
+                return JsonResponse({"error": SCAN_ERROR_MESSAGES[exc.code].format(name=name)}, status=400)
+            verb = "clocked in" if action == CLOCKED_IN else "clocked out"
+            message = f"{name} {verb} at {timezone.localtime(when).strftime('%H:%M')}."
+            return JsonResponse({"action": action, "message": message})
+    except IntegrityError:
+        # The partial unique index caught a second open clock that got past the row lock
+        return JsonResponse({"error": "This scan was already recorded — please scan again."}, status=409)
+
+
 @require_POST
 @csrf_protect
 def process_qr_scan(request, token):
-    # Clocks the employee in or out based on their current state; rotates QR token and PIN after every scan
+    # Clocks the employee in or out based on their current state; the token is only good for
+    # its time window and for one clock change
     if not request.user.is_authenticated:
         return JsonResponse({"error": "Authentication required."}, status=401)
 
-    try:
-        membership = BusinessMembership.objects.select_related("user", "business").get(
-            qr_token=token)
-    except BusinessMembership.DoesNotExist:
-        return JsonResponse({"error": "Invalid QR code or expired QR code."}, status=404)
-
-    employee = membership.user
-    business = membership.business
-
-    scanner_membership = BusinessMembership.objects.filter(
-        user=request.user,
-        business=business,
-        role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-    ).first()
-    if not scanner_membership:
-        return JsonResponse({"error": "You don't have permission to clock staff in/out here."}, status=403)
-
-    now = timezone.now()
-
-    open_clock = TimeClock.objects.filter(
-        business=business,
-        user=employee,
-        clock_out__isnull=True
-    ).order_by("-clock_in").first()
-
-    if open_clock:
-        open_clock.clock_out = now
-        open_clock.save(update_fields=["clock_out"])
-        action = "clocked_out"
-        message = f"{employee.get_full_name() or employee.username} clocked out at {timezone.localtime(now).strftime('%H:%M')}."
-    else:
-        active_shift = WorkShift.objects.filter(
-            business=business,
-            user=employee,
-            start__lte=now,
-            end__gte=now
-        ).order_by("start").first()
-
-        if not active_shift:
-            membership.qr_token = uuid.uuid4()
-            membership.pin_code = generate_pin()
-            membership.save(update_fields=["qr_token", "pin_code"])
-            return JsonResponse({"error": f"{employee.get_full_name() or employee.username} has no active shift right now."}, status=400)
-
-        if TimeClock.objects.filter(business=business, user=employee, shift=active_shift).exists():
-            membership.qr_token = uuid.uuid4()
-            membership.pin_code = generate_pin()
-            membership.save(update_fields=["qr_token", "pin_code"])
-            return JsonResponse({"error": f"{employee.get_full_name() or employee.username} already clocked in for this shift."}, status=400)
-
-        TimeClock.objects.create(
-            business=business,
-            user=employee,
-            shift=active_shift,
-            clock_in=now
-        )
-        action = "clocked_in"
-        message = f"{employee.get_full_name() or employee.username} clocked in at {timezone.localtime(now).strftime('%H:%M')}."
-
-    membership.qr_token = uuid.uuid4()
-    membership.pin_code = generate_pin()
-    membership.save(update_fields=["qr_token", "pin_code"])
-
-    return JsonResponse({"action": action, "message": message})
+    parsed = parse_qr_token(token)
+    if parsed is None:
+        return JsonResponse({"error": QR_NOT_FOUND_MESSAGE}, status=404)
+    pk, window, signature = parsed
+    return _process_scan(request, {"pk": pk}, QR_NOT_FOUND_MESSAGE, qr=(window, signature))
 
 
 @require_POST
@@ -130,66 +164,135 @@ def process_pin_scan(request):
     if not pin:
         return JsonResponse({"error": "No code provided."}, status=400)
 
-    try:
-        membership = BusinessMembership.objects.select_related("user", "business").get(pin_code=pin)
-    except BusinessMembership.DoesNotExist:
-        return JsonResponse({"error": "Invalid code — please check and try again."}, status=404)
+    return _process_scan(request, {"pin_code": pin}, PIN_NOT_FOUND_MESSAGE)
 
-    employee = membership.user
-    business = membership.business
 
-    scanner_membership = BusinessMembership.objects.filter(
-        user=request.user,
-        business=business,
-        role__in=[BusinessMembership.OWNER, BusinessMembership.SUPERVISOR]
-    ).first()
-    if not scanner_membership:
-        return JsonResponse({"error": "You don't have permission to clock staff in/out here."}, status=403)
+# A kiosk queue older than this is more likely a forgotten tablet than a network blip
+MAX_BATCH_SCANS = 200
+MAX_OFFLINE_SCAN_AGE = timedelta(hours=12)
 
-    now = timezone.now()
 
-    open_clock = TimeClock.objects.filter(
-        business=business,
-        user=employee,
-        clock_out__isnull=True
-    ).order_by("-clock_in").first()
-
-    if open_clock:
-        open_clock.clock_out = now
-        open_clock.save(update_fields=["clock_out"])
-        action = "clocked_out"
-        message = f"{employee.get_full_name() or employee.username} clocked out at {timezone.localtime(now).strftime('%H:%M')}."
-    else:
-        active_shift = WorkShift.objects.filter(
-            business=business,
-            user=employee,
-            start__lte=now,
-            end__gte=now
-        ).order_by("start").first()
-
-        if not active_shift:
-            membership.qr_token = uuid.uuid4()
-            membership.pin_code = generate_pin()
-            membership.save(update_fields=["qr_token", "pin_code"])
-            return JsonResponse({"error": f"{employee.get_full_name() or employee.username} has no active shift right now."}, status=400)
-
-        if TimeClock.objects.filter(business=business, user=employee, shift=active_shift).exists():
-            membership.qr_token = uuid.uuid4()
-            membership.pin_code = generate_pin()
-            membership.save(update_fields=["qr_token", "pin_code"])
-            return JsonResponse({"error": f"{employee.get_full_name() or employee.username} already clocked in for this shift."}, status=400)
-
-        TimeClock.objects.create(
-            business=business,
-            user=employee,
-            shift=active_shift,
-            clock_in=now
-        )
-        action = "clocked_in"
-        message = f"{employee.get_full_name() or employee.username} clocked in at {timezone.localtime(now).strftime('%H:%M')}."
-
-    membership.qr_token = uuid.uuid4()
-    membership.pin_code = generate_pin()
-    membership.save(update_fields=["qr_token", "pin_code"])
-
-    return JsonResponse({"action": action, "message": message})
+def _parse_batch_item(item, now):
+    # Returns (kind, code, scanned_at, error); kind is "qr" with a parsed token or "pin"
+    if not isinstance(item, dict):
+        return None, None, None, "Invalid scan."
+
+    scanned_at = now
+    if item.get("scanned_at"):
+        try:
+            scanned_at = parse_datetime(str(item["scanned_at"]))
+        except ValueError:
+            scanned_at = None
+        if scanned_at is None or timezone.is_naive(scanned_at):
+            return None, None, None, "Invalid scan time."
+        if scanned_at > now:
+            scanned_at = now
+        if now - scanned_at > MAX_OFFLINE_SCAN_AGE:
+            return None, None, None, "This offline scan is too old to record — please clock the time manually."
+
+    if item.get("token"):
+        parsed = parse_qr_token(item["token"])
+        if parsed is None:
+            return None, None, None, QR_NOT_FOUND_MESSAGE
+        return "qr", parsed, scanned_at, None
+    pin = str(item.get("pin") or "").strip().upper()
+    if pin:
+        return "pin", pin, scanned_at, None
+    return None, None, None, "No code provided."
+
+
+@require_POST
+@csrf_protect
+def process_scan_batch(request):
+    # Kiosk batch endpoint: {"scans": [{"id", "token" | "pin", "scanned_at"?}, ...]} from a rush or
+    # an offline queue. Memberships, open clocks and shifts are resolved in bulk and every toggle
+    # is applied in one transaction; each item gets its own result, echoed back with its "id"
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+
+    try:
+        scans = json.loads(request.body).get("scans")
+    except (ValueError, AttributeError):
+        return JsonResponse({"error": "Invalid request."}, status=400)
+    if not isinstance(scans, list) or not scans:
+        return JsonResponse({"error": "No scans provided."}, status=400)
+    if len(scans) > MAX_BATCH_SCANS:
+        return JsonResponse({"error": f"Send at most {MAX_BATCH_SCANS} scans per batch."}, status=400)
+
+    now = timezone.now()
+    results = [None] * len(scans)
+    parsed = []
+    for index, item in enumerate(scans):
+        kind, code, scanned_at, error = _parse_batch_item(item, now)
+        item_id = item.get("id") if isinstance(item, dict) else None
+        if error:
+            results[index] = {"id": item_id, "status": 400, "error": error}
+        else:
+            parsed.append((index, item_id, kind, code, scanned_at))
+
+    allowed = {
+        business_id for business_id, m in get_membership_map(request).items()
+        if m.has_min_role(BusinessMembership.SUPERVISOR)
+    }
+    try:
+        with transaction.atomic():
+            # One locking query for every scanned member, in pk order so concurrent batches can't deadlock
+            pks = [code[0] for _, _, kind, code, _ in parsed if kind == "qr"]
+            pins = [code for _, _, kind, code, _ in parsed if kind == "pin"]
+            locked = list(
+                BusinessMembership.objects.select_for_update(of=("self",))
+                .select_related("user")
+                .filter(Q(pk__in=pks) | Q(pin_code__in=pins))
+                .order_by("pk")
+            ) if parsed else []
+            by_pk = {m.pk: m for m in locked}
+            by_pin = {m.pin_code: m for m in locked}
+
+            by_member = defaultdict(list)
+            for index, item_id, kind, code, scanned_at in parsed:
+                if kind == "qr":
+                    pk, window, signature = code
+                    membership = by_pk.get(pk)
+                    if membership and not qr_signature_valid(membership, window, signature, scanned_at):
+                        membership = None
+                    not_found_message = QR_NOT_FOUND_MESSAGE
+                else:
+                    window = None
+                    membership = by_pin.get(code)
+                    not_found_message = PIN_NOT_FOUND_MESSAGE
+
+                if membership is None:
+                    results[index] = {"id": item_id, "status": 404, "error": not_found_message}
+                elif membership.business_id not in allowed:
+                    results[index] = {"id": item_id, "status": 403, "error": "You don't have permission to clock staff in/out here."}
+                else:
+                    by_member[membership.pk].append((scanned_at, index, item_id, membership, window))
+
+            # An offline queue can hold someone's clock-in and their clock-out, so each member's scans
+            # are applied oldest first, one per round; every round sees what the previous one wrote
+            queues = [sorted(scans, key=itemgetter(0, 1)) for scans in by_member.values()]
+            for position in range(max(map(len, queues), default=0)):
+                round_scans = [queue[position] for queue in queues if len(queue) > position]
+                history = clock_history([membership for _, _, _, membership, _ in round_scans])
+                to_toggle = []
+                for scanned_at, index, item_id, membership, window in round_scans:
+                    if code_spent(membership, history.get(membership.pk), scanned_at, window=window):
+                        name = membership.user.get_full_name() or membership.user.username
+                        results[index] = {"id": item_id, "status": 409, "error": CODE_SPENT_MESSAGE.format(name=name)}
+                    else:
+                        to_toggle.append((index, item_id, membership, scanned_at))
+
+                outcomes = toggle_clocks_bulk([(membership, scanned_at) for _, _, membership, scanned_at in to_toggle])
+                for (index, item_id, membership, scanned_at), (action, error_code) in zip(to_toggle, outcomes):
+                    name = membership.user.get_full_name() or membership.user.username
+                    if error_code:
+                        results[index] = {"id": item_id, "status": 400, "error": SCAN_ERROR_MESSAGES[error_code].format(name=name)}
+                    else:
+                        verb = "clocked in" if action == CLOCKED_IN else "clocked out"
+                        message = f"{name} {verb} at {timezone.localtime(scanned_at).strftime('%H:%M')}."
+                        results[index] = {"id": item_id, "status": 200, "action": action, "message": message}
+    except IntegrityError:
+        # Nothing was written; the kiosk keeps its queue and retries the whole batch
+        return JsonResponse({"error": "These scans conflicted with another kiosk — please retry."}, status=409)
+
+    return JsonResponse({"results": results})
@@ -1,115 +1,193 @@
+import csv
+import os
 from datetime import datetime, time, timedelta, date as date_type
 
 from django.conf import settings as django_settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 from weasyprint import HTML as WeasyHTML, CSS as WeasyCSS
 
-from ..models import Business, BusinessMembership, TimeClock
-from ..utils import get_supervisor_membership
+from ..models import BusinessMembership, ReportJob, TimeClock
+from ..pdf_render import merge_pdfs, render_html_pdfs
+from ..report_cache import built_report, cached_report
+from ..report_jobs import enqueue_report_job
+from ..utils import get_membership_map, get_supervisor_membership
 
 
-def _build_staff_report_data(business, staff_memberships, from_dt, to_dt):
-    # Builds per-staff attendance rows for the date range; marks a clock-in as late if >15 min after shift start
-    LATE_THRESHOLD = timedelta(minutes=15)
+LATE_THRESHOLD = timedelta(minutes=15)
+
+
+def _report_staff_memberships(business_ids):
+    # Staff (employees and supervisors) for every branch in the report, in report order
+    return (
+        BusinessMembership.objects
+        .filter(business_id__in=business_ids, role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR])
+        .select_related('user', 'profile')
+        .order_by('user__last_name', 'user__first_name')
+    )
+
+
+def _report_timeclock_rows(business_ids, from_dt, to_dt):
+    # Closed TimeClocks in the range as (business_id, user_id, clock_in, clock_out, shift_start,
+    # duration, late_by) tuples, with duration and lateness computed by the database
+    return (
+        TimeClock.objects
+        .filter(
+            business_id__in=business_ids,
+            clock_in__gte=from_dt,
+            clock_in__lt=to_dt,
+            clock_out__isnull=False,
+        )
+        .annotate(
+            duration=ExpressionWrapper(F('clock_out') - F('clock_in'), output_field=DurationField()),
+            late_by=ExpressionWrapper(F('clock_in') - F('shift__start'), output_field=DurationField()),
+        )
+        .values_list('business_id', 'user_id', 'clock_in', 'clock_out', 'shift__start', 'duration', 'late_by')
+    )
+
+
+def _build_report_data(staff_memberships, from_dt, to_dt):
+    # Builds per-staff attendance rows for every branch the memberships cover, keyed by business id.
+    # All closed TimeClocks in the range come back in one streamed query; a clock-in is late
+    # if >15 min after shift start
     tz = timezone.get_current_timezone()
-    staff_data = []
+    staff_memberships = list(staff_memberships)
+    business_ids = {m.business_id for m in staff_memberships}
+
+    rows = _report_timeclock_rows(business_ids, from_dt, to_dt).order_by('clock_in')
+
+    stats = {(m.business_id, m.user_id): {'entries': [], 'total_seconds': 0, 'late_count': 0} for m in staff_memberships}
+
+    for business_id, user_id, clock_in, clock_out, shift_start, duration, late_by in rows.iterator(chunk_size=2000):
+        staff = stats.get((business_id, user_id))
+        if staff is None:
+            continue
+
+        seconds = int(duration.total_seconds())
+        staff['total_seconds'] += seconds
+        is_late = late_by is not None and late_by > LATE_THRESHOLD
+        minutes_late = int(late_by.total_seconds() / 60) if is_late else 0
+        if is_late:
+            staff['late_count'] += 1
+
+        staff['entries'].append({
+            'date': timezone.localtime(clock_in, tz).strftime('%a %d %b %Y'),
+            'shift_start': timezone.localtime(shift_start, tz).strftime('%H:%M') if shift_start else '—',
+            'clock_in': timezone.localtime(clock_in, tz).strftime('%H:%M'),
+            'clock_out': timezone.localtime(clock_out, tz).strftime('%H:%M'),
+            'duration': f"{seconds // 3600}h {(seconds % 3600) // 60:02d}m",
+            'is_late': is_late,
+            'minutes_late': minutes_late,
+        })
 
+    data = {business_id: [] for business_id in business_ids}
     for m in staff_memberships:
-        timeclocks = (
-            TimeClock.objects
-            .filter(
-                business=business,
-                user=m.user,
-                clock_in__gte=from_dt,
-                clock_in__lt=to_dt,
-                clock_out__isnull=False,
-            )
-            .select_related('shift')
-            .order_by('clock_in')
-        )
+        staff = stats[(m.business_id, m.user_id)]
+        total_seconds = staff['total_seconds']
+        profile = getattr(m, 'profile', None)
 
-        entries = []
-        total_seconds = 0
-        late_count = 0
-
-        for tc in timeclocks:
-            duration = tc.clock_out - tc.clock_in
-            total_seconds += int(duration.total_seconds())
-            is_late = False
-            minutes_late = 0
-            if tc.shift:
-                diff = tc.clock_in - tc.shift.start
-                if diff > LATE_THRESHOLD:
-                    is_late = True
-                    minutes_late = int(diff.total_seconds() / 60)
-                    late_count += 1
-
-            dur_h = int(duration.total_seconds()) // 3600
-            dur_m = (int(duration.total_seconds()) % 3600) // 60
-            entries.append({
-                'date': timezone.localtime(tc.clock_in, tz).strftime('%a %d %b %Y'),
-                'shift_start': timezone.localtime(tc.shift.start, tz).strftime('%H:%M') if tc.shift else '—',
-                'clock_in': timezone.localtime(tc.clock_in, tz).strftime('%H:%M'),
-                'clock_out': timezone.localtime(tc.clock_out, tz).strftime('%H:%M'),
-                'duration': f"{dur_h}h {dur_m:02d}m",
-                'is_late': is_late,
-                'minutes_late': minutes_late,
-            })
-
-        total_h = total_seconds // 3600
-        total_m = (total_seconds % 3600) // 60
-        position = ''
-        try:
-            position = m.profile.position
-        except Exception:
-            pass
-
-        staff_data.append({
+        data[m.business_id].append({
             'name': m.user.get_full_name() or m.user.username,
-            'position': position,
+            'position': profile.position if profile else '',
             'role': m.get_role_display(),
-            'entries': entries,
-            'total_hours': f"{total_h}h {total_m:02d}m",
+            'entries': staff['entries'],
+            'total_hours': f"{total_seconds // 3600}h {(total_seconds % 3600) // 60:02d}m",
             'total_seconds': total_seconds,
-            'late_count': late_count,
-            'shift_count': len(entries),
+            'late_count': staff['late_count'],
+            'shift_count': len(staff['entries']),
         })
 
-    return staff_data
+    return data
 
 
-@login_required
-def download_supervisor_report(request, business_id):
-    # Generates and streams a PDF attendance report for a single branch over the requested date range
-    _, business, error = get_supervisor_membership(request, business_id)
-    if error:
-        return error
+def _build_staff_report_data(business, staff_memberships, from_dt, to_dt):
+    # Single-branch view of _build_report_data
+    return _build_report_data(staff_memberships, from_dt, to_dt).get(business.id, [])
+
 
-    from_str = request.GET.get('from', '')
-    to_str = request.GET.get('to', '')
+def _parse_report_range(params):
+    # Reads ?from=/&to= (or the POSTed equivalents); returns (from_date, to_date, error_message)
     try:
-        from_date = date_type.fromisoformat(from_str)
-        to_date = date_type.fromisoformat(to_str)
+        from_date = date_type.fromisoformat(params.get('from', ''))
+        to_date = date_type.fromisoformat(params.get('to', ''))
     except (ValueError, TypeError):
-        return HttpResponse("Invalid date range.", status=400)
+        return None, None, "Invalid date range."
 
     if from_date > to_date:
-        return HttpResponse("'From' date must be before 'to' date.", status=400)
+        return None, None, "'From' date must be before 'to' date."
+    return from_date, to_date, None
 
+
+def _report_bounds(from_date, to_date):
+    # [from midnight, day-after-to midnight) in the local timezone
     tz = timezone.get_current_timezone()
     from_dt = timezone.make_aware(datetime.combine(from_date, time.min), tz)
     to_dt = timezone.make_aware(datetime.combine(to_date + timedelta(days=1), time.min), tz)
+    return from_dt, to_dt
+
+
+def _report_css_path():
+    return str(django_settings.BASE_DIR / 'checkpoint' / 'static' / 'css' / 'report.css')
+
+
+def _render_report_pdf(template_name, context):
+    html_str = render_to_string(template_name, context)
+    css = WeasyCSS(filename=_report_css_path())
+    return WeasyHTML(string=html_str).write_pdf(stylesheets=[css])
+
+
+def _chunk_branches(branches_data, chunks):
+    # Splits branches into at most `chunks` contiguous runs of roughly equal work
+    # (one unit per branch plus one per attendance row), keeping report order
+    weights = [1 + sum(s['shift_count'] for s in b['staff_data']) for b in branches_data]
+    target = sum(weights) / chunks
+    groups, current, current_weight = [], [], 0
+    for branch, weight in zip(branches_data, weights):
+        if current and current_weight + weight / 2 > target and len(groups) < chunks - 1:
+            groups.append(current)
+            current, current_weight = [], 0
+        current.append(branch)
+        current_weight += weight
+    groups.append(current)
+    return groups
+
+
+def _render_owner_report_parallel(context, processes):
+    # Each chunk of branches becomes its own HTML document laid out in a worker process;
+    # the first carries the report header and overall summary, the last the footer
+    groups = _chunk_branches(context['branches_data'], processes)
+    html_strings = [
+        render_to_string('reports/owner_report.html', {
+            **context,
+            'branches_data': group,
+            'show_header': i == 0,
+            'show_footer': i == len(groups) - 1,
+        })
+        for i, group in enumerate(groups)
+    ]
+    return merge_pdfs(render_html_pdfs(html_strings, _report_css_path(), processes))
 
-    staff_memberships = (
-        BusinessMembership.objects
-        .filter(business=business, role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR])
-        .select_related('user', 'profile')
-        .order_by('user__last_name', 'user__first_name')
-    )
 
+def _owner_businesses(user):
+    return [
+        om.business for om in BusinessMembership.objects.filter(
+            user=user,
+            role=BusinessMembership.OWNER
+        ).select_related('business')
+    ]
+
+
+def _supervisor_report_pdf(business, from_date, to_date):
+    # Renders the single-branch attendance report; shared by the download view and the job worker
+    tz = timezone.get_current_timezone()
+    from_dt, to_dt = _report_bounds(from_date, to_date)
+
+    staff_memberships = _report_staff_memberships([business.id])
     staff_data = _build_staff_report_data(business, staff_memberships, from_dt, to_dt)
 
     total_branch_seconds = sum(s['total_seconds'] for s in staff_data)
@@ -126,53 +204,20 @@ def download_supervisor_report(request, business_id):
         'total_shifts': sum(s['shift_count'] for s in staff_data),
         'generated': timezone.localtime(timezone.now(), tz).strftime('%d %b %Y %H:%M'),
     }
+    return _render_report_pdf('reports/supervisor_report.html', context)
 
-    html_str = render_to_string('reports/supervisor_report.html', context, request=request)
-    css = WeasyCSS(filename=str(django_settings.BASE_DIR / 'checkpoint' / 'static' / 'css' / 'report.css'))
-    pdf = WeasyHTML(string=html_str).write_pdf(stylesheets=[css])
-
-    filename = f"{business.name}_report_{from_date}_{to_date}.pdf".replace(' ', '_')
-    response = HttpResponse(pdf, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
-
-
-@login_required
-def download_owner_report(request):
-    # Same as the supervisor report but covers all branches the owner manages, with an overall summary
-    owner_memberships = BusinessMembership.objects.filter(
-        user=request.user,
-        role=BusinessMembership.OWNER
-    ).select_related('business')
-
-    if not owner_memberships.exists():
-        return HttpResponse("Access denied.", status=403)
-
-    from_str = request.GET.get('from', '')
-    to_str = request.GET.get('to', '')
-    try:
-        from_date = date_type.fromisoformat(from_str)
-        to_date = date_type.fromisoformat(to_str)
-    except (ValueError, TypeError):
-        return HttpResponse("Invalid date range.", status=400)
-
-    if from_date > to_date:
-        return HttpResponse("'From' date must be before 'to' date.", status=400)
 
+def _owner_report_pdf(owner, businesses, from_date, to_date):
+    # Renders the all-branches report with an overall summary; shared by the download view and the job worker
     tz = timezone.get_current_timezone()
-    from_dt = timezone.make_aware(datetime.combine(from_date, time.min), tz)
-    to_dt = timezone.make_aware(datetime.combine(to_date + timedelta(days=1), time.min), tz)
+    from_dt, to_dt = _report_bounds(from_date, to_date)
+
+    staff_memberships = _report_staff_memberships([b.id for b in businesses])
+    data_by_business = _build_report_data(staff_memberships, from_dt, to_dt)
 
     branches_data = []
-    for om in owner_memberships:
-        business = om.business
-        staff_memberships = (
-            BusinessMembership.objects
-            .filter(business=business, role__in=[BusinessMembership.EMPLOYEE, BusinessMembership.SUPERVISOR])
-            .select_related('user', 'profile')
-            .order_by('user__last_name', 'user__first_name')
-        )
-        staff_data = _build_staff_report_data(business, staff_memberships, from_dt, to_dt)
+    for business in businesses:
+        staff_data = data_by_business.get(business.id, [])
 
         branch_seconds = sum(s['total_seconds'] for s in staff_data)
         branch_h = branch_seconds // 3600
@@ -191,21 +236,264 @@ def download_owner_report(request):
     overall_m = (overall_seconds % 3600) // 60
 
     context = {
-        'owner': request.user,
+        'owner': owner,
         'from_date': from_date,
         'to_date': to_date,
         'branches_data': branches_data,
         'overall_hours': f"{overall_h}h {overall_m:02d}m",
         'overall_lates': sum(b['total_lates'] for b in branches_data),
         'overall_shifts': sum(b['total_shifts'] for b in branches_data),
+        'branch_count': len(branches_data),
         'generated': timezone.localtime(timezone.now(), tz).strftime('%d %b %Y %H:%M'),
+        'show_header': True,
+        'show_footer': True,
     }
 
-    html_str = render_to_string('reports/owner_report.html', context, request=request)
-    css = WeasyCSS(filename=str(django_settings.BASE_DIR / 'checkpoint' / 'static' / 'css' / 'report.css'))
-    pdf = WeasyHTML(string=html_str).write_pdf(stylesheets=[css])
+    processes = django_settings.REPORT_RENDER_PROCESSES
+    if processes > 1 and len(branches_data) > 1:
+        return _render_owner_report_parallel(context, processes)
+    return _render_report_pdf('reports/owner_report.html', context)
+
+
+def _supervisor_report_file(business, from_date, to_date):
+    # Path (under MEDIA_ROOT) of the branch report, re-rendered only when the underlying rows changed
+    from_dt, to_dt = _report_bounds(from_date, to_date)
+    return cached_report(
+        ReportJob.SUPERVISOR, [business.id], from_dt, to_dt,
+        lambda: _supervisor_report_pdf(business, from_date, to_date),
+    )
+
+
+def _owner_report_file(owner, businesses, from_date, to_date):
+    # Keyed on the owner too, since the report header carries their name
+    from_dt, to_dt = _report_bounds(from_date, to_date)
+    return cached_report(
+        ReportJob.OWNER, [b.id for b in businesses], from_dt, to_dt,
+        lambda: _owner_report_pdf(owner, businesses, from_date, to_date),
+        owner_id=owner.id,
+    )
+
+
+def _pdf_response(relative_path, filename):
+    # Cached PDFs are not public media. Behind nginx the view only checks access and hands the
+    # file off through X-Accel-Redirect to an internal location; elsewhere Django streams it
+    accel_prefix = django_settings.REPORT_ACCEL_REDIRECT_PREFIX
+    if accel_prefix:
+        response = HttpResponse(content_type='application/pdf')
+        response['X-Accel-Redirect'] = accel_prefix + relative_path
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    return FileResponse(
+        open(os.path.join(django_settings.MEDIA_ROOT, relative_path), 'rb'),
+        as_attachment=True,
+        filename=filename,
+        content_type='application/pdf',
+    )
+
+
+class _Echo:
+    # csv.writer target that hands each formatted line straight back instead of buffering it
+    def write(self, value):
+        return value
+
+
+CSV_HEADER = [
+    'branch', 'staff', 'position', 'role', 'date', 'shift_start', 'clock_in', 'clock_out',
+    'duration_minutes', 'late_minutes',
+]
+
 
-    filename = f"CheckPoint_owner_report_{from_date}_{to_date}.pdf".replace(' ', '_')
-    response = HttpResponse(pdf, content_type='application/pdf')
+def _report_csv_lines(businesses, from_date, to_date):
+    # Yields one CSV line per closed TimeClock, branch by branch in staff-name order. Only the staff
+    # lookup is held in memory; TimeClock rows stream from a server-side cursor in chunks
+    tz = timezone.get_current_timezone()
+    from_dt, to_dt = _report_bounds(from_date, to_date)
+    writer = csv.writer(_Echo())
+    branch_names = {b.id: b.name for b in businesses}
+    staff = {
+        (m.business_id, m.user_id): (
+            m.user.get_full_name() or m.user.username,
+            m.profile.position if getattr(m, 'profile', None) else '',
+            m.get_role_display(),
+        )
+        for m in _report_staff_memberships(list(branch_names))
+    }
+
+    yield writer.writerow(CSV_HEADER)
+
+    rows = (
+        _report_timeclock_rows(list(branch_names), from_dt, to_dt)
+        .order_by('business__name', 'business_id', 'user__last_name', 'user__first_name', 'user_id', 'clock_in')
+    )
+    for business_id, user_id, clock_in, clock_out, shift_start, duration, late_by in rows.iterator(chunk_size=2000):
+        member = staff.get((business_id, user_id))
+        if member is None:
+            continue
+
+        is_late = late_by is not None and late_by > LATE_THRESHOLD
+        clock_in = timezone.localtime(clock_in, tz)
+        yield writer.writerow([
+            branch_names[business_id],
+            *member,
+            clock_in.date().isoformat(),
+            timezone.localtime(shift_start, tz).strftime('%H:%M') if shift_start else '',
+            clock_in.strftime('%H:%M'),
+            timezone.localtime(clock_out, tz).strftime('%H:%M'),
+            int(duration.total_seconds() // 60),
+            int(late_by.total_seconds() // 60) if is_late else 0,
+        ])
+
+
+def _csv_response(lines, filename):
+    response = StreamingHttpResponse(lines, content_type='text/csv; charset=utf-8')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
+
+
+def _job_response(job, status=200):
+    data = {
+        'job': str(job.token),
+        'status': job.status,
+        'status_url': reverse('report_job_status', args=[job.token]),
+    }
+    if job.status == ReportJob.DONE:
+        data['download_url'] = reverse('download_report_job', args=[job.token])
+    elif job.status == ReportJob.FAILED:
+        data['error'] = "The report could not be generated. Please try again."
+    return JsonResponse(data, status=status)
+
+
+@login_required
+def download_supervisor_report(request, business_id):
+    # The branch attendance PDF for the requested range if it is already rendered for the current
+    # data; otherwise the render is queued for the worker and the job comes back with a 202
+    _, business, error = get_supervisor_membership(request, business_id)
+    if error:
+        return error
+
+    from_date, to_date, error = _parse_report_range(request.GET)
+    if error:
+        return HttpResponse(error, status=400)
+
+    from_dt, to_dt = _report_bounds(from_date, to_date)
+    path = built_report(ReportJob.SUPERVISOR, [business.id], from_dt, to_dt)
+    if path is None:
+        job, _ = enqueue_report_job(request.user, ReportJob.SUPERVISOR, from_date, to_date, business=business)
+        return _job_response(job, status=202)
+    return _pdf_response(path, f"{business.name}_report_{from_date}_{to_date}.pdf".replace(' ', '_'))
+
+
+@login_required
+def download_owner_report(request):
+    # Same as the supervisor report but covers all branches the owner manages, with an overall summary
+    businesses = _owner_businesses(request.user)
+    if not businesses:
+        return HttpResponse("Access denied.", status=403)
+
+    from_date, to_date, error = _parse_report_range(request.GET)
+    if error:
+        return HttpResponse(error, status=400)
+
+    from_dt, to_dt = _report_bounds(from_date, to_date)
+    path = built_report(ReportJob.OWNER, [b.id for b in businesses], from_dt, to_dt, owner_id=request.user.id)
+    if path is None:
+        job, _ = enqueue_report_job(request.user, ReportJob.OWNER, from_date, to_date)
+        return _job_response(job, status=202)
+    return _pdf_response(path, f"CheckPoint_owner_report_{from_date}_{to_date}.pdf".replace(' ', '_'))
+
+
+@login_required
+def export_supervisor_report_csv(request, business_id):
+    # Raw per-clock-in numbers for payroll, streamed so long ranges never sit in memory
+    _, business, error = get_supervisor_membership(request, business_id)
+    if error:
+        return error
+
+    from_date, to_date, error = _parse_report_range(request.GET)
+    if error:
+        return HttpResponse(error, status=400)
+
+    lines = _report_csv_lines([business], from_date, to_date)
+    return _csv_response(lines, f"{business.name}_attendance_{from_date}_{to_date}.csv".replace(' ', '_'))
+
+
+@login_required
+def export_owner_report_csv(request):
+    # Same columns as the branch export, covering every branch the owner manages
+    businesses = _owner_businesses(request.user)
+    if not businesses:
+        return HttpResponse("Access denied.", status=403)
+
+    from_date, to_date, error = _parse_report_range(request.GET)
+    if error:
+        return HttpResponse(error, status=400)
+
+    lines = _report_csv_lines(businesses, from_date, to_date)
+    return _csv_response(lines, f"CheckPoint_attendance_{from_date}_{to_date}.csv")
+
+
+@login_required
+@require_POST
+def request_supervisor_report(request, business_id):
+    # Queues the branch report for the background worker instead of rendering inside the request
+    _, business, error = get_supervisor_membership(request, business_id, json=True)
+    if error:
+        return error
+
+    from_date, to_date, error = _parse_report_range(request.POST)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    job, _ = enqueue_report_job(request.user, ReportJob.SUPERVISOR, from_date, to_date, business=business)
+    return _job_response(job, status=202)
+
+
+@login_required
+@require_POST
+def request_owner_report(request):
+    # Queues the all-branches report; identical pending requests share one job
+    if not any(m.is_owner for m in get_membership_map(request).values()):
+        return JsonResponse({'error': "Access denied."}, status=403)
+
+    from_date, to_date, error = _parse_report_range(request.POST)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+
+    job, _ = enqueue_report_job(request.user, ReportJob.OWNER, from_date, to_date)
+    return _job_response(job, status=202)
+
+
+@login_required
+def report_job_status(request, token):
+    # Polled by the dashboard until the job is done, then the browser follows download_url
+    job = ReportJob.objects.filter(token=token, requested_by=request.user).first()
+    if not job:
+        return JsonResponse({'error': "Report not found."}, status=404)
+    return _job_response(job)
+
+
+@login_required
+def download_report_job(request, token):
+    # The finished job's PDF, for the person who queued it while they still have access to the branch
+    job = (
+        ReportJob.objects.select_related('business')
+        .filter(token=token, requested_by=request.user, status=ReportJob.DONE)
+        .first()
+    )
+    if not job:
+        return HttpResponse("Report not found.", status=404)
+
+    if job.kind == ReportJob.SUPERVISOR:
+        _, business, error = get_supervisor_membership(request, job.business_id)
+        if error:
+            return error
+        filename = f"{business.name}_report_{job.from_date}_{job.to_date}.pdf".replace(' ', '_')
+    else:
+        if not _owner_businesses(request.user):
+            return HttpResponse("Access denied.", status=403)
+        filename = f"CheckPoint_owner_report_{job.from_date}_{job.to_date}.pdf"
+
+    if not os.path.exists(os.path.join(django_settings.MEDIA_ROOT, job.file_path)):
+        # Pruned from the report cache; the dashboard queues a fresh render
+        return HttpResponse("Report expired.", status=410)
+    return _pdf_response(job.file_path, filename)
@@ -10,7 +10,11 @@ from django.views.decorators.http import require_POST
 
 from ..forms import WorkShiftForm
 from ..models import BusinessMembership, WorkShift
-from ..utils import get_supervisor_membership, shift_to_dict, send_shift_batch_email, send_shift_removed_email
+from ..shift_conflicts import ShiftConflict, save_shift
+from ..utils import (
+    feed_etag, get_supervisor_membership, not_modified_response, parse_calendar_window, shift_feed_json,
+    shifts_in_window, send_shift_batch_email, send_shift_removed_email, with_etag,
+)
 
 User = get_user_model()
 
@@ -51,20 +55,32 @@ def branch_schedule(request, business_id):
 
 @login_required
 def branch_shifts_json(request, business_id):
-    # JSON endpoint that feeds all branch shifts to the schedule calendar
+    # JSON endpoint that feeds branch shifts to the schedule calendar, limited to the visible window
     _, business, error_response = get_supervisor_membership(request, business_id, json=True)
 
     if error_response:
         return error_response
 
-    shifts = (
-        WorkShift.objects.filter(business=business)
-        .select_related('user')
-        .order_by('start')
-    )
+    start, end, error_response = parse_calendar_window(request.GET)
+    if error_response:
+        return error_response
 
-    data = [shift_to_dict(shift) for shift in shifts]
-    return JsonResponse(data, safe=False)
+    etag = feed_etag(business.id, 'branch_shifts', start, end)
+    not_modified = not_modified_response(request, etag)
+    if not_modified:
+        return not_modified
+
+    shifts = shifts_in_window(WorkShift.objects.filter(business=business), start, end).order_by('start')
+    return with_etag(HttpResponse(shift_feed_json(shifts), content_type='application/json'), etag)
+
+
+# "Bob Jones is already booked: Cafe Nero Fri 20 Mar 09:00–17:00."
+def _conflict_message(user, conflicts):
+    booked = ", ".join(
+        f"{c.business.name} {timezone.localtime(c.start):%a %d %b %H:%M}–{timezone.localtime(c.end):%H:%M}"
+        for c in conflicts
+    )
+    return f"{user.get_full_name() or user.username} is already booked: {booked}."
 
 
 @login_required
@@ -84,7 +100,11 @@ def create_shift(request, business_id):
             shift = form.save(commit=False)
             shift.business = business
             shift.created_by = request.user
-            shift.save()
+            try:
+                save_shift(shift)
+            except ShiftConflict as exc:
+                messages.error(request, _conflict_message(shift.user, exc.conflicts))
+                return redirect('branch_schedule', business_id=business.id)
 
             session_key = f"pending_shift_notifications_{business_id}"
             pending = request.session.get(session_key, [])
@@ -93,6 +113,8 @@ def create_shift(request, business_id):
             request.session[session_key] = pending
             request.session.modified = True
         else:
+            for error in form.non_field_errors():
+                messages.error(request, error)
             for field in form:
                 for error in field.errors:
                     messages.error(request, f"{field.label}: {error}")
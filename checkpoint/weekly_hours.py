@@ -0,0 +1,176 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import Business, TimeClock, WeeklyHours, WorkShift
+
+# WeeklyHours keeps scheduled seconds, shift count and worked (clocked) seconds per branch,
+# person and local Monday-to-Sunday week. The model signals refresh just the weeks a changed
+# shift or closed clock touches, so the hours views and chat read one row instead of
+# aggregating shifts. A shift or clock that crosses midnight on Sunday is split between the
+# two weeks; a shift counts once in every week it touches
+
+
+def week_of(dt):
+    day = timezone.localtime(dt).date()
+    return day - timedelta(days=day.weekday())
+
+
+def week_bounds(week_start):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(week_start, time.min), tz),
+        timezone.make_aware(datetime.combine(week_start + timedelta(days=7), time.min), tz),
+    )
+
+
+# (week_start, seconds inside that week) for every week [start, end) overlaps
+def split_by_week(start, end):
+    week = week_of(start)
+    if end <= start:
+        return [(week, 0)]
+    parts = []
+    while True:
+        week_start_dt, week_end_dt = week_bounds(week)
+        if week_start_dt >= end:
+            return parts
+        overlap = min(end, week_end_dt) - max(start, week_start_dt)
+        parts.append((week, int(overlap.total_seconds())))
+        week += timedelta(days=7)
+
+
+def weeks_touched(start, end):
+    return [week for week, _ in split_by_week(start, end)]
+
+
+# {(business_id, user_id, week_start): [scheduled_seconds, shift_count, worked_seconds]} from
+# (business_id, user_id, start, end) rows of shifts and closed clocks
+def rollup(shifts, clocks):
+    totals = defaultdict(lambda: [0, 0, 0])
+    for business_id, user_id, start, end in shifts:
+        for week, seconds in split_by_week(start, end):
+            row = totals[business_id, user_id, week]
+            row[0] += seconds
+            row[1] += 1
+    for business_id, user_id, clock_in, clock_out in clocks:
+        for week, seconds in split_by_week(clock_in, clock_out):
+            totals[business_id, user_id, week][2] += seconds
+    return totals
+
+
+def refresh_weekly_hours(business_id, user_id, weeks):
+    # Recomputes the given weeks for one person at one branch from their shifts and closed clocks.
+    # The rows are inserted (if missing) and locked before reading, so when two changes to the
+    # same week race, the second refresh waits and then reads both. Weeks left empty are deleted
+    weeks = sorted(set(weeks))
+    if not weeks:
+        return
+    span_start, span_end = week_bounds(weeks[0])[0], week_bounds(weeks[-1])[1]
+    rows = WeeklyHours.objects.filter(business_id=business_id, user_id=user_id, week_start__in=weeks)
+    with transaction.atomic():
+        WeeklyHours.objects.bulk_create(
+            [WeeklyHours(business_id=business_id, user_id=user_id, week_start=week) for week in weeks],
+            ignore_conflicts=True,
+        )
+        locked = {row.week_start: row for row in rows.select_for_update()}
+        shifts = WorkShift.objects.filter(
+            business_id=business_id, user_id=user_id, start__lt=span_end, end__gt=span_start,
+        ).values_list("business_id", "user_id", "start", "end")
+        clocks = TimeClock.objects.filter(
+            business_id=business_id, user_id=user_id, clock_out__isnull=False,
+            clock_in__lt=span_end, clock_out__gt=span_start,
+        ).values_list("business_id", "user_id", "clock_in", "clock_out")
+        totals = rollup(shifts, clocks)
+
+        changed, empty = [], []
+        for week, row in locked.items():
+            scheduled, count, worked = totals.get((business_id, user_id, week), (0, 0, 0))
+            if not (scheduled or count or worked):
+                empty.append(row.pk)
+            elif (row.scheduled_seconds, row.shift_count, row.worked_seconds) != (scheduled, count, worked):
+                row.scheduled_seconds, row.shift_count, row.worked_seconds = scheduled, count, worked
+                changed.append(row)
+        if empty:
+            WeeklyHours.objects.filter(pk__in=empty).delete()
+        if changed:
+            WeeklyHours.objects.bulk_update(changed, ["scheduled_seconds", "shift_count", "worked_seconds"])
+
+
+# For writers that skip the model signals (bulk clock updates): refresh every week the closed
+# clocks touch, grouped per person
+def refresh_for_clocks(clocks):
+    weeks = defaultdict(set)
+    for clock in clocks:
+        if clock.clock_out is not None:
+            weeks[clock.business_id, clock.user_id].update(weeks_touched(clock.clock_in, clock.clock_out))
+    for (business_id, user_id), person_weeks in weeks.items():
+        refresh_weekly_hours(business_id, user_id, person_weeks)
+
+
+def rebuild_weekly_hours(batch_size=2000):
+    # Recomputes the whole table from scratch; for the initial fill and after manual data fixes
+    totals = rollup(
+        WorkShift.objects.values_list("business_id", "user_id", "start", "end").iterator(chunk_size=batch_size),
+        TimeClock.objects.filter(clock_out__isnull=False)
+        .values_list("business_id", "user_id", "clock_in", "clock_out").iterator(chunk_size=batch_size),
+    )
+    with transaction.atomic():
+        WeeklyHours.objects.all().delete()
+        WeeklyHours.objects.bulk_create([
+            WeeklyHours(
+                business_id=business_id, user_id=user_id, week_start=week,
+                scheduled_seconds=scheduled, shift_count=count, worked_seconds=worked,
+            )
+            for (business_id, user_id, week), (scheduled, count, worked) in totals.items()
+        ], batch_size=batch_size)
+    return len(totals)
+
+
+def week_totals(business_id, user_id, week_start):
+    # (scheduled, worked) timedeltas for one person's week: a single row read
+    row = WeeklyHours.objects.filter(
+        business_id=business_id, user_id=user_id, week_start=week_start,
+    ).values_list("scheduled_seconds", "worked_seconds").first() or (0, 0)
+    return timedelta(seconds=row[0]), timedelta(seconds=row[1])
+
+
+def month_totals(business_id, user_id, start_dt, end_dt):
+    # (scheduled, worked) for a range that doesn't line up with weeks, in one query. Shifts and
+    # clocks are both clipped to the range, the same rule split_by_week applies at week edges, so
+    # a clock running past midnight counts the same in the week and the month views
+    def clipped_total(start_field, end_field):
+        return Sum(ExpressionWrapper(
+            Least(F(end_field), Value(end_dt, output_field=DateTimeField()))
+            - Greatest(F(start_field), Value(start_dt, output_field=DateTimeField())),
+            output_field=DurationField(),
+        ))
+
+    worked = (
+        TimeClock.objects.filter(
+            business_id=business_id, user_id=user_id,
+            clock_out__isnull=False, clock_in__lt=end_dt, clock_out__gt=start_dt,
+        )
+        .values("user_id")
+        .annotate(total=clipped_total("clock_in", "clock_out"))
+        .values("total")
+    )
+    scheduled = (
+        WorkShift.objects.filter(business_id=business_id, user_id=user_id, start__lt=end_dt, end__gt=start_dt)
+        .values("user_id")
+        .annotate(total=clipped_total("start", "end"))
+        .values("total")
+    )
+    totals = (
+        Business.objects.filter(pk=business_id)
+        .annotate(
+            scheduled=Coalesce(Subquery(scheduled, output_field=DurationField()), Value(timedelta(0))),
+            worked=Coalesce(Subquery(worked, output_field=DurationField()), Value(timedelta(0))),
+        )
+        .values_list("scheduled", "worked")
+        .first()
+    )
+    return totals or (timedelta(0), timedelta(0))
@@ -126,6 +126,18 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Generated report PDFs are written here by the report worker
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'mediafiles'
+
+# Owner reports with several branches are split into one PDF per chunk of branches,
+# rendered in this many worker processes and merged; 0 or 1 renders a single document
+REPORT_RENDER_PROCESSES = int(os.getenv('REPORT_RENDER_PROCESSES', '0'))
+
+# Report downloads are access-checked by Django; when set, the file itself is handed to nginx
+# with X-Accel-Redirect to this internal location (which maps onto MEDIA_ROOT). Empty streams it
+REPORT_ACCEL_REDIRECT_PREFIX = ''
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,17 @@
 from .base import *
+import os
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
-DEBUG = True
\ No newline at end of file
+DEBUG = True
+
+# docker-development-compose.yml runs several gunicorn workers plus the chat service, which must
+# share one cache for the staff status snapshots and chat extraction cache. A bare runserver
+# without REDIS_URL keeps Django's per-process default
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
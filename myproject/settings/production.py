@@ -30,6 +30,17 @@ MIDDLEWARE = [
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'mediafiles'
+# nginx's internal-only alias of MEDIA_ROOT (see nginx.conf); /media/reports/ itself is not served
+REPORT_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# One cache for every container (gunicorn workers, the uvicorn chat service, the report worker and
+# the scan code rotator) so signal-driven invalidation in one process reaches all the others
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://redis:6379/0'),
+    }
+}
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'